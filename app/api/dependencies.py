@@ -1,9 +1,10 @@
 """FastAPI dependencies."""
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db.session import get_session
+from app.db.session import get_async_session, get_session
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -11,3 +12,10 @@ def get_db() -> Generator[Session, None, None]:
 
     with get_session() as session:
         yield session
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Provide an async database session per request."""
+
+    async with get_async_session() as session:
+        yield session
@@ -3,17 +3,20 @@ from __future__ import annotations
 
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.dependencies import get_db
+from app.api.dependencies import get_async_db
 from app.core.logging import get_logger
-from app.db.models import Document, DocumentStatus, Trait
-from app.schemas.document import DocumentBase, DocumentDetail, DocumentList
+from app.db.models import Document, DocumentStatus, ProcessingJob, Trait, TRAIT_TYPES
+from app.schemas.document import DocumentBase, DocumentDetail, DocumentList, ProfileArtifact
 from app.schemas.job import JobStatus
-from app.schemas.trait import TraitRead
-from app.services import document_service, job_service, storage_service
-from app.workers.tasks import process_document_task
+from app.schemas.trait import TraitRead, TraitRecomputeQueued, TraitRecomputeRequest
+from app.services import document_service, job_service, profiling_service, routing_service, storage_service
+from app.workers.dispatch import enqueue_process_document, enqueue_recompute_traits
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -45,28 +48,51 @@ def _trait_to_schema(trait: Trait) -> TraitRead:
     )
 
 
+def _job_to_schema(job: ProcessingJob) -> JobStatus:
+    return JobStatus(
+        id=job.id,
+        document_id=job.document_id,
+        status=job.status,
+        step=job.step,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        completed_at=job.completed_at,
+    )
+
+
 def _document_to_detail(document: Document, traits: list[Trait]) -> DocumentDetail:
     return DocumentDetail(
         **_document_to_base(document).model_dump(),
         token_count=document.token_count,
         language=document.language,
+        near_duplicates=(document.metadata_json or {}).get("near_duplicates"),
         traits=[_trait_to_schema(trait) for trait in traits],
     )
 
 
+def _check_trait_types(trait_types: list[str] | None) -> None:
+    unknown = sorted(set(trait_types or []) - set(TRAIT_TYPES))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown trait types: {', '.join(unknown)}")
+
+
 @router.post("/", response_model=DocumentDetail, status_code=201)
 async def upload_document(
     file: UploadFile,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_async_db),
 ) -> DocumentDetail:
     """Upload a PDF and create a document record."""
 
-    stored_filename, path = storage_service.save_upload(file)
-    document = document_service.create_document(
-        session,
+    stored_filename, path = await run_in_threadpool(storage_service.save_upload, file)
+    probe = await run_in_threadpool(routing_service.probe_document, path)
+    document = await session.run_sync(
+        document_service.create_document,
         original_filename=file.filename or stored_filename,
         stored_filename=stored_filename,
         source_path=path,
+        page_count=probe.page_count if probe else None,
+        metadata_json={"probe": probe.as_dict()} if probe else None,
     )
     traits: list[Trait] = []
     logger.info("Uploaded document %s", document.id)
@@ -74,43 +100,143 @@ async def upload_document(
 
 
 @router.get("/", response_model=DocumentList)
-def list_documents(
+async def list_documents(
     skip: int = 0,
     limit: int = 50,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_async_db),
 ) -> DocumentList:
-    items, total = document_service.list_documents(session, offset=skip, limit=limit)
+    items, total = await session.run_sync(document_service.list_documents, offset=skip, limit=limit)
     return DocumentList(items=[_document_to_base(doc) for doc in items], total=total)
 
 
 @router.get("/{document_id}", response_model=DocumentDetail)
-def get_document_detail(document_id: uuid.UUID, session: Session = Depends(get_db)) -> DocumentDetail:
-    document = document_service.get_document(session, document_id)
+async def get_document_detail(
+    document_id: uuid.UUID,
+    session: AsyncSession = Depends(get_async_db),
+) -> DocumentDetail:
+    document = await session.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
-    traits = session.exec(select(Trait).where(Trait.document_id == document.id)).all()
+    traits = (await session.exec(select(Trait).where(Trait.document_id == document.id))).all()
     return _document_to_detail(document, traits)
 
 
 @router.post("/{document_id}/process", response_model=JobStatus)
-def process_document(document_id: uuid.UUID, session: Session = Depends(get_db)) -> JobStatus:
-    document = document_service.get_document(session, document_id)
+async def process_document(
+    document_id: uuid.UUID,
+    profile: bool = False,
+    priority: int | None = Query(None, ge=0, le=9, description="0 is served first; defaults by document size"),
+    session: AsyncSession = Depends(get_async_db),
+) -> JobStatus:
+    """Queue processing on a queue sized for the document.
+
+    ``profile=true`` captures stack samples and allocations for this run.
+    """
+
+    document = await session.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
     if document.status in {DocumentStatus.IN_FLIGHT, DocumentStatus.PROCESSING}:
         raise HTTPException(status_code=409, detail="Document already queued for processing")
 
-    document_service.mark_in_flight(session, document)
-    task = process_document_task.delay(str(document.id))
-    job = job_service.create_job(session, document_id=document.id, task_id=task.id)
-    return JobStatus(
-        id=job.id,
-        document_id=document.id,
-        status=job.status,
-        step=job.step,
-        error_message=job.error_message,
-        created_at=job.created_at,
-        started_at=job.started_at,
-        completed_at=job.completed_at,
+    queue, priority = routing_service.route_document(document, priority)
+    await session.run_sync(document_service.mark_in_flight, document)
+    # Publishing to the broker is blocking I/O; keep it off the event loop.
+    task = await run_in_threadpool(
+        enqueue_process_document, document.id, queue=queue, priority=priority, profile=profile
+    )
+    logger.info("Queued document %s on %s with priority %s", document.id, queue, priority)
+    job = await session.run_sync(job_service.create_job, document_id=document.id, task_id=task.id)
+    return _job_to_schema(job)
+
+
+@router.post("/traits/recompute", response_model=TraitRecomputeQueued)
+async def recompute_corpus_traits(
+    request: TraitRecomputeRequest,
+    priority: int | None = Query(None, ge=0, le=9),
+    session: AsyncSession = Depends(get_async_db),
+) -> TraitRecomputeQueued:
+    """Queue trait recomputation for every processed document (see the per-document route)."""
+
+    _check_trait_types(request.trait_types)
+    document_ids = (
+        await session.exec(select(Document.id).where(Document.status == DocumentStatus.COMPLETED))
+    ).all()
+    queue, priority = routing_service.route_trait_recompute(priority, corpus=True)
+    tasks = await run_in_threadpool(
+        lambda: [
+            enqueue_recompute_traits(
+                document_id, queue=queue, priority=priority, trait_types=request.trait_types, force=request.force
+            )
+            for document_id in document_ids
+        ]
+    )
+    jobs = await session.run_sync(
+        lambda sync_session: [
+            job_service.create_job(sync_session, document_id=document_id, task_id=task.id)
+            for document_id, task in zip(document_ids, tasks)
+        ]
     )
+    logger.info("Queued trait recomputation for %d documents on %s", len(jobs), queue)
+    return TraitRecomputeQueued(queued=len(jobs), job_ids=[job.id for job in jobs])
+
+
+@router.post("/{document_id}/traits/recompute", response_model=JobStatus)
+async def recompute_document_traits(
+    document_id: uuid.UUID,
+    request: TraitRecomputeRequest,
+    priority: int | None = Query(None, ge=0, le=9),
+    session: AsyncSession = Depends(get_async_db),
+) -> JobStatus:
+    """Re-extract traits from stored chunks and embeddings, without re-parsing or re-embedding.
+
+    Only ``trait_types`` are recomputed (all traits when omitted). Traits whose
+    prompt, model and context hashes are unchanged are skipped unless ``force``.
+    """
+
+    _check_trait_types(request.trait_types)
+    document = await session.get(Document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.status != DocumentStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Document must be processed before traits can be recomputed")
+
+    queue, priority = routing_service.route_trait_recompute(priority)
+    task = await run_in_threadpool(
+        enqueue_recompute_traits,
+        document.id,
+        queue=queue,
+        priority=priority,
+        trait_types=request.trait_types,
+        force=request.force,
+    )
+    job = await session.run_sync(job_service.create_job, document_id=document.id, task_id=task.id)
+    return _job_to_schema(job)
+
+
+@router.get("/{document_id}/job", response_model=JobStatus)
+async def get_latest_job(document_id: uuid.UUID, session: AsyncSession = Depends(get_async_db)) -> JobStatus:
+    job = await session.run_sync(job_service.get_latest_job, document_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No processing job for document")
+    return _job_to_schema(job)
+
+
+@router.get("/{document_id}/profiles", response_model=list[ProfileArtifact])
+async def list_profiles(
+    document_id: uuid.UUID,
+    session: AsyncSession = Depends(get_async_db),
+) -> list[ProfileArtifact]:
+    if not await session.get(Document, document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    items = await run_in_threadpool(profiling_service.list_profiles, document_id)
+    return [ProfileArtifact(**item) for item in items]
+
+
+@router.get("/{document_id}/profiles/{name}")
+def download_profile(document_id: uuid.UUID, name: str) -> FileResponse:
+    path = profiling_service.profile_path(document_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
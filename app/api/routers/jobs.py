@@ -0,0 +1,46 @@
+"""Processing job routes."""
+from __future__ import annotations
+
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session
+
+from app.api.dependencies import get_db
+from app.db.models import ProcessingJob
+from app.schemas.job import JobDetail, StageReport
+from app.services import job_service
+from app.services.timing_service import summarize_llm_cache, summarize_spans
+
+router = APIRouter()
+
+
+@router.get("/stages", response_model=StageReport)
+def get_stage_report(
+    limit: int = Query(50, ge=1, le=1000),
+    session: Session = Depends(get_db),
+) -> StageReport:
+    """Where time goes across the most recent successful jobs, slowest stage first."""
+
+    return StageReport(**job_service.stage_report(session, limit=limit))
+
+
+@router.get("/{job_id}", response_model=JobDetail)
+def get_job_detail(job_id: uuid.UUID, session: Session = Depends(get_db)) -> JobDetail:
+    job = session.get(ProcessingJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    spans = job.spans or []
+    return JobDetail(
+        id=job.id,
+        document_id=job.document_id,
+        status=job.status,
+        step=job.step,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        completed_at=job.completed_at,
+        spans=spans,
+        stage_totals=summarize_spans(spans),
+        llm_cache=summarize_llm_cache(spans),
+    )
@@ -0,0 +1,15 @@
+"""Model inspection routes."""
+from __future__ import annotations
+
+from fastapi import APIRouter
+
+from app.services import cascade_service
+
+router = APIRouter()
+
+
+@router.get("/cascade-stats")
+def get_cascade_stats() -> dict:
+    """Per-trait answer rate and latency for each model in the cascade."""
+
+    return cascade_service.cascade_stats()
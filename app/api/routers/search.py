@@ -0,0 +1,76 @@
+"""Corpus-wide semantic search routes."""
+from __future__ import annotations
+
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.dependencies import get_async_db
+from app.core.config import settings
+from app.db.models import Chunk, Document
+from app.schemas.search import SearchResult, SearchResults
+from app.services import search_service
+from app.services.routing_service import SMALL_QUEUE
+from app.workers.dispatch import embed_query
+
+router = APIRouter()
+
+SNIPPET_CHARS = 400
+
+
+@router.get("", response_model=SearchResults)
+async def search_chunks(
+    q: str = Query(..., min_length=2),
+    k: int = Query(10, ge=1, le=100),
+    nprobe: int | None = Query(None, ge=1, description="Clusters to scan; higher is slower and more exact"),
+    session: AsyncSession = Depends(get_async_db),
+) -> SearchResults:
+    """Top ``k`` chunks across every processed document, with document and page references."""
+
+    query_vector = None
+    if settings.embed_provider == "transformers":
+        # Local embedding models live in the workers; loading them here would pull torch into the API.
+        try:
+            query_vector = await run_in_threadpool(
+                embed_query, q, queue=SMALL_QUEUE, timeout=settings.search_query_timeout
+            )
+        except CeleryTimeoutError as exc:
+            raise HTTPException(status_code=503, detail="Timed out waiting for a worker to embed the query") from exc
+    try:
+        # Embedding the query and scoring the index are blocking; keep them off the event loop.
+        hits = await run_in_threadpool(search_service.search, q, k, nprobe, query_vector=query_vector)
+    except search_service.SearchIndexError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if not hits:
+        return SearchResults(query=q, results=[])
+
+    rows = (
+        await session.exec(
+            select(Chunk.id, Chunk.page_start, Chunk.page_end, Chunk.content, Document.title, Document.original_filename)
+            .join(Document, Document.id == Chunk.document_id)
+            .where(Chunk.id.in_([hit.chunk_id for hit in hits]))
+        )
+    ).all()
+    by_id = {row[0]: row for row in rows}
+    results = []
+    # Chunks replaced by a reprocess since the last index update are dropped here.
+    for hit in hits:
+        row = by_id.get(hit.chunk_id)
+        if row is None:
+            continue
+        _, page_start, page_end, content, title, filename = row
+        results.append(
+            SearchResult(
+                chunk_id=hit.chunk_id,
+                document_id=hit.document_id,
+                document_title=title,
+                original_filename=filename,
+                page_start=page_start,
+                page_end=page_end,
+                score=round(hit.score, 4),
+                snippet=content[:SNIPPET_CHARS],
+            )
+        )
+    return SearchResults(query=q, results=results)
@@ -5,7 +5,7 @@ from functools import lru_cache
 from pathlib import Path
 from typing import Literal
 
-from pydantic import AnyHttpUrl, DirectoryPath, Field
+from pydantic import AnyHttpUrl, DirectoryPath, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -19,18 +19,40 @@ class Settings(BaseSettings):
     api_port: int = Field(8000, validation_alias="API_PORT")
 
     database_url: str = Field(..., validation_alias="DATABASE_URL")
+    # Async driver URL for the API; derived from DATABASE_URL (asyncpg / aiosqlite) when unset.
+    async_database_url: str | None = Field(default=None, validation_alias="ASYNC_DATABASE_URL")
+    database_pool_size: int = Field(10, validation_alias="DATABASE_POOL_SIZE")
+    database_max_overflow: int = Field(20, validation_alias="DATABASE_MAX_OVERFLOW")
+    database_pool_timeout: float = Field(30.0, validation_alias="DATABASE_POOL_TIMEOUT")
+    database_pool_recycle: int = Field(1800, validation_alias="DATABASE_POOL_RECYCLE")
     redis_url: str = Field(..., validation_alias="REDIS_URL")
 
-    llm_provider: Literal["openai", "transformers"] = Field(
+    llm_provider: Literal["openai", "transformers", "fake"] = Field(
         "transformers", validation_alias="LLM_PROVIDER"
     )
-    embed_provider: Literal["openai", "transformers"] = Field(
+    embed_provider: Literal["openai", "transformers", "fake"] = Field(
         "transformers", validation_alias="EMBED_PROVIDER"
     )
 
+    # Deterministic stand-in provider used for load tests (LLM_PROVIDER/EMBED_PROVIDER=fake).
+    fake_llm_latency_ms: float = Field(250.0, validation_alias="FAKE_LLM_LATENCY_MS")
+    fake_embed_latency_ms: float = Field(20.0, validation_alias="FAKE_EMBED_LATENCY_MS")
+    fake_latency_sigma: float = Field(0.5, validation_alias="FAKE_LATENCY_SIGMA")
+    fake_na_rate: float = Field(0.15, validation_alias="FAKE_NA_RATE")
+    fake_embed_dim: int = Field(1024, validation_alias="FAKE_EMBED_DIM")
+    fake_seed: int = Field(0, validation_alias="FAKE_SEED")
+
     openai_api_key: str | None = Field(default=None, validation_alias="OPENAI_API_KEY")
     openai_llm_model: str = Field("gpt-4.1-mini", validation_alias="OPENAI_LLM_MODEL")
     openai_embed_model: str = Field("text-embedding-3-large", validation_alias="OPENAI_EMBED_MODEL")
+    # Point at scripts/fake_openai_batch_server.py (e.g. http://localhost:8765/v1) to run batch mode offline.
+    openai_base_url: str | None = Field(default=None, validation_alias="OPENAI_BASE_URL")
+
+    # Offline backfills through the Batch API (see batch_service).
+    batch_dir: Path | None = Field(default=None, validation_alias="BATCH_DIR")
+    batch_poll_seconds: float = Field(60.0, validation_alias="BATCH_POLL_SECONDS")
+    batch_max_requests: int = Field(50_000, validation_alias="BATCH_MAX_REQUESTS")
+    batch_completion_window: str = Field("24h", validation_alias="BATCH_COMPLETION_WINDOW")
 
     transformer_llm_model: str = Field(
         "meta-llama/Meta-Llama-3.1-8B-Instruct",
@@ -47,8 +69,39 @@ class Settings(BaseSettings):
         "intfloat/e5-large-v2",
         validation_alias="TRANSFORMER_EMBED_MODEL",
     )
+    transformer_embed_backend: Literal["torch", "int8", "onnx", "onnx-int8"] = Field(
+        "torch",
+        validation_alias="TRANSFORMER_EMBED_BACKEND",
+    )
+    transformer_onnx_quantization: Literal["arm64", "avx2", "avx512", "avx512_vnni"] = Field(
+        "avx512_vnni",
+        validation_alias="TRANSFORMER_ONNX_QUANTIZATION",
+    )
+    model_cache_dir: Path | None = Field(default=None, validation_alias="MODEL_CACHE_DIR")
     transformer_device: str = Field("cpu", validation_alias="TRANSFORMER_DEVICE")
+    embedding_storage_dtype: Literal["float32", "float16", "int8"] = Field(
+        "float32",
+        validation_alias="EMBEDDING_STORAGE_DTYPE",
+    )
     transformer_max_new_tokens: int = Field(512, validation_alias="TRANSFORMER_MAX_NEW_TOKENS")
+    transformer_prefix_cache_mb: int = Field(512, validation_alias="TRANSFORMER_PREFIX_CACHE_MB")
+    transformer_memory_budget_mb: int | None = Field(
+        default=None,
+        validation_alias="TRANSFORMER_MEMORY_BUDGET_MB",
+    )
+    transformer_warmup: bool = Field(True, validation_alias="TRANSFORMER_WARMUP")
+
+    context_compression: Literal["embedding", "llm"] = Field(
+        "embedding",
+        validation_alias="CONTEXT_COMPRESSION",
+    )
+
+    cascade_adaptive: bool = Field(True, validation_alias="CASCADE_ADAPTIVE")
+    cascade_min_samples: int = Field(5, validation_alias="CASCADE_MIN_SAMPLES")
+    cascade_skip_answer_rate: float = Field(0.05, validation_alias="CASCADE_SKIP_ANSWER_RATE")
+    cascade_explore_rate: float = Field(0.05, validation_alias="CASCADE_EXPLORE_RATE")
+    cascade_min_confidence: float | None = Field(default=None, validation_alias="CASCADE_MIN_CONFIDENCE")
+    cascade_stats_path: Path | None = Field(default=None, validation_alias="CASCADE_STATS_PATH")
 
     data_root: DirectoryPath = Field(Path("data"), validation_alias="DATA_ROOT")
     raw_files_dir: DirectoryPath = Field(
@@ -64,9 +117,68 @@ class Settings(BaseSettings):
         validation_alias="UPLOADED_FILES_DIR",
     )
 
+    # Write each parsed element's full unstructured metadata to processed_files/<id>/element_metadata.jsonl.
+    parse_metadata_sidecar: bool = Field(False, validation_alias="PARSE_METADATA_SIDECAR")
+
+    # Cache of LLM responses keyed by provider, model, prompt and decoding parameters; unset to disable.
+    llm_cache_backend: Literal["sqlite", "redis"] | None = Field("sqlite", validation_alias="LLM_CACHE_BACKEND")
+    # SQLite file for the cache; defaults to data_root/llm_cache.sqlite3 (see llm_cache_service).
+    llm_cache_path: Path | None = Field(default=None, validation_alias="LLM_CACHE_PATH")
+    llm_cache_ttl_seconds: int = Field(30 * 24 * 3600, validation_alias="LLM_CACHE_TTL_SECONDS")
+    llm_cache_max_entries: int = Field(200_000, validation_alias="LLM_CACHE_MAX_ENTRIES")
+
+    # Chunks at or above this MinHash similarity to an embedded chunk reuse its embedding; unset to disable.
+    near_duplicate_threshold: float | None = Field(0.85, validation_alias="NEAR_DUPLICATE_THRESHOLD")
+
+    # Documents with at least this many chunks score section embeddings first; unset for flat retrieval.
+    section_retrieval_min_chunks: int | None = Field(200, validation_alias="SECTION_RETRIEVAL_MIN_CHUNKS")
+
+    # Corpus search index; defaults to data_root/search_index (see search_service).
+    search_index_dir: Path | None = Field(default=None, validation_alias="SEARCH_INDEX_DIR")
+    search_nprobe: int = Field(8, validation_alias="SEARCH_NPROBE")
+    search_index_rebuild_after: int = Field(200, validation_alias="SEARCH_INDEX_REBUILD_AFTER")
+    # With EMBED_PROVIDER=transformers the API has a worker embed each query and waits this long.
+    search_query_timeout: float = Field(30.0, validation_alias="SEARCH_QUERY_TIMEOUT")
+
+    # Queue routing by estimated cost in page-equivalents (see routing_service).
+    routing_small_max_cost: float = Field(40.0, validation_alias="ROUTING_SMALL_MAX_COST")
+    routing_bulk_min_cost: float = Field(300.0, validation_alias="ROUTING_BULK_MIN_COST")
+    routing_scanned_cost_factor: float = Field(5.0, validation_alias="ROUTING_SCANNED_COST_FACTOR")
+    # Unacked (acks_late) messages are redelivered after this long; keep it above the slowest run.
+    broker_visibility_timeout: int = Field(6 * 3600, validation_alias="BROKER_VISIBILITY_TIMEOUT")
+
     log_level: str = Field("INFO", validation_alias="LOG_LEVEL")
+    profile_sample_interval_ms: float = Field(5.0, validation_alias="PROFILE_SAMPLE_INTERVAL_MS")
+    profile_tracemalloc_frames: int = Field(10, validation_alias="PROFILE_TRACEMALLOC_FRAMES")
+    profile_top_allocations: int = Field(50, validation_alias="PROFILE_TOP_ALLOCATIONS")
+    worker_metrics_port: int | None = Field(9808, validation_alias="WORKER_METRICS_PORT")
     docs_base_url: AnyHttpUrl | None = Field(default=None, validation_alias="DOCS_BASE_URL")
 
+    @field_validator(
+        "async_database_url",
+        "openai_base_url",
+        "batch_dir",
+        "model_cache_dir",
+        "transformer_memory_budget_mb",
+        "cascade_min_confidence",
+        "cascade_stats_path",
+        "llm_cache_backend",
+        "llm_cache_path",
+        "near_duplicate_threshold",
+        "section_retrieval_min_chunks",
+        "search_index_dir",
+        "worker_metrics_port",
+        mode="before",
+    )
+    @classmethod
+    def _empty_as_none(cls, value):
+        """An empty variable (``WORKER_METRICS_PORT=``) means unset: the default path or the feature off.
+
+        Without this an empty number fails to parse and an empty path becomes ``Path(".")``.
+        """
+
+        return None if isinstance(value, str) and not value.strip() else value
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -0,0 +1,142 @@
+"""Prometheus metrics shared by the API and workers.
+
+Both processes define the same metric objects. When ``PROMETHEUS_MULTIPROC_DIR``
+is set (several uvicorn workers or Celery prefork children), prometheus_client
+writes samples to that directory and the exporters aggregate them on scrape.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "rfp_http_request_duration_seconds",
+    "API request latency by route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DOCUMENTS_PROCESSED = Counter(
+    "rfp_documents_processed_total",
+    "Documents that finished processing, by outcome.",
+    ["status"],
+)
+STAGE_DURATION = Histogram(
+    "rfp_stage_duration_seconds",
+    "Duration of pipeline stage spans.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+EMBEDDING_CALLS = Histogram(
+    "rfp_embedding_call_seconds",
+    "Embedding provider call latency (count = number of calls).",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_CALLS = Histogram(
+    "rfp_llm_call_seconds",
+    "LLM generation call latency (count = number of calls).",
+    ["provider", "model", "kind"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "rfp_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss); hit ratio = hit / total.",
+    ["cache", "result"],
+)
+MODEL_RESIDENT_BYTES = Gauge(
+    "rfp_model_resident_bytes",
+    "Approximate memory held by resident models.",
+    ["kind", "name"],
+    multiprocess_mode="liveall",
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+class QueueDepthCollector:
+    """Report Celery queue lengths straight from the Redis broker at scrape time."""
+
+    def __init__(self, redis_url: str, queues: list[str], priority_steps: int = 10) -> None:
+        self._redis_url = redis_url
+        self._queues = queues
+        self._priority_steps = priority_steps
+        self._client = None
+
+    def _family(self) -> GaugeMetricFamily:
+        return GaugeMetricFamily("rfp_celery_queue_depth", "Messages waiting in each Celery queue.", labels=["queue"])
+
+    def describe(self):
+        # Registration calls describe() (or collect()); keep it from touching Redis.
+        yield self._family()
+
+    def collect(self):
+        family = self._family()
+        try:
+            if self._client is None:
+                import redis
+
+                self._client = redis.Redis.from_url(self._redis_url, socket_timeout=1)
+            for queue in self._queues:
+                # The Redis transport keeps priority N > 0 messages in "<queue>:N".
+                keys = [queue] + [f"{queue}:{step}" for step in range(1, self._priority_steps)]
+                pipe = self._client.pipeline()
+                for key in keys:
+                    pipe.llen(key)
+                family.add_metric([queue], float(sum(pipe.execute())))
+        except Exception as exc:  # pragma: no cover - broker unavailable
+            logger.debug("Queue depth collection failed: %s", exc)
+        yield family
+
+
+def build_registry(extra_collectors: list | None = None) -> CollectorRegistry:
+    """Registry to expose: aggregated across processes when multiprocess mode is on."""
+
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY
+
+        registry = REGISTRY
+    for collector in extra_collectors or []:
+        registry.register(collector)
+    return registry
+
+
+def render(registry: CollectorRegistry) -> tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -2,6 +2,7 @@
 from app.db.models.document import Document, DocumentStatus
 from app.db.models.section import Section
 from app.db.models.chunk import Chunk
+from app.db.models.chunk_signature import ChunkSignature, ChunkSignatureBand
 from app.db.models.trait import Trait, TRAIT_TYPES
 from app.db.models.processing_job import ProcessingJob, ProcessingStatus
 
@@ -10,6 +11,8 @@ __all__ = [
     "DocumentStatus",
     "Section",
     "Chunk",
+    "ChunkSignature",
+    "ChunkSignatureBand",
     "Trait",
     "TRAIT_TYPES",
     "ProcessingJob",
@@ -4,7 +4,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -12,6 +12,9 @@ from sqlmodel import Field, Relationship, SQLModel
 class Chunk(SQLModel, table=True):
     """Represents a chunk of document text and metadata."""
 
+    # Retrieval filters a document's chunks by page (see retrieval_service).
+    __table_args__ = (Index("ix_chunk_document_id_page_start", "document_id", "page_start"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     document_id: uuid.UUID = Field(foreign_key="document.id", index=True)
     section_id: uuid.UUID | None = Field(default=None, foreign_key="section.id", index=True)
@@ -24,7 +27,9 @@ class Chunk(SQLModel, table=True):
 
     keywords: list[str] | None = Field(default=None, sa_column=Column(JSON))
     embedding_id: str | None = Field(default=None)
+    # Legacy JSON embeddings; new rows store packed vectors in ``embedding_vector``.
     embedding: list[float] | None = Field(default=None, sa_column=Column(JSON))
+    embedding_vector: bytes | None = Field(default=None, sa_column=Column(LargeBinary))
     metadata_json: dict | None = Field(default=None, sa_column=Column(JSON))
 
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,26 @@
+"""MinHash signature models for near-duplicate chunk lookup."""
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import Column, LargeBinary
+from sqlmodel import Field, SQLModel
+
+
+class ChunkSignature(SQLModel, table=True):
+    """MinHash signature of an embedded chunk (see ``dedup_service``)."""
+
+    chunk_id: uuid.UUID = Field(foreign_key="chunk.id", primary_key=True)
+    document_id: uuid.UUID = Field(foreign_key="document.id", index=True)
+    embedding_model: str = Field(index=True)
+    signature: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ChunkSignatureBand(SQLModel, table=True):
+    """One LSH band of a chunk signature; chunks sharing a band key are candidate duplicates."""
+
+    band_key: str = Field(primary_key=True)
+    chunk_id: uuid.UUID = Field(foreign_key="chunk.id", primary_key=True, index=True)
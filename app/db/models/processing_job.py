@@ -4,6 +4,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
+from sqlalchemy import Column, JSON
 from sqlalchemy.orm import relationship
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -24,6 +25,7 @@ class ProcessingJob(SQLModel, table=True):
     status: str = Field(default=ProcessingStatus.PENDING, index=True)
     step: str | None = Field(default=None)
     error_message: str | None = Field(default=None)
+    spans: list[dict] | None = Field(default=None, sa_column=Column(JSON))
 
     created_at: datetime = Field(default_factory=datetime.utcnow)
     started_at: datetime | None = Field(default=None)
@@ -4,7 +4,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -24,6 +24,8 @@ class Section(SQLModel, table=True):
     page_end: int | None = Field(default=None)
     token_count: int = Field(default=0)
 
+    # Packed centroid of the section's own chunk embeddings, for section-first retrieval.
+    embedding_vector: bytes | None = Field(default=None, sa_column=Column(LargeBinary))
     metadata_json: dict | None = Field(default=None, sa_column=Column(JSON))
 
     created_at: datetime = Field(default_factory=datetime.utcnow)
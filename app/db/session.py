@@ -1,13 +1,61 @@
 """Database session management."""
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import AsyncIterator
 
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
 
-engine = create_engine(settings.database_url, echo=False, future=True)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def _pool_options(url: str) -> dict:
+    """Explicit pool sizing for server databases (SQLite uses its own pool classes)."""
+
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+def async_database_url() -> str:
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver configured for {url.drivername}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+engine = create_engine(settings.database_url, echo=False, future=True, **_pool_options(settings.database_url))
 SessionLocal = sessionmaker(bind=engine, class_=Session, expire_on_commit=False)
+# Same pool, but every statement commits on its own: job progress never waits on a pipeline transaction.
+autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+AutocommitSessionLocal = sessionmaker(bind=autocommit_engine, class_=Session, expire_on_commit=False)
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    """Async engine for the API, created on first use so workers never load the async driver."""
+
+    url = async_database_url()
+    return create_async_engine(url, echo=False, **_pool_options(url))
+
+
+@lru_cache
+def _async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(bind=get_async_engine(), class_=AsyncSession, expire_on_commit=False)
 
 
 @contextmanager
@@ -23,3 +71,30 @@ def get_session() -> Session:
         raise
     finally:
         session.close()
+
+
+@contextmanager
+def get_autocommit_session() -> Session:
+    """Session whose writes are committed as soon as they are flushed."""
+
+    session = AutocommitSessionLocal()
+    try:
+        yield session
+        session.flush()
+    finally:
+        session.close()
+
+
+@asynccontextmanager
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of ``get_session``."""
+
+    session = _async_sessionmaker()()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
@@ -1,10 +1,14 @@
 """FastAPI application entrypoint."""
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routers import documents
+from app.api.routers import documents, jobs, models, search
+from app.core import metrics
 from app.core.config import settings
 from app.core.logging import configure_logging
+from app.workers.celery_app import queue_names
 
 configure_logging()
 
@@ -19,6 +23,35 @@ app.add_middleware(
 )
 
 app.include_router(documents.router, prefix="/documents", tags=["documents"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(models.router, prefix="/models", tags=["models"])
+app.include_router(search.router, prefix="/search", tags=["search"])
+
+
+metrics_registry = metrics.build_registry([metrics.QueueDepthCollector(settings.redis_url, queue_names())])
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_DURATION.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - started)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint() -> Response:
+    payload, content_type = metrics.render(metrics_registry)
+    return Response(content=payload, media_type=content_type)
 
 
 @app.get("/health")
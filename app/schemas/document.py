@@ -20,9 +20,16 @@ class DocumentBase(BaseModel):
 class DocumentDetail(DocumentBase):
     token_count: int | None = None
     language: str | None = None
+    near_duplicates: dict | None = None
     traits: list[TraitRead] | None = None
 
 
 class DocumentList(BaseModel):
     items: list[DocumentBase]
     total: int
+
+
+class ProfileArtifact(BaseModel):
+    name: str
+    size_bytes: int
+    created_at: datetime
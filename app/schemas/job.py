@@ -14,3 +14,39 @@ class JobStatus(BaseModel):
     created_at: datetime
     started_at: datetime | None = None
     completed_at: datetime | None = None
+
+
+class JobSpan(BaseModel):
+    name: str
+    started_at: datetime
+    duration_ms: float
+    trait: str | None = None
+    items: int | None = None
+    model: str | None = None
+    tokens_in: int | None = None
+    tokens_out: int | None = None
+    llm_cache_hits: int | None = None
+    llm_cache_misses: int | None = None
+
+
+class JobDetail(JobStatus):
+    spans: list[JobSpan] = []
+    stage_totals: dict[str, dict] = {}
+    llm_cache: dict = {}
+
+
+class StageStats(BaseModel):
+    stage: str
+    jobs: int
+    spans: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+    share: float
+
+
+class StageReport(BaseModel):
+    jobs: int
+    stages: list[StageStats]
+    slowest_traits: list[StageStats]
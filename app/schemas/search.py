@@ -0,0 +1,20 @@
+"""Corpus search schemas."""
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class SearchResult(BaseModel):
+    chunk_id: UUID
+    document_id: UUID
+    document_title: str | None = None
+    original_filename: str
+    page_start: int
+    page_end: int
+    score: float
+    snippet: str
+
+
+class SearchResults(BaseModel):
+    query: str
+    results: list[SearchResult]
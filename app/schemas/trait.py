@@ -24,3 +24,13 @@ class TraitCreate(BaseModel):
     confidence: float | None = None
     pages: list[int] | None = None
     evidence: list[str] | None = None
+
+
+class TraitRecomputeRequest(BaseModel):
+    trait_types: list[str] | None = None
+    force: bool = False
+
+
+class TraitRecomputeQueued(BaseModel):
+    queued: int
+    job_ids: list[UUID]
@@ -0,0 +1,163 @@
+"""Columnar per-document chunk artifacts.
+
+Each processed document gets ``processed_files/<id>/chunks/`` holding one file per
+column, so chunks and embeddings can be read without the database:
+
+- ``embeddings.npy``: the embedding matrix (float32, or float16 when
+  ``EMBEDDING_STORAGE_DTYPE`` is float16/int8), opened with ``mmap_mode="r"``;
+- ``embedded.npy``: whether each row has an embedding (rows without one are zero);
+- ``text.bin`` and ``text_offsets.npy``: UTF-8 chunk text and ``n + 1`` byte offsets;
+- ``chunk_ids.npy`` (16 bytes per row), ``pages.npy`` (start, end) and ``token_counts.npy``;
+- ``meta.json``: row count, embedding model and dtype, and per-chunk metadata.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import Chunk
+from app.services.embeddings_service import chunk_embedding, embedding_model_name
+from app.utils.file_paths import document_processed_dir
+
+logger = get_logger(__name__)
+
+ARTIFACT_DIRNAME = "chunks"
+FORMAT_VERSION = 1
+
+
+def artifact_dir(document_id: uuid.UUID) -> Path:
+    return document_processed_dir(document_id) / ARTIFACT_DIRNAME
+
+
+def write_chunk_artifact(document_id: uuid.UUID, chunks: list[Chunk]) -> Path:
+    """Write the columnar artifact for ``chunks``, replacing any previous one atomically."""
+
+    target = artifact_dir(document_id)
+    staging = target.with_name(f".{ARTIFACT_DIRNAME}-{uuid.uuid4().hex[:8]}")
+    staging.mkdir(parents=True)
+
+    vectors = [chunk_embedding(chunk) for chunk in chunks]
+    dim = next((vector.shape[0] for vector in vectors if vector is not None), 0)
+    dtype = np.float32 if settings.embedding_storage_dtype == "float32" else np.float16
+    embeddings = np.zeros((len(chunks), dim), dtype=dtype)
+    embedded = np.zeros(len(chunks), dtype=bool)
+    for row, vector in enumerate(vectors):
+        if vector is not None and vector.shape[0] == dim:
+            embeddings[row] = vector
+            embedded[row] = True
+
+    encoded = [(chunk.content or "").encode("utf-8") for chunk in chunks]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    (staging / "text.bin").write_bytes(b"".join(encoded))
+    np.save(staging / "text_offsets.npy", offsets)
+    np.save(staging / "embeddings.npy", embeddings)
+    np.save(staging / "embedded.npy", embedded)
+    np.save(
+        staging / "chunk_ids.npy",
+        np.frombuffer(b"".join(chunk.id.bytes for chunk in chunks), dtype=np.uint8).reshape(-1, 16),
+    )
+    np.save(
+        staging / "pages.npy",
+        np.asarray([(chunk.page_start, chunk.page_end) for chunk in chunks], dtype=np.int32).reshape(-1, 2),
+    )
+    np.save(staging / "token_counts.npy", np.asarray([chunk.token_count for chunk in chunks], dtype=np.int32))
+    (staging / "meta.json").write_text(
+        json.dumps(
+            {
+                "version": FORMAT_VERSION,
+                "document_id": str(document_id),
+                "rows": len(chunks),
+                "embedding_model": embedding_model_name(),
+                "embedding_dim": dim,
+                "embedding_dtype": np.dtype(dtype).name,
+                "metadata": [chunk.metadata_json for chunk in chunks],
+            },
+            separators=(",", ":"),
+        ),
+        encoding="utf-8",
+    )
+
+    # Swap the directory in so readers never see a half-written artifact.
+    previous = None
+    if target.exists():
+        previous = target.with_name(f".{ARTIFACT_DIRNAME}-old-{uuid.uuid4().hex[:8]}")
+        os.rename(target, previous)
+    os.rename(staging, target)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+    return target
+
+
+def write_document_artifact(session: Session, document_id: uuid.UUID) -> Path:
+    """Write the artifact from the document's stored chunks (for runs that did not keep them in memory)."""
+
+    chunks = session.exec(
+        select(Chunk).where(Chunk.document_id == document_id).order_by(Chunk.page_start, Chunk.created_at)
+    ).all()
+    return write_chunk_artifact(document_id, list(chunks))
+
+
+@dataclass
+class ChunkArtifact:
+    """Read-only view of a document's artifact; array columns are memory-mapped."""
+
+    path: Path
+    meta: dict
+    embeddings: np.ndarray
+    embedded: np.ndarray
+    chunk_ids: np.ndarray
+    pages: np.ndarray
+    token_counts: np.ndarray
+    text_offsets: np.ndarray
+    _text: np.memmap | None = field(default=None, repr=False)
+
+    def __len__(self) -> int:
+        return int(self.meta["rows"])
+
+    def chunk_id(self, row: int) -> uuid.UUID:
+        return uuid.UUID(bytes=self.chunk_ids[row].tobytes())
+
+    def text(self, row: int) -> str:
+        start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+        if self._text is None:
+            return ""
+        return self._text[start:end].tobytes().decode("utf-8")
+
+    def metadata(self, row: int) -> dict | None:
+        return self.meta["metadata"][row]
+
+
+def load_chunk_artifact(document_id: uuid.UUID) -> ChunkArtifact | None:
+    """Open a document's artifact without copying its columns, or ``None`` if it has none."""
+
+    path = Path(settings.processed_files_dir) / str(document_id) / ARTIFACT_DIRNAME
+    try:
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    if meta.get("version") != FORMAT_VERSION:
+        logger.warning("Ignoring chunk artifact %s with unknown version %s", path, meta.get("version"))
+        return None
+    text_path = path / "text.bin"
+    return ChunkArtifact(
+        path=path,
+        meta=meta,
+        embeddings=np.load(path / "embeddings.npy", mmap_mode="r"),
+        embedded=np.load(path / "embedded.npy", mmap_mode="r"),
+        chunk_ids=np.load(path / "chunk_ids.npy", mmap_mode="r"),
+        pages=np.load(path / "pages.npy", mmap_mode="r"),
+        token_counts=np.load(path / "token_counts.npy", mmap_mode="r"),
+        text_offsets=np.load(path / "text_offsets.npy", mmap_mode="r"),
+        # np.memmap rejects empty files.
+        _text=np.memmap(text_path, dtype=np.uint8, mode="r") if text_path.stat().st_size else None,
+    )
@@ -0,0 +1,417 @@
+"""Offline backfills through the OpenAI Batch API.
+
+A run takes a set of documents through three phases:
+
+1. ``prepare``: parse and chunk documents that have no chunks yet (locally).
+2. ``embeddings``: every chunk without a vector becomes one ``/v1/embeddings``
+   request. With a non-OpenAI ``EMBED_PROVIDER`` chunks are embedded locally
+   instead, since there is nothing to batch.
+3. ``extraction``: contexts are built from the stored chunks and every
+   document x trait becomes one ``/v1/responses`` request.
+
+Requests are written as Batch API JSONL files (split at ``BATCH_MAX_REQUESTS``),
+uploaded, polled and their outputs fanned back into ``Chunk`` and ``Trait``
+rows. Applying results is idempotent: embeddings overwrite the same chunk and
+a trait replaces any existing row of the same type, so a crashed run can be
+resumed from its manifest (``<BATCH_DIR>/<run_id>/manifest.json``) and output
+files can be applied twice. Context compression still embeds sentences with
+the configured provider synchronously.
+"""
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+from openai import OpenAI
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import TRAIT_TYPES, Chunk, Document, DocumentStatus, Trait
+from app.db.session import get_session
+from app.services import (
+    artifact_service,
+    dedup_service,
+    document_service,
+    extraction_service,
+    pipeline_service,
+    retrieval_service,
+    search_service,
+    section_service,
+)
+from app.services.embeddings_service import chunk_embedding, embed_texts, set_chunk_embedding
+from app.services.parsing_service import summarize_document
+
+logger = get_logger(__name__)
+
+EMBEDDINGS_ENDPOINT = "/v1/embeddings"
+RESPONSES_ENDPOINT = "/v1/responses"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+PHASES = ("prepare", "embeddings", "extraction", "done")
+
+
+@dataclass
+class BatchFile:
+    endpoint: str
+    input_path: str
+    requests: int
+    input_file_id: str | None = None
+    batch_id: str | None = None
+    status: str = "pending"
+    output_path: str | None = None
+    error_path: str | None = None
+    applied: bool = False
+
+
+@dataclass
+class BatchRun:
+    run_id: str
+    document_ids: list[str]
+    phase: str = "prepare"
+    batches: list[BatchFile] = field(default_factory=list)
+    applied_results: int = 0
+    failed_results: int = 0
+    # Documents with at least one extraction result applied; the rest end FAILED.
+    applied_documents: list[str] = field(default_factory=list)
+
+    @property
+    def directory(self) -> Path:
+        return batch_root() / self.run_id
+
+    def save(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / "manifest.json").write_text(json.dumps(asdict(self), indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, run_id: str) -> "BatchRun":
+        data = json.loads((batch_root() / run_id / "manifest.json").read_text(encoding="utf-8"))
+        data["batches"] = [BatchFile(**item) for item in data.get("batches", [])]
+        return cls(**data)
+
+
+def batch_root() -> Path:
+    return Path(settings.batch_dir or Path(settings.data_root) / "batches")
+
+
+@lru_cache
+def _client() -> OpenAI:
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured")
+    return OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url)
+
+
+def _read_jsonl(path: str | Path) -> Iterable[dict]:
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_request_files(run: BatchRun, name: str, endpoint: str, requests: list[dict]) -> list[BatchFile]:
+    """Write Batch API request lines, one file per ``BATCH_MAX_REQUESTS``."""
+
+    files: list[BatchFile] = []
+    size = max(1, settings.batch_max_requests)
+    for part, start in enumerate(range(0, len(requests), size)):
+        path = run.directory / f"{name}-{part:03d}.jsonl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as handle:
+            for request in requests[start : start + size]:
+                handle.write(json.dumps({"method": "POST", "url": endpoint, **request}) + "\n")
+        files.append(BatchFile(endpoint=endpoint, input_path=str(path), requests=min(size, len(requests) - start)))
+    return files
+
+
+def submit(batch: BatchFile, run_id: str) -> None:
+    client = _client()
+    if batch.input_file_id is None:
+        with open(batch.input_path, "rb") as handle:
+            batch.input_file_id = client.files.create(file=handle, purpose="batch").id
+    created = client.batches.create(
+        input_file_id=batch.input_file_id,
+        endpoint=batch.endpoint,
+        completion_window=settings.batch_completion_window,
+        metadata={"run_id": run_id},
+    )
+    batch.batch_id = created.id
+    batch.status = created.status
+    logger.info("Submitted batch %s (%s, %d requests)", batch.batch_id, batch.endpoint, batch.requests)
+
+
+def wait(batch: BatchFile, directory: Path) -> None:
+    """Poll until the batch finishes and download its output and error files."""
+
+    client = _client()
+    while True:
+        remote = client.batches.retrieve(batch.batch_id)
+        batch.status = remote.status
+        if remote.status in TERMINAL_STATUSES:
+            break
+        logger.info(
+            "Batch %s is %s; polling again in %.0fs",
+            batch.batch_id,
+            remote.status,
+            settings.batch_poll_seconds,
+        )
+        time.sleep(settings.batch_poll_seconds)
+
+    stem = Path(batch.input_path).stem
+    if remote.output_file_id:
+        path = directory / f"{stem}.output.jsonl"
+        path.write_bytes(client.files.content(remote.output_file_id).read())
+        batch.output_path = str(path)
+    if remote.error_file_id:
+        path = directory / f"{stem}.errors.jsonl"
+        path.write_bytes(client.files.content(remote.error_file_id).read())
+        batch.error_path = str(path)
+        logger.warning("Batch %s reported errors; see %s", batch.batch_id, path)
+    if remote.status != "completed":
+        logger.warning("Batch %s finished as %s", batch.batch_id, remote.status)
+
+
+def _successful_results(batch: BatchFile) -> Iterable[tuple[str, dict]]:
+    if not batch.output_path:
+        return
+    for line in _read_jsonl(batch.output_path):
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            continue
+        yield line["custom_id"], response["body"]
+
+
+# --- phases -----------------------------------------------------------------
+
+
+def prepare_documents(session: Session, document_ids: list[uuid.UUID]) -> None:
+    """Parse and chunk documents that have no chunks yet."""
+
+    for document_id in document_ids:
+        document = session.get(Document, document_id)
+        if document is None:
+            logger.warning("Document %s not found; skipping", document_id)
+            continue
+        if session.exec(select(Chunk.id).where(Chunk.document_id == document_id).limit(1)).first():
+            continue
+        document_service.mark_processing(session, document)
+        summary = summarize_document(
+            document.source_path, pipeline_service.element_metadata_sidecar(document)
+        )
+        pipeline_service.record_parse_summary(session, document, summary)
+        pipeline_service.replace_chunks(
+            session, document, pipeline_service.chunk_summary(summary), summary.get("sections")
+        )
+        session.commit()
+
+
+def _pending_chunks(session: Session, document_ids: list[uuid.UUID]) -> list[Chunk]:
+    statement = select(Chunk).where(Chunk.document_id.in_(document_ids), Chunk.embedding_vector.is_(None))
+    return [chunk for chunk in session.exec(statement).all() if chunk_embedding(chunk) is None]
+
+
+def embedding_requests(session: Session, document_ids: list[uuid.UUID]) -> list[dict]:
+    return [
+        {"custom_id": f"emb:{chunk.id}", "body": {"model": settings.openai_embed_model, "input": chunk.content}}
+        for chunk in _pending_chunks(session, document_ids)
+    ]
+
+
+def embed_locally(session: Session, document_ids: list[uuid.UUID], batch_size: int = 64) -> int:
+    chunks = _pending_chunks(session, document_ids)
+    for start in range(0, len(chunks), batch_size):
+        group = chunks[start : start + batch_size]
+        for chunk, vector in zip(group, embed_texts([chunk.content for chunk in group])):
+            set_chunk_embedding(chunk, vector)
+            session.add(chunk)
+        session.commit()
+    return len(chunks)
+
+
+def apply_embeddings(session: Session, batch: BatchFile) -> tuple[int, int]:
+    applied = skipped = 0
+    for custom_id, body in _successful_results(batch):
+        chunk = session.get(Chunk, uuid.UUID(custom_id.split(":", 1)[1]))
+        if chunk is None:  # re-chunked since the request was written
+            skipped += 1
+            continue
+        set_chunk_embedding(chunk, body["data"][0]["embedding"])
+        session.add(chunk)
+        applied += 1
+    session.commit()
+    return applied, skipped
+
+
+def extraction_requests(run: BatchRun, session: Session, document_ids: list[uuid.UUID]) -> list[dict]:
+    """Build one Responses request per document x trait; contexts go to a sidecar for applying."""
+
+    requests: list[dict] = []
+    contexts_path = run.directory / "contexts.jsonl"
+    contexts_path.parent.mkdir(parents=True, exist_ok=True)
+    with contexts_path.open("w", encoding="utf-8") as sidecar:
+        for document_id in document_ids:
+            for trait_type in TRAIT_TYPES:
+                context, supporting = retrieval_service.build_context_for_trait(
+                    session, document_id, trait_type, token_budget=1200
+                )
+                if not context or not supporting:
+                    continue
+                custom_id = f"trait:{document_id}:{trait_type}"
+                prompt, body = extraction_service.openai_request(trait_type, context)
+                requests.append({"custom_id": custom_id, "body": body})
+                sidecar.write(
+                    json.dumps(
+                        {
+                            "custom_id": custom_id,
+                            "prompt": prompt,
+                            "context": context,
+                            "chunk_ids": [str(chunk.id) for chunk in supporting],
+                        }
+                    )
+                    + "\n"
+                )
+    return requests
+
+
+def apply_extractions(run: BatchRun, session: Session, batch: BatchFile) -> tuple[int, int]:
+    contexts = {entry["custom_id"]: entry for entry in _read_jsonl(run.directory / "contexts.jsonl")}
+    applied = skipped = 0
+    for custom_id, body in _successful_results(batch):
+        _, document_id, trait_type = custom_id.split(":", 2)
+        entry = contexts.get(custom_id)
+        chunk_ids = [uuid.UUID(value) for value in (entry or {}).get("chunk_ids", [])]
+        chunks = session.exec(select(Chunk).where(Chunk.id.in_(chunk_ids))).all() if chunk_ids else []
+        if entry is None or len(chunks) != len(chunk_ids):
+            skipped += 1
+            continue
+        order = {chunk_id: index for index, chunk_id in enumerate(chunk_ids)}
+        chunks = sorted(chunks, key=lambda chunk: order[chunk.id])
+        extraction = extraction_service.openai_result(trait_type, entry["prompt"], body)
+        session.exec(
+            delete(Trait).where(Trait.document_id == uuid.UUID(document_id), Trait.trait_type == trait_type)
+        )
+        session.add(
+            pipeline_service.build_trait(
+                uuid.UUID(document_id),
+                trait_type,
+                extraction,
+                entry["context"],
+                chunks,
+                pipeline_service.trait_fingerprint(trait_type, entry["context"], provider="openai"),
+            )
+        )
+        if document_id not in run.applied_documents:
+            run.applied_documents.append(document_id)
+        applied += 1
+    session.commit()
+    return applied, skipped
+
+
+# --- orchestration ----------------------------------------------------------
+
+
+def _run_batches(run: BatchRun, endpoint: str, apply) -> None:
+    for batch in run.batches:
+        if batch.endpoint != endpoint or batch.applied:
+            continue
+        if batch.batch_id is None:
+            submit(batch, run.run_id)
+            run.save()
+        if batch.status not in TERMINAL_STATUSES or (batch.status == "completed" and not batch.output_path):
+            wait(batch, run.directory)
+            run.save()
+        with get_session() as session:
+            applied, skipped = apply(session, batch)
+        run.applied_results += applied
+        run.failed_results += batch.requests - applied - skipped
+        batch.applied = True
+        run.save()
+        logger.info("Applied %d results from batch %s (%d skipped)", applied, batch.batch_id, skipped)
+
+
+def start_run(document_ids: list[uuid.UUID]) -> BatchRun:
+    run = BatchRun(
+        run_id=f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}",
+        document_ids=[str(document_id) for document_id in document_ids],
+    )
+    run.save()
+    return run
+
+
+def _finish_document(session: Session, run: BatchRun, document_id: uuid.UUID) -> None:
+    """Post-process a document whose extractions were applied, then mark it completed (or failed)."""
+
+    document = session.get(Document, document_id)
+    if document is None:
+        return
+    if str(document_id) not in run.applied_documents:
+        # Failed/expired batches or errored lines: leave it for the next backfill.
+        document_service.mark_failed(session, document, "No batch extraction results were applied")
+        session.commit()
+        return
+    try:
+        section_service.embed_sections(session, document_id)
+        artifact_service.write_document_artifact(session, document_id)
+        dedup_service.index_document(session, document_id)
+        search_service.index_document(session, document_id)
+    except Exception as exc:
+        logger.exception("Post-processing failed for document %s", document_id)
+        session.rollback()
+        document_service.mark_failed(session, session.get(Document, document_id), f"Post-processing failed: {exc}")
+    else:
+        document_service.mark_completed(session, document)
+    session.commit()
+
+
+def _fail_unfinished(document_ids: list[uuid.UUID], error: str) -> None:
+    """Mark documents left PROCESSING by an interrupted run as failed."""
+
+    with get_session() as session:
+        for document_id in document_ids:
+            document = session.get(Document, document_id)
+            if document is not None and document.status == DocumentStatus.PROCESSING:
+                document_service.mark_failed(session, document, error)
+
+
+def advance(run: BatchRun) -> BatchRun:
+    """Drive a run to completion from whatever phase its manifest records."""
+
+    document_ids = [uuid.UUID(value) for value in run.document_ids]
+    try:
+        _advance_phases(run, document_ids)
+    except Exception as exc:
+        _fail_unfinished(document_ids, f"Batch run {run.run_id} failed during {run.phase}: {exc}")
+        raise
+    return run
+
+
+def _advance_phases(run: BatchRun, document_ids: list[uuid.UUID]) -> None:
+    if run.phase == "prepare":
+        with get_session() as session:
+            prepare_documents(session, document_ids)
+            if settings.embed_provider == "openai":
+                requests = embedding_requests(session, document_ids)
+                run.batches = write_request_files(run, "embeddings", EMBEDDINGS_ENDPOINT, requests)
+            else:
+                logger.info("Embedded %d chunks locally", embed_locally(session, document_ids))
+        run.phase = "embeddings"
+        run.save()
+
+    if run.phase == "embeddings":
+        _run_batches(run, EMBEDDINGS_ENDPOINT, apply_embeddings)
+        with get_session() as session:
+            requests = extraction_requests(run, session, document_ids)
+        run.batches += write_request_files(run, "extraction", RESPONSES_ENDPOINT, requests)
+        run.phase = "extraction"
+        run.save()
+
+    if run.phase == "extraction":
+        _run_batches(run, RESPONSES_ENDPOINT, lambda session, batch: apply_extractions(run, session, batch))
+        with get_session() as session:
+            for document_id in document_ids:
+                _finish_document(session, run, document_id)
+        run.phase = "done"
+        run.save()
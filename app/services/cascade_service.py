@@ -0,0 +1,206 @@
+"""Per-trait model cascade statistics and adaptive ordering."""
+from __future__ import annotations
+
+import atexit
+import fcntl
+import json
+import os
+import random
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+FLUSH_EVERY = 10
+STATS_FILENAME = "cascade_stats.json"
+
+
+@dataclass
+class ModelOutcome:
+    attempts: int = 0
+    answered: int = 0
+    total_seconds: float = 0.0
+
+    @property
+    def answer_rate(self) -> float:
+        return self.answered / self.attempts if self.attempts else 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.attempts if self.attempts else 0.0
+
+    def merge(self, other: "ModelOutcome") -> None:
+        self.attempts += other.attempts
+        self.answered += other.answered
+        self.total_seconds += other.total_seconds
+
+
+def _stats_path() -> Path:
+    return Path(settings.cascade_stats_path or Path(settings.data_root) / STATS_FILENAME)
+
+
+def _read_file(path: Path) -> dict[str, dict[str, ModelOutcome]]:
+    if not path.exists():
+        return {}
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8") or "{}")
+    except (OSError, json.JSONDecodeError) as exc:
+        logger.warning("Ignoring unreadable cascade stats %s: %s", path, exc)
+        return {}
+    return {
+        trait: {model: ModelOutcome(**values) for model, values in models.items()}
+        for trait, models in raw.items()
+    }
+
+
+class CascadeStats:
+    """Track answer rate and latency for each (trait, model) pair.
+
+    Counts are kept in memory and merged into a JSON file under ``data_root``
+    while holding an exclusive file lock, so several worker processes can share
+    one statistics file without losing each other's updates.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._totals = _read_file(path)
+        self._pending: dict[str, dict[str, ModelOutcome]] = {}
+        self._pending_count = 0
+
+    def record(self, trait_type: str, model_name: str, *, answered: bool, seconds: float) -> None:
+        with self._lock:
+            for table in (self._totals, self._pending):
+                outcome = table.setdefault(trait_type, {}).setdefault(model_name, ModelOutcome())
+                outcome.attempts += 1
+                outcome.answered += int(answered)
+                outcome.total_seconds += seconds
+            self._pending_count += 1
+            should_flush = self._pending_count >= FLUSH_EVERY
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Merge pending outcomes into the shared statistics file."""
+
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending, self._pending_count = self._pending, {}, 0
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            lock_path = self._path.with_suffix(".lock")
+            with lock_path.open("a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                merged = _read_file(self._path)
+                for trait, models in pending.items():
+                    for model, outcome in models.items():
+                        merged.setdefault(trait, {}).setdefault(model, ModelOutcome()).merge(outcome)
+                tmp_path = self._path.with_suffix(".tmp")
+                tmp_path.write_text(
+                    json.dumps(
+                        {
+                            trait: {model: asdict(outcome) for model, outcome in models.items()}
+                            for trait, models in merged.items()
+                        },
+                        indent=2,
+                        sort_keys=True,
+                    ),
+                    encoding="utf-8",
+                )
+                os.replace(tmp_path, self._path)
+        except OSError as exc:  # pragma: no cover - defensive logging
+            logger.warning("Failed to persist cascade stats: %s", exc)
+            return
+        with self._lock:
+            # Adopt counts written by other processes while keeping unflushed local ones.
+            for trait, models in self._pending.items():
+                for model, outcome in models.items():
+                    merged.setdefault(trait, {}).setdefault(model, ModelOutcome()).merge(outcome)
+            self._totals = merged
+
+    def outcome(self, trait_type: str, model_name: str) -> ModelOutcome:
+        with self._lock:
+            return self._totals.get(trait_type, {}).get(model_name, ModelOutcome())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                trait: {
+                    model: {
+                        **asdict(outcome),
+                        "answer_rate": round(outcome.answer_rate, 4),
+                        "mean_seconds": round(outcome.mean_seconds, 3),
+                    }
+                    for model, outcome in models.items()
+                }
+                for trait, models in self._totals.items()
+            }
+
+
+_stats: CascadeStats | None = None
+
+
+def get_stats() -> CascadeStats:
+    global _stats
+    if _stats is None:
+        _stats = CascadeStats(_stats_path())
+        atexit.register(_stats.flush)
+    return _stats
+
+
+def record_outcome(trait_type: str, model_name: str, *, answered: bool, seconds: float) -> None:
+    get_stats().record(trait_type, model_name, answered=answered, seconds=seconds)
+
+
+def flush_stats() -> None:
+    if _stats is not None:
+        _stats.flush()
+
+
+def order_models(trait_type: str, models: list[str]) -> list[str]:
+    """Return the cascade order for a trait given past outcomes.
+
+    Models with enough samples are ordered by expected seconds per answer
+    (mean latency / answer rate), which minimizes the expected cost of the
+    sequential fallback. Models that almost never answer the trait are skipped,
+    but the last remaining model is always kept. Occasionally the configured
+    order is used as-is so skipped models keep being re-evaluated.
+    """
+
+    if not settings.cascade_adaptive or len(models) < 2:
+        return list(models)
+    if random.random() < settings.cascade_explore_rate:
+        return list(models)
+
+    stats = get_stats()
+    scored: list[tuple[float, int, str]] = []
+    skipped: list[str] = []
+    for position, model in enumerate(models):
+        outcome = stats.outcome(trait_type, model)
+        if outcome.attempts < settings.cascade_min_samples:
+            # Not enough evidence yet: try it early so it gathers some.
+            scored.append((float("-inf"), position, model))
+            continue
+        if outcome.answer_rate < settings.cascade_skip_answer_rate:
+            skipped.append(model)
+            continue
+        scored.append((outcome.mean_seconds / outcome.answer_rate, position, model))
+
+    ordered = [model for _, _, model in sorted(scored)]
+    if not ordered and skipped:
+        ordered = skipped[-1:]
+    if ordered != list(models):
+        logger.debug("Cascade order for %s: %s (skipped %s)", trait_type, ordered, skipped)
+    return ordered
+
+
+def cascade_stats() -> dict:
+    """Expose cascade statistics as currently persisted by all workers."""
+
+    flush_stats()
+    return CascadeStats(_stats_path()).snapshot()
@@ -95,13 +95,18 @@ def chunk_elements(
     min_tokens: int = 120,
     overlap_tokens: int = 0,
 ) -> list[ChunkPayload]:
-    """Chunk layout-aware elements with token budgets."""
+    """Chunk layout-aware elements with token budgets.
+
+    Elements tagged by ``section_service.assign_sections`` also start a new chunk
+    at each section heading (without carrying overlap across it), and every chunk
+    records the ``section_key`` of its body text.
+    """
 
     chunk_payloads: list[ChunkPayload] = []
     buffer: list[dict] = []
     buffer_tokens = 0
 
-    def _flush_buffer() -> None:
+    def _flush_buffer(carry_overlap: bool = True) -> None:
         nonlocal buffer, buffer_tokens
         if not buffer:
             return
@@ -114,6 +119,10 @@ def chunk_elements(
             "element_types": list({item["type"] for item in buffer}),
             "source_pages": pages,
         }
+        body = [item for item in buffer if not item.get("heading") and item["type"] != "overlap"]
+        section_key = (body[0] if body else buffer[-1]).get("section_key")
+        if section_key is not None:
+            metadata["section_key"] = section_key
         chunk_payloads.append(
             ChunkPayload(
                 content=content,
@@ -123,7 +132,7 @@ def chunk_elements(
                 metadata=metadata,
             )
         )
-        if overlap_tokens > 0 and content:
+        if carry_overlap and overlap_tokens > 0 and content:
             overlap_texts = split_text_by_tokens(content, overlap_tokens, 0)
             if overlap_texts:
                 overlap_id = f"{metadata['element_ids'][-1]}:overlap"
@@ -134,6 +143,7 @@ def chunk_elements(
                         "text": overlap_texts[-1],
                         "type": "overlap",
                         "pages": tail_pages,
+                        "section_key": section_key,
                     }
                 ]
                 buffer_tokens = count_tokens(buffer[0]["text"])
@@ -155,7 +165,16 @@ def chunk_elements(
             "id": element_id,
             "type": element.get("element_type") or element.get("type") or "Unknown",
             "pages": pages,
+            "section_key": element.get("section_key"),
+            "heading": bool(element.get("section_heading")),
         }
+        if base["heading"]:
+            if any(not item.get("heading") and item["type"] != "overlap" for item in buffer):
+                _flush_buffer(carry_overlap=False)
+            elif buffer and buffer[0]["type"] == "overlap":
+                # Overlap belongs to the previous section.
+                buffer_tokens -= count_tokens(buffer[0]["text"])
+                buffer = buffer[1:]
         segments = [text]
         token_count = count_tokens(text)
         if token_count > max_tokens:
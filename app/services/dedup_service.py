@@ -0,0 +1,196 @@
+"""Near-duplicate chunk detection with MinHash and LSH banding.
+
+Each embedded chunk gets a MinHash signature over its word 3-gram shingles,
+stored with its LSH band keys in the database so every worker shares one
+index. A new chunk whose estimated Jaccard similarity to an indexed (or earlier
+in-document) chunk reaches ``NEAR_DUPLICATE_THRESHOLD`` reuses that donor's
+embedding and cached summaries instead of calling the models again.
+
+With 16 bands of 8 rows a pair at similarity 0.85 becomes a candidate with
+probability ~0.99, while pairs below ~0.6 rarely do.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import uuid
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import Chunk, ChunkSignature, ChunkSignatureBand
+from app.services.embeddings_service import embedding_model_name
+
+logger = get_logger(__name__)
+
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+QUERY_BATCH = 500
+_PRIME = (1 << 31) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache
+def _permutations() -> tuple[np.ndarray, np.ndarray]:
+    # Fixed seed: signatures are persisted and must stay comparable across processes.
+    rng = np.random.default_rng(20240601)
+    return (
+        rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64),
+        rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64),
+    )
+
+
+def signature(text: str) -> np.ndarray | None:
+    """MinHash signature of the text's word shingles, or ``None`` for empty text."""
+
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    shingles = {
+        " ".join(words[index : index + SHINGLE_WORDS]) for index in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+    ) % np.uint64(_PRIME)
+    a, b = _permutations()
+    return ((np.outer(a, hashes) + b[:, None]) % np.uint64(_PRIME)).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> list[str]:
+    return [
+        hashlib.blake2b(
+            bytes([band]) + sig[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND].tobytes(), digest_size=8
+        ).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+
+    return float(np.mean(first == second))
+
+
+def _indexed_candidates(
+    session: Session, keys: set[str]
+) -> tuple[dict[str, list[uuid.UUID]], dict[uuid.UUID, np.ndarray]]:
+    """Indexed chunks sharing any of ``keys`` (by key), and their signatures for the current embedding model."""
+
+    ordered = sorted(keys)
+    by_key: dict[str, list[uuid.UUID]] = {}
+    for start in range(0, len(ordered), QUERY_BATCH):
+        statement = select(ChunkSignatureBand.band_key, ChunkSignatureBand.chunk_id).where(
+            ChunkSignatureBand.band_key.in_(ordered[start : start + QUERY_BATCH])
+        )
+        for key, chunk_id in session.exec(statement):
+            by_key.setdefault(key, []).append(chunk_id)
+    chunk_ids = list({chunk_id for chunk_ids in by_key.values() for chunk_id in chunk_ids})
+    signatures: dict[uuid.UUID, np.ndarray] = {}
+    for start in range(0, len(chunk_ids), QUERY_BATCH):
+        statement = select(ChunkSignature.chunk_id, ChunkSignature.signature).where(
+            ChunkSignature.chunk_id.in_(chunk_ids[start : start + QUERY_BATCH]),
+            ChunkSignature.embedding_model == embedding_model_name(),
+        )
+        for chunk_id, packed in session.exec(statement):
+            signatures[chunk_id] = np.frombuffer(packed, dtype=np.uint32)
+    return by_key, signatures
+
+
+def find_donors(
+    session: Session, chunks: list[Chunk]
+) -> tuple[dict[uuid.UUID, np.ndarray], dict[uuid.UUID, uuid.UUID]]:
+    """Signatures for ``chunks`` and, for near-duplicates, the id of the most similar donor chunk.
+
+    Donors are indexed chunks from other documents or earlier chunks of the same list.
+    """
+
+    signatures = {
+        chunk.id: sig for chunk in chunks if (sig := signature(chunk.content or "")) is not None
+    }
+    threshold = settings.near_duplicate_threshold
+    if threshold is None or not signatures:
+        return signatures, {}
+
+    keys = {chunk_id: band_keys(sig) for chunk_id, sig in signatures.items()}
+    indexed_by_key, indexed = _indexed_candidates(session, {key for chunk_keys in keys.values() for key in chunk_keys})
+
+    donors: dict[uuid.UUID, uuid.UUID] = {}
+    local_by_key: dict[str, list[uuid.UUID]] = {}
+    for chunk in chunks:
+        sig = signatures.get(chunk.id)
+        if sig is None:
+            continue
+        candidates = {
+            candidate
+            for key in keys[chunk.id]
+            for candidate in (*indexed_by_key.get(key, ()), *local_by_key.get(key, ()))
+        }
+        best_score = threshold
+        for candidate in candidates:
+            other = indexed.get(candidate)
+            if other is None:
+                other = signatures.get(candidate)
+            if other is None:  # indexed for another embedding model
+                continue
+            score = similarity(sig, other)
+            if score >= best_score:
+                donors[chunk.id], best_score = candidate, score
+        for key in keys[chunk.id]:
+            local_by_key.setdefault(key, []).append(chunk.id)
+    return signatures, donors
+
+
+def inherit(chunk: Chunk, donor: Chunk) -> bool:
+    """Copy the donor's embedding and cached summaries onto ``chunk``; ``False`` if it has no embedding."""
+
+    if donor.embedding_vector:
+        chunk.embedding_vector, chunk.embedding = donor.embedding_vector, None
+    elif donor.embedding:
+        chunk.embedding = list(donor.embedding)
+    else:
+        return False
+    metadata = {**(chunk.metadata_json or {}), "near_duplicate_of": str(donor.id)}
+    summaries = (donor.metadata_json or {}).get("summaries")
+    if summaries:
+        metadata["summaries"] = dict(summaries)
+    chunk.metadata_json = metadata
+    return True
+
+
+def record_signatures(session: Session, chunks: list[Chunk], signatures: dict[uuid.UUID, np.ndarray]) -> int:
+    """Index the embedded chunks so later documents can reuse them."""
+
+    model_name = embedding_model_name()
+    recorded = 0
+    for chunk in chunks:
+        sig = signatures.get(chunk.id)
+        if sig is None or not (chunk.embedding_vector or chunk.embedding):
+            continue
+        session.add(
+            ChunkSignature(
+                chunk_id=chunk.id,
+                document_id=chunk.document_id,
+                embedding_model=model_name,
+                signature=sig.tobytes(),
+            )
+        )
+        for key in dict.fromkeys(band_keys(sig)):
+            session.add(ChunkSignatureBand(band_key=key, chunk_id=chunk.id))
+        recorded += 1
+    return recorded
+
+
+def index_document(session: Session, document_id: uuid.UUID) -> int:
+    """Index a document embedded outside ``pipeline_service.store_embeddings`` (e.g. by the batch backfill)."""
+
+    chunks = list(session.exec(select(Chunk).where(Chunk.document_id == document_id)).all())
+    session.exec(delete(ChunkSignatureBand).where(ChunkSignatureBand.chunk_id.in_([chunk.id for chunk in chunks])))
+    session.exec(delete(ChunkSignature).where(ChunkSignature.document_id == document_id))
+    signatures = {chunk.id: sig for chunk in chunks if (sig := signature(chunk.content or "")) is not None}
+    return record_signatures(session, chunks, signatures)
@@ -66,9 +66,8 @@ def update_document_status(
     document.status = status
     document.updated_at = datetime.utcnow()
     if metadata_updates:
-        base = document.metadata_json or {}
-        base.update(metadata_updates)
-        document.metadata_json = base
+        # A new dict, so the JSON column sees the change.
+        document.metadata_json = {**(document.metadata_json or {}), **metadata_updates}
     session.add(document)
     session.flush()
     return document
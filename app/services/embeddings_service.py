@@ -2,25 +2,76 @@
 from __future__ import annotations
 
 from functools import lru_cache
+from typing import Sequence
 
+import numpy as np
 from openai import OpenAI
 
 from app.core.config import settings
-from app.services.transformer_service import embed_text_local
+from app.core.metrics import EMBEDDING_CALLS, observe
+from app.db.models import Chunk
+from app.services import fake_model_service
+from app.services.transformer_service import embed_text_local, embed_texts_local
+from app.utils.vectors import pack_vector, unpack_vector
 
 
 @lru_cache
 def _client() -> OpenAI:
     if not settings.openai_api_key:
         raise RuntimeError("OPENAI_API_KEY is not configured")
-    return OpenAI(api_key=settings.openai_api_key)
+    return OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url)
+
+
+def embedding_model_name() -> str:
+    """Name of the configured embedding model; vectors from different models are not comparable."""
+
+    if settings.embed_provider == "transformers":
+        return settings.transformer_embed_model
+    if settings.embed_provider == "fake":
+        return f"fake-{settings.fake_embed_dim}"
+    return settings.openai_embed_model
 
 
 def embed_text(text: str) -> list[float]:
     """Generate embeddings via configured provider."""
 
-    if settings.embed_provider == "transformers":
-        return embed_text_local(text)
+    with observe(EMBEDDING_CALLS, provider=settings.embed_provider):
+        if settings.embed_provider == "transformers":
+            return embed_text_local(text)
+        if settings.embed_provider == "fake":
+            return fake_model_service.embed_text(text)
+
+        response = _client().embeddings.create(model=settings.openai_embed_model, input=text)
+        return response.data[0].embedding
+
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Generate embeddings for several texts as a float32 matrix (one row per text)."""
+
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    with observe(EMBEDDING_CALLS, provider=settings.embed_provider):
+        if settings.embed_provider == "transformers":
+            return np.asarray(embed_texts_local(texts), dtype=np.float32)
+        if settings.embed_provider == "fake":
+            return fake_model_service.embed_texts(texts)
+
+        response = _client().embeddings.create(model=settings.openai_embed_model, input=texts)
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+
+def set_chunk_embedding(chunk: Chunk, vector: Sequence[float]) -> None:
+    """Store an embedding on a chunk in the configured packed format."""
+
+    chunk.embedding_vector = pack_vector(vector, settings.embedding_storage_dtype)
+    chunk.embedding = None
+
+
+def chunk_embedding(chunk: Chunk) -> np.ndarray | None:
+    """Return a chunk's embedding as float32, reading legacy JSON rows too."""
 
-    response = _client().embeddings.create(model=settings.openai_embed_model, input=text)
-    return response.data[0].embedding
+    if chunk.embedding_vector:
+        return unpack_vector(chunk.embedding_vector)
+    if chunk.embedding:
+        return np.asarray(chunk.embedding, dtype=np.float32)
+    return None
@@ -1,70 +1,167 @@
 """Trait extraction orchestrator."""
 from __future__ import annotations
 
+import hashlib
 import re
+import time
 from functools import lru_cache
 
 from openai import OpenAI
 
 from app.core.config import settings
 from app.core.logging import get_logger
-from app.services.transformer_service import generate_text
-from app.utils.prompts import TRAIT_PROMPT_REGISTRY
+from app.core.metrics import LLM_CALLS, observe
+from app.services import cascade_service, fake_model_service, llm_cache_service
+from app.services.llm_cache_service import cached_generation
+from app.services.transformer_service import generate_text, generate_text_with_confidence, score_choices
+from app.utils.prompts import DEFAULT_OUTPUT_SPEC, TRAIT_OUTPUT_SPECS, TRAIT_PROMPT_REGISTRY, TraitOutputSpec
+from app.utils.tokenization import count_tokens
 
 logger = get_logger(__name__)
 
 LLAMA3_MARKERS = ("llama-3", "llama3")
 
+SYSTEM_PROMPT = (
+    "You are an expert government procurement analyst. Read the provided summary and evidence carefully. "
+    "Respond with the requested value only. Do not add commentary or extra sentences. "
+    "If the answer is not explicitly stated, reply with 'N/A'."
+)
+
+
+def _prompt_prefix(model_name: str | None = None) -> str:
+    """Model-specific prompt head shared by every trait (cacheable on causal models)."""
 
-def _build_prompt(trait_type: str, context: str, model_name: str | None = None) -> str:
-    instruction = TRAIT_PROMPT_REGISTRY.get(trait_type, f"Extract the trait: {trait_type}.")
-    system_prompt = (
-        "You are an expert government procurement analyst. Read the provided summary and evidence carefully. "
-        "Respond with the requested value only. Do not add commentary or extra sentences. "
-        "If the answer is not explicitly stated, reply with 'N/A'."
-    )
     lowered = (model_name or "").lower()
     if any(marker in lowered for marker in LLAMA3_MARKERS):
         return (
             "<|begin_of_text|>"
-            "<|start_header_id|>system<|end_header_id|>\n"
-            f"{system_prompt}\n"
-            "<|eot_id|>"
-            "<|start_header_id|>user<|end_header_id|>\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {instruction}\n"
-            "Answer with the value only.\n"
+            "<|start_header_id|>system<|end_header_id|>\n\n"
+            f"{SYSTEM_PROMPT}"
             "<|eot_id|>"
-            "<|start_header_id|>assistant<|end_header_id|>\n"
+            "<|start_header_id|>user<|end_header_id|>\n\n"
         )
-    return (
-        "[INST]\n"
-        f"<<SYS>>\n{system_prompt}\n<</SYS>>\n"
+    return f"[INST]\n<<SYS>>\n{SYSTEM_PROMPT}\n<</SYS>>\n"
+
+
+def _build_prompt(trait_type: str, context: str, model_name: str | None = None) -> str:
+    instruction = TRAIT_PROMPT_REGISTRY.get(trait_type, f"Extract the trait: {trait_type}.")
+    body = (
         f"Context:\n{context}\n\n"
         f"Question: {instruction}\n"
         "Answer with the value only.\n"
-        "[/INST]"
     )
+    lowered = (model_name or "").lower()
+    if any(marker in lowered for marker in LLAMA3_MARKERS):
+        # Llama 3's chat template opens every turn with a blank line after the header.
+        suffix = "<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+    else:
+        suffix = "[/INST]"
+    return _prompt_prefix(model_name) + body + suffix
+
+
+def prompt_signature(trait_type: str, provider: str | None = None) -> dict[str, str]:
+    """Identify how a trait is asked: a hash of its prompt template and output spec, and the models.
+
+    Stored with each trait so recomputation can skip traits whose prompt and model are unchanged.
+    """
+
+    provider = provider or settings.llm_provider
+    if provider == "transformers":
+        models = settings.transformer_llm_models or [settings.transformer_llm_model]
+        templates = [_build_prompt(trait_type, "", model_name) for model_name in models]
+        model_label = ",".join(models)
+    else:
+        templates = [_build_prompt(trait_type, "")]
+        model_label = "fake" if provider == "fake" else settings.openai_llm_model
+    spec = TRAIT_OUTPUT_SPECS.get(trait_type, DEFAULT_OUTPUT_SPEC)
+    digest = hashlib.sha256("\n".join([*templates, repr(spec)]).encode("utf-8")).hexdigest()
+    return {"prompt": digest[:16], "model": f"{provider}:{model_label}"}
 
 
 @lru_cache
 def _client() -> OpenAI:
     if not settings.openai_api_key:
         raise RuntimeError("OPENAI_API_KEY is not configured")
-    return OpenAI(api_key=settings.openai_api_key)
+    return OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url)
+
+
+def _openai_request_body(prompt: str, spec: TraitOutputSpec = DEFAULT_OUTPUT_SPEC) -> dict:
+    return {
+        "model": settings.openai_llm_model,
+        "input": [{"role": "user", "content": prompt}],
+        "temperature": 0.1,
+        # The Responses API rejects budgets below 16 tokens.
+        "max_output_tokens": max(16, spec.max_new_tokens),
+    }
+
+
+def _call_openai(prompt: str, spec: TraitOutputSpec = DEFAULT_OUTPUT_SPEC, attempt: int = 0) -> str:
+    body = _openai_request_body(prompt, spec)
+
+    def _create() -> str:
+        response = _client().responses.create(**body)
+        return response.output[0].content[0].text  # type: ignore[index]
 
+    # Sampling is not greedy, so retries after an empty answer are cached under their own key.
+    params = {key: value for key, value in body.items() if key not in {"model", "input"}}
+    return cached_generation("openai", body["model"], prompt, {**params, "attempt": attempt}, _create)
 
-def _call_openai(prompt: str) -> str:
-    response = _client().responses.create(
-        model=settings.openai_llm_model,
-        input=[{"role": "user", "content": prompt}],
-        temperature=0.1,
+
+def openai_request(trait_type: str, context: str) -> tuple[str, dict]:
+    """Prompt and Responses API body for a trait, as sent by ``extract_trait`` (used for batch files)."""
+
+    prompt = _build_prompt(trait_type, context)
+    return prompt, _openai_request_body(prompt, TRAIT_OUTPUT_SPECS.get(trait_type, DEFAULT_OUTPUT_SPEC))
+
+
+def openai_result(trait_type: str, prompt: str, response_body: dict) -> dict:
+    """Parse a Responses API body (e.g. from a batch output file) like a live call."""
+
+    text = ""
+    for item in response_body.get("output") or []:
+        if item.get("type") == "message" and item.get("content"):
+            text = item["content"][0].get("text", "")
+            break
+    model_name = response_body.get("model", settings.openai_llm_model)
+    return _with_usage(_parse_response(trait_type, text), model_name, prompt, text)
+
+
+def _call_fake(prompt: str, spec: TraitOutputSpec = DEFAULT_OUTPUT_SPEC, attempt: int = 0) -> str:
+    return fake_model_service.generate(prompt, max_new_tokens=spec.max_new_tokens, choices=spec.choices)
+
+
+def _call_transformer(
+    prompt: str,
+    model_name: str | None = None,
+    spec: TraitOutputSpec = DEFAULT_OUTPUT_SPEC,
+) -> str:
+    return generate_text(
+        prompt,
+        model_name=model_name,
+        max_new_tokens=spec.max_new_tokens,
+        prefix=_prompt_prefix(model_name),
+        stop_strings=spec.stop_strings,
     )
-    return response.output[0].content[0].text  # type: ignore[index]
 
 
-def _call_transformer(prompt: str, model_name: str | None = None) -> str:
-    return generate_text(prompt, model_name=model_name)
+def _call_transformer_scored(
+    prompt: str,
+    model_name: str | None = None,
+    spec: TraitOutputSpec = DEFAULT_OUTPUT_SPEC,
+) -> tuple[str, float | None]:
+    if spec.answer_type == "yes_no":
+        choice, probability = score_choices(prompt, spec.choices, model_name=model_name, prefix=_prompt_prefix(model_name))
+        # Two-way scoring always picks something; an undecided model answers N/A so the next one is tried.
+        if probability < spec.min_choice_probability:
+            return "N/A", probability
+        return choice, probability
+    return generate_text_with_confidence(
+        prompt,
+        model_name=model_name,
+        max_new_tokens=spec.max_new_tokens,
+        prefix=_prompt_prefix(model_name),
+        stop_strings=spec.stop_strings,
+    )
 
 
 _NOISE_PATTERNS = [
@@ -82,11 +179,11 @@ def _clean_response_text(text: str) -> str:
     cleaned = text.strip()
     for pattern in _NOISE_PATTERNS:
         cleaned = re.sub(pattern, "", cleaned, flags=re.IGNORECASE).strip()
-    # collapse excessive whitespace but keep punctuation
-    cleaned = re.sub(r"\s+", " ", cleaned)
     # keep only the first sentence/line if multiple answers were returned
     if "\n" in cleaned:
         cleaned = cleaned.split("\n", 1)[0].strip()
+    # collapse excessive whitespace but keep punctuation
+    cleaned = re.sub(r"\s+", " ", cleaned)
     return cleaned
 
 
@@ -103,24 +200,69 @@ def _parse_response(trait_type: str, text: str) -> dict:
     }
 
 
+def _empty_result() -> dict:
+    return {"value": None, "confidence": None, "pages": None, "evidence": None, "details": None}
+
+
+def _with_usage(data: dict, model_name: str, prompt: str, text: str) -> dict:
+    """Attach the answering model and approximate token usage to a result."""
+
+    data["model"] = model_name
+    data["tokens_in"] = count_tokens(prompt)
+    data["tokens_out"] = count_tokens(text)
+    return data
+
+
 def extract_trait(trait_type: str, context: str) -> dict:
     """Call configured LLM provider to extract a trait from provided context."""
 
-    model_candidates = settings.transformer_llm_models or [settings.transformer_llm_model]
+    configured = settings.transformer_llm_models or [settings.transformer_llm_model]
+    spec = TRAIT_OUTPUT_SPECS.get(trait_type, DEFAULT_OUTPUT_SPEC)
+    if settings.llm_provider != "transformers":
+        call = _call_fake if settings.llm_provider == "fake" else _call_openai
+        model_label = "fake" if settings.llm_provider == "fake" else settings.openai_llm_model
+        prompt = _build_prompt(trait_type, context)
+        for attempt, _ in enumerate(configured):
+            with observe(LLM_CALLS, provider=settings.llm_provider, model=model_label, kind="extract"):
+                text = call(prompt, spec, attempt)
+            data = _with_usage(_parse_response(trait_type, text), model_label, prompt, text)
+            if data["value"] is not None:
+                return data
+        return _empty_result()
+
+    model_candidates = cascade_service.order_models(trait_type, configured)
+    min_confidence = settings.cascade_min_confidence
+    best: dict | None = None
     for model_name in model_candidates:
-        prompt = _build_prompt(
-            trait_type,
-            context,
-            model_name if settings.llm_provider == "transformers" else None,
-        )
-        if settings.llm_provider == "transformers":
-            logger.debug("Extracting %s with transformer model %s", trait_type, model_name)
-            text = _call_transformer(prompt, model_name=model_name)
-        else:
-            text = _call_openai(prompt)
-        data = _parse_response(trait_type, text)
-        if data["value"] is not None:
-            if model_name != model_candidates[0]:
-                logger.info("Trait %s answered by fallback model %s", trait_type, model_name)
+        prompt = _build_prompt(trait_type, context, model_name)
+        logger.debug("Extracting %s with transformer model %s", trait_type, model_name)
+        started = time.perf_counter()
+        confidence = None
+        with (
+            observe(LLM_CALLS, provider="transformers", model=model_name, kind="extract"),
+            llm_cache_service.tracking() as cache_usage,
+        ):
+            if min_confidence is None and spec.answer_type != "yes_no":
+                text = _call_transformer(prompt, model_name=model_name, spec=spec)
+            else:
+                text, confidence = _call_transformer_scored(prompt, model_name=model_name, spec=spec)
+        data = _with_usage(_parse_response(trait_type, text), model_name, prompt, text)
+        data["confidence"] = confidence
+        # Cached answers take ~0 s and would drag the model's mean latency towards zero.
+        if not cache_usage.served_from_cache:
+            cascade_service.record_outcome(
+                trait_type,
+                model_name,
+                answered=data["value"] is not None,
+                seconds=time.perf_counter() - started,
+            )
+        if data["value"] is None:
+            continue
+        if min_confidence is None or (confidence is not None and confidence >= min_confidence):
+            if model_name != configured[0]:
+                logger.info("Trait %s answered by model %s", trait_type, model_name)
             return data
-    return {"value": None, "confidence": None, "pages": None, "evidence": None, "details": None}
+        # Low-confidence answer: keep it as a fallback and let the next model try.
+        if best is None or (confidence or 0.0) > (best["confidence"] or 0.0):
+            best = data
+    return best or _empty_result()
@@ -0,0 +1,79 @@
+"""Deterministic stand-in model provider for load tests and benchmarks.
+
+Selected with ``LLM_PROVIDER=fake`` and/or ``EMBED_PROVIDER=fake``. Outputs and
+latencies are derived from a hash of the input and ``FAKE_SEED``, so the same
+document always produces the same traits and the same timing profile.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import random
+import re
+import time
+
+import numpy as np
+
+from app.core.config import settings
+
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9&/-]+")
+
+
+def _rng(kind: str, text: str) -> random.Random:
+    digest = hashlib.blake2b(f"{settings.fake_seed}:{kind}:{text}".encode("utf-8"), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, "little"))
+
+
+def _sleep(rng: random.Random, median_ms: float) -> None:
+    """Sleep for a log-normal latency with the given median (sigma 0 = fixed)."""
+
+    if median_ms <= 0:
+        return
+    sigma = settings.fake_latency_sigma
+    latency_ms = rng.lognormvariate(math.log(median_ms), sigma) if sigma > 0 else median_ms
+    time.sleep(latency_ms / 1000.0)
+
+
+def fake_embedding(text: str, dim: int | None = None) -> list[float]:
+    """Hashed bag-of-words unit vector; similar texts get similar vectors."""
+
+    size = dim or settings.fake_embed_dim
+    vector = np.zeros(size, dtype=np.float32)
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % size
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    return (vector / norm if norm else vector).tolist()
+
+
+def embed_text(text: str) -> list[float]:
+    _sleep(_rng("embed", text), settings.fake_embed_latency_ms)
+    return fake_embedding(text)
+
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    # One simulated round trip per batch, like a real batched encoder call.
+    _sleep(_rng("embed", "".join(texts[:1])), settings.fake_embed_latency_ms)
+    return np.asarray([fake_embedding(text) for text in texts], dtype=np.float32)
+
+
+def generate(prompt: str, *, max_new_tokens: int = 64, choices: tuple[str, ...] = ()) -> str:
+    """Return a plausible answer: ``N/A`` at ``FAKE_NA_RATE``, a choice, or words lifted from the prompt."""
+
+    rng = _rng("generate", prompt)
+    _sleep(rng, settings.fake_llm_latency_ms)
+    if rng.random() < settings.fake_na_rate:
+        return "N/A"
+    if choices:
+        return rng.choice(choices)
+    words = WORD_RE.findall(prompt)
+    if not words:
+        return "N/A"
+    length = max(1, min(max_new_tokens // 2, rng.randint(2, 12)))
+    start = rng.randrange(len(words))
+    return " ".join(words[start : start + length])
+
+
+def summarize(text: str, trait: str) -> str:
+    return generate(f"{trait}\n{text}", max_new_tokens=200)
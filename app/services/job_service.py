@@ -4,9 +4,10 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlmodel import Session
+from sqlmodel import Session, select
 
 from app.db.models import ProcessingJob, ProcessingStatus
+from app.db.session import get_autocommit_session
 
 
 def create_job(session: Session, document_id: uuid.UUID, task_id: str | None = None) -> ProcessingJob:
@@ -16,6 +17,15 @@ def create_job(session: Session, document_id: uuid.UUID, task_id: str | None = N
     return job
 
 
+def get_latest_job(session: Session, document_id: uuid.UUID) -> ProcessingJob | None:
+    statement = (
+        select(ProcessingJob)
+        .where(ProcessingJob.document_id == document_id)
+        .order_by(ProcessingJob.created_at.desc())
+    )
+    return session.exec(statement).first()
+
+
 def update_job(
     session: Session,
     job: ProcessingJob,
@@ -23,6 +33,7 @@ def update_job(
     status: str | None = None,
     step: str | None = None,
     error: str | None = None,
+    spans: list[dict] | None = None,
 ) -> ProcessingJob:
     if status:
         job.status = status
@@ -34,6 +45,94 @@ def update_job(
         job.step = step
     if error:
         job.error_message = error
+    if spans is not None:
+        job.spans = spans
     session.add(job)
     session.flush()
     return job
+
+
+def record_progress(
+    job_id: uuid.UUID | None,
+    *,
+    status: str | None = None,
+    step: str | None = None,
+    error: str | None = None,
+    spans: list[dict] | None = None,
+) -> None:
+    """``update_job`` on its own autocommit connection, visible at once and independent of the caller's transaction."""
+
+    if job_id is None:
+        return
+    with get_autocommit_session() as session:
+        job = session.get(ProcessingJob, job_id)
+        if job is not None:
+            update_job(session, job, status=status, step=step, error=error, spans=spans)
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _stage_rows(per_job: dict[str, list[float]], span_counts: dict[str, int], grand_total: float) -> list[dict]:
+    rows = []
+    for stage, totals in per_job.items():
+        rows.append(
+            {
+                "stage": stage,
+                "jobs": len(totals),
+                "spans": span_counts[stage],
+                "mean_ms": round(sum(totals) / len(totals), 2),
+                "p50_ms": round(_percentile(totals, 0.5), 2),
+                "p95_ms": round(_percentile(totals, 0.95), 2),
+                "max_ms": round(max(totals), 2),
+                "share": round(sum(totals) / grand_total, 4) if grand_total else 0.0,
+            }
+        )
+    rows.sort(key=lambda row: row["mean_ms"], reverse=True)
+    return rows
+
+
+def stage_report(session: Session, limit: int = 50) -> dict:
+    """Aggregate span durations across the most recent successful jobs.
+
+    Durations are summed per job first, so ``mean_ms`` is the average time a
+    job spends in a stage and ``share`` is the stage's fraction of all recorded
+    time. Extraction spans are also broken down per trait.
+    """
+
+    statement = (
+        select(ProcessingJob)
+        .where(ProcessingJob.status == ProcessingStatus.SUCCESS, ProcessingJob.spans.is_not(None))
+        .order_by(ProcessingJob.created_at.desc())
+        .limit(limit)
+    )
+    jobs = [job for job in session.exec(statement).all() if job.spans]
+
+    stage_totals: dict[str, list[float]] = {}
+    stage_counts: dict[str, int] = {}
+    trait_totals: dict[str, list[float]] = {}
+    trait_counts: dict[str, int] = {}
+    for job in jobs:
+        per_stage: dict[str, float] = {}
+        per_trait: dict[str, float] = {}
+        for record in job.spans:
+            duration = float(record.get("duration_ms", 0.0))
+            per_stage[record["name"]] = per_stage.get(record["name"], 0.0) + duration
+            stage_counts[record["name"]] = stage_counts.get(record["name"], 0) + 1
+            if record.get("trait"):
+                key = f"{record['name']}:{record['trait']}"
+                per_trait[key] = per_trait.get(key, 0.0) + duration
+                trait_counts[key] = trait_counts.get(key, 0) + 1
+        for name, total in per_stage.items():
+            stage_totals.setdefault(name, []).append(total)
+        for key, total in per_trait.items():
+            trait_totals.setdefault(key, []).append(total)
+
+    grand_total = sum(sum(totals) for totals in stage_totals.values())
+    return {
+        "jobs": len(jobs),
+        "stages": _stage_rows(stage_totals, stage_counts, grand_total),
+        "slowest_traits": _stage_rows(trait_totals, trait_counts, grand_total)[:10],
+    }
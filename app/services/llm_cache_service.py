@@ -0,0 +1,246 @@
+"""Content-addressed cache of LLM generations.
+
+Responses are keyed by provider, model, a hash of the full prompt and the
+decoding parameters, so re-running extraction on an unchanged document (or
+repeating a prompt across retries and fallback models) is answered without a
+model call. Two backends:
+
+- ``sqlite`` (default): one file under ``data_root`` shared by the worker
+  processes of a host, in WAL mode; expired and least recently used entries
+  beyond ``LLM_CACHE_MAX_ENTRIES`` are evicted as new entries are written.
+- ``redis``: shared across hosts through ``REDIS_URL``; entries expire with
+  their TTL, and a sorted set of write times trims the oldest beyond the limit.
+
+Hits and misses are counted on the active timing span (``llm_cache_hits`` /
+``llm_cache_misses``), which gives each job's hit rate. Inside ``refreshing()``
+(forced recomputes) lookups are skipped but fresh responses are still stored.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import record_cache
+from app.services.timing_service import count
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+CACHE_FILENAME = "llm_cache.sqlite3"
+REDIS_PREFIX = "rfp:llm_cache:"
+REDIS_INDEX = REDIS_PREFIX + "index"
+EVICT_EVERY = 100
+
+_refresh: ContextVar[bool] = ContextVar("llm_cache_refresh", default=False)
+
+
+@dataclass
+class CacheUsage:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def served_from_cache(self) -> bool:
+        """Every generation in the block was a cache hit, so no model ran."""
+
+        return self.hits > 0 and self.misses == 0
+
+
+_usage: ContextVar[CacheUsage | None] = ContextVar("llm_cache_usage", default=None)
+
+
+def cache_key(provider: str, model: str, prompt: str, params: dict[str, Any]) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps([provider, model, prompt_hash, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseCache:
+    def __init__(self, path: Path, ttl_seconds: int, max_entries: int) -> None:
+        self._path = path
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_accessed_at ON response (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value FROM response WHERE key = ? AND created_at >= ?", (key, now - self._ttl)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE response SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0] if row else None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO response (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 1:
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM response WHERE created_at < ?", (now - self._ttl,))
+        conn.execute(
+            "DELETE FROM response WHERE key IN ("
+            "SELECT key FROM response ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM response")
+
+
+class RedisResponseCache:
+    def __init__(self, url: str, ttl_seconds: int, max_entries: int) -> None:
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=2)
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+
+    def get(self, key: str) -> str | None:
+        value = self._client.get(REDIS_PREFIX + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def put(self, key: str, value: str) -> None:
+        pipe = self._client.pipeline()
+        pipe.set(REDIS_PREFIX + key, value, ex=self._ttl)
+        pipe.zadd(REDIS_INDEX, {key: time.time()})
+        pipe.zcard(REDIS_INDEX)
+        size = pipe.execute()[-1]
+        if size > self._max_entries:
+            evicted = [member.decode("utf-8") for member, _ in self._client.zpopmin(REDIS_INDEX, size - self._max_entries)]
+            if evicted:
+                self._client.delete(*(REDIS_PREFIX + member for member in evicted))
+
+    def clear(self) -> None:
+        keys = [REDIS_PREFIX + member.decode("utf-8") for member in self._client.zrange(REDIS_INDEX, 0, -1)]
+        self._client.delete(REDIS_INDEX, *keys)
+
+
+_cache: SQLiteResponseCache | RedisResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SQLiteResponseCache | RedisResponseCache | None:
+    """The configured backend, or ``None`` when ``LLM_CACHE_BACKEND`` is unset."""
+
+    global _cache
+    backend = settings.llm_cache_backend
+    if backend is None:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            ttl, limit = settings.llm_cache_ttl_seconds, settings.llm_cache_max_entries
+            if backend == "redis":
+                _cache = RedisResponseCache(settings.redis_url, ttl, limit)
+            else:
+                path = Path(settings.llm_cache_path or Path(settings.data_root) / CACHE_FILENAME)
+                _cache = SQLiteResponseCache(path, ttl, limit)
+    return _cache
+
+
+@contextmanager
+def refreshing(enabled: bool = True) -> Iterator[None]:
+    """Within this block, call the model instead of reading the cache, and overwrite the entry."""
+
+    token = _refresh.set(enabled)
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+@contextmanager
+def tracking() -> Iterator[CacheUsage]:
+    """Count the cache hits and misses of the generations made inside this block."""
+
+    usage = CacheUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def cached_generation(
+    provider: str,
+    model: str,
+    prompt: str,
+    params: dict[str, Any],
+    generate: Callable[[], T],
+) -> T:
+    """Return the cached response for this request, or call ``generate`` and cache its result.
+
+    Results must be JSON-serializable; tuples come back as tuples. Cache
+    failures are logged and fall through to ``generate``.
+    """
+
+    cache = get_cache()
+    if cache is None:
+        return generate()
+    key = cache_key(provider, model, prompt, params)
+    stored = None
+    if not _refresh.get():
+        try:
+            stored = cache.get(key)
+        except Exception as exc:  # pragma: no cover - backend unavailable
+            logger.warning("LLM cache lookup failed: %s", exc)
+    record_cache("llm_response", stored is not None)
+    count("llm_cache_hits" if stored is not None else "llm_cache_misses")
+    usage = _usage.get()
+    if usage is not None:
+        if stored is not None:
+            usage.hits += 1
+        else:
+            usage.misses += 1
+    if stored is not None:
+        entry = json.loads(stored)
+        return tuple(entry["value"]) if entry["tuple"] else entry["value"]
+
+    result = generate()
+    try:
+        cache.put(key, json.dumps({"value": result, "tuple": isinstance(result, tuple)}))
+    except Exception as exc:  # pragma: no cover - backend unavailable
+        logger.warning("LLM cache write failed: %s", exc)
+    return result
+
+
+def clear_cache() -> None:
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
@@ -0,0 +1,275 @@
+"""Resident model management with a memory budget."""
+from __future__ import annotations
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import MODEL_RESIDENT_BYTES
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+DEFAULT_BUDGET_FRACTION = 0.6
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".onnx")
+
+
+@dataclass
+class ResidentModel:
+    key: str
+    kind: str
+    name: str
+    model: Any
+    size_bytes: int
+    load_seconds: float
+    loaded_at: float = field(default_factory=time.time)
+    last_used_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+    def describe(self) -> dict:
+        return {
+            "key": self.key,
+            "kind": self.kind,
+            "name": self.name,
+            "size_mb": round(self.size_bytes / MB, 1),
+            "load_seconds": round(self.load_seconds, 2),
+            "loaded_at": self.loaded_at,
+            "last_used_at": self.last_used_at,
+            "hits": self.hits,
+        }
+
+
+def _physical_memory_bytes() -> int | None:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):  # pragma: no cover - non-POSIX hosts
+        return None
+
+
+def _default_budget_bytes(processes: int = 1) -> int | None:
+    """Per-process budget: ``TRANSFORMER_MEMORY_BUDGET_MB``, else a share of 60% of RAM."""
+
+    if settings.transformer_memory_budget_mb is not None:
+        return settings.transformer_memory_budget_mb * MB
+    physical = _physical_memory_bytes()
+    if physical is None:
+        return None
+    return int(physical * DEFAULT_BUDGET_FRACTION / max(processes, 1))
+
+
+def estimate_checkpoint_bytes(model_name: str) -> int | None:
+    """Size of a model's weight files on local disk, or ``None`` if it is not available offline."""
+
+    path = Path(model_name)
+    if not path.is_dir():
+        try:
+            from huggingface_hub import snapshot_download
+
+            path = Path(snapshot_download(model_name, local_files_only=True))
+        except Exception:
+            return None
+    sizes: dict[str, int] = {}
+    for file in path.rglob("*"):
+        if file.suffix in WEIGHT_SUFFIXES and file.is_file():
+            sizes[file.suffix] = sizes.get(file.suffix, 0) + file.stat().st_size
+    if not sizes:
+        return None
+    # Repositories often ship the same weights in several formats; only one is loaded.
+    return sizes.get(".safetensors") or max(sizes.values())
+
+
+def estimate_model_bytes(obj: Any) -> int:
+    """Approximate memory held by a pipeline or module (parameters + buffers)."""
+
+    module = getattr(obj, "model", obj)
+    total = 0
+    for attr in ("parameters", "buffers"):
+        tensors = getattr(module, attr, None)
+        if not callable(tensors):
+            continue
+        try:
+            for tensor in tensors():
+                total += tensor.numel() * tensor.element_size()
+        except Exception:  # pragma: no cover - defensive for exotic wrappers
+            continue
+    return total
+
+
+def _release_memory() -> None:
+    gc.collect()
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:  # pragma: no cover - torch optional at this layer
+        pass
+
+
+class ModelManager:
+    """Keep loaded models resident while their combined size fits the budget.
+
+    Models are evicted least-recently-used first. A model larger than the whole
+    budget is still served (and becomes the only resident model) so callers never
+    fail because of the budget.
+    """
+
+    def __init__(self, budget_bytes: int | None = None) -> None:
+        self._budget_bytes = budget_bytes
+        self._entries: OrderedDict[str, ResidentModel] = OrderedDict()
+        self._known_sizes: dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def budget_bytes(self) -> int | None:
+        return self._budget_bytes
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def set_budget(self, budget_bytes: int | None) -> None:
+        with self._lock:
+            self._budget_bytes = budget_bytes
+            self._evict_until_fits(0, keep=None)
+
+    def get(
+        self,
+        kind: str,
+        name: str,
+        loader: Callable[[], Any],
+        expected_bytes: Callable[[], int | None] | None = None,
+    ) -> Any:
+        """Return a resident model, loading it if needed.
+
+        Others are evicted before the load to make room for its known or
+        ``expected_bytes`` size; when neither is known, everything else is evicted.
+        """
+
+        key = f"{kind}:{name}"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.hits += 1
+                entry.last_used_at = time.time()
+                self._entries.move_to_end(key)
+                return entry.model
+
+            expected = self._known_sizes.get(key)
+            if expected is None and expected_bytes is not None:
+                expected = expected_bytes()
+            if expected is None:
+                expected = self._budget_bytes or 0
+            self._evict_until_fits(expected, keep=None)
+
+            started = time.perf_counter()
+            model = loader()
+            elapsed = time.perf_counter() - started
+            size = estimate_model_bytes(model)
+            self._known_sizes[key] = size
+            self._entries[key] = ResidentModel(
+                key=key,
+                kind=kind,
+                name=name,
+                model=model,
+                size_bytes=size,
+                load_seconds=elapsed,
+            )
+            MODEL_RESIDENT_BYTES.labels(kind=kind, name=name).set(size)
+            logger.info("Loaded %s %s (%.1f MB) in %.1fs", kind, name, size / MB, elapsed)
+            self._evict_until_fits(0, keep=key)
+            return model
+
+    def evict(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            logger.info("Evicting %s (%.1f MB)", key, entry.size_bytes / MB)
+            MODEL_RESIDENT_BYTES.labels(kind=entry.kind, name=entry.name).set(0)
+            del entry
+            _release_memory()
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                MODEL_RESIDENT_BYTES.labels(kind=entry.kind, name=entry.name).set(0)
+            self._entries.clear()
+            _release_memory()
+
+    def snapshot(self) -> dict:
+        """Describe resident models and budget usage."""
+
+        with self._lock:
+            budget = self._budget_bytes
+            return {
+                "budget_mb": round(budget / MB, 1) if budget is not None else None,
+                "resident_mb": round(self.resident_bytes / MB, 1),
+                "models": [entry.describe() for entry in self._entries.values()],
+            }
+
+    def _evict_until_fits(self, incoming_bytes: int, keep: str | None) -> None:
+        if self._budget_bytes is None:
+            return
+        while self._entries and self.resident_bytes + incoming_bytes > self._budget_bytes:
+            victim = next((key for key in self._entries if key != keep), None)
+            if victim is None:
+                logger.warning(
+                    "Model %s (%.1f MB) exceeds memory budget of %.1f MB",
+                    keep,
+                    self.resident_bytes / MB,
+                    self._budget_bytes / MB,
+                )
+                return
+            self.evict(victim)
+
+
+model_manager = ModelManager(budget_bytes=_default_budget_bytes())
+
+
+def resident_models() -> dict:
+    """Return the current residency snapshot for this process."""
+
+    return model_manager.snapshot()
+
+
+def configure_worker_budget(processes: int) -> None:
+    """Split the default budget between a prefork worker's child processes.
+
+    Called in the parent before it forks, so each child starts with its share.
+    An explicit ``TRANSFORMER_MEMORY_BUDGET_MB`` is already per process.
+    """
+
+    model_manager.set_budget(_default_budget_bytes(processes))
+    budget = model_manager.budget_bytes
+    logger.info(
+        "Model memory budget per worker process: %s",
+        f"{budget / MB:.0f} MB" if budget is not None else "unlimited",
+    )
+
+
+def warmup_models() -> dict:
+    """Load the configured embedding and generation models into memory."""
+
+    from app.services import transformer_service
+
+    if settings.embed_provider == "transformers":
+        try:
+            transformer_service._embedding_model()
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.warning("Embedding warmup failed: %s", exc)
+    if settings.llm_provider == "transformers":
+        for model_name in settings.transformer_llm_models or [settings.transformer_llm_model]:
+            try:
+                transformer_service._generation_pipeline(model_name)
+            except Exception as exc:  # pragma: no cover - defensive logging
+                logger.warning("Generator warmup failed for %s: %s", model_name, exc)
+    return resident_models()
@@ -1,6 +1,7 @@
 """PDF parsing and layout-aware extraction."""
 from __future__ import annotations
 
+import json
 import uuid
 from dataclasses import dataclass
 from pathlib import Path
@@ -9,6 +10,7 @@ from typing import Iterator
 import fitz  # type: ignore
 
 from app.core.logging import get_logger
+from app.services.section_service import assign_sections
 from app.utils.tokenization import count_tokens
 
 logger = get_logger(__name__)
@@ -26,15 +28,44 @@ class ParsedPage:
     tokens: int
 
 
-@dataclass
+# Element metadata read downstream (section levels); the rest only goes to the optional sidecar.
+ELEMENT_METADATA_FIELDS = ("category_depth",)
+
+
+@dataclass(slots=True)
 class ParsedElement:
+    """A layout element with projected metadata.
+
+    Supports ``get`` and item access by field name, so chunking and sectioning
+    treat it like the plain element dicts they also accept.
+    """
+
     element_id: str
     text: str
     element_type: str
     page_numbers: list[int]
     tokens: int
-    metadata: dict
+    metadata: dict | None = None
     structured_text: str | None = None
+    section_key: str | None = None
+    section_heading: bool = False
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value) -> None:
+        setattr(self, key, value)
+
+
+def _project_metadata(metadata: dict) -> dict | None:
+    projected = {key: metadata[key] for key in ELEMENT_METADATA_FIELDS if metadata.get(key) is not None}
+    return projected or None
 
 
 def extract_pages(pdf_path: str) -> Iterator[ParsedPage]:
@@ -52,8 +83,12 @@ def extract_pages(pdf_path: str) -> Iterator[ParsedPage]:
     document.close()
 
 
-def _extract_elements(pdf_path: str) -> list[ParsedElement]:
-    """Run unstructured parsing to capture layout-aware elements."""
+def _extract_elements(pdf_path: str, metadata_sidecar: Path | None = None) -> list[ParsedElement]:
+    """Run unstructured parsing to capture layout-aware elements.
+
+    Elements keep only ``ELEMENT_METADATA_FIELDS``; with ``metadata_sidecar`` the
+    full metadata of each element is written there as JSON lines.
+    """
 
     if partition_pdf is None:
         logger.warning("unstructured library unavailable; skipping element extraction")
@@ -70,52 +105,68 @@ def _extract_elements(pdf_path: str) -> list[ParsedElement]:
         logger.warning("unstructured parsing failed: %s", exc)
         return []
 
-    for element in parsed:
-        text = (getattr(element, "text", "") or "").strip()
-        metadata_obj = getattr(element, "metadata", None)
-        metadata = metadata_obj.to_dict() if metadata_obj else {}
-        element_type = getattr(element, "category", element.__class__.__name__)
-        structured_text = metadata.get("text_as_markdown") or metadata.get("text_as_html")
-        if element_type == "Table" and structured_text:
-            text = structured_text
-        if not text:
-            continue
-        page_numbers = []
-        if "page_number" in metadata and metadata["page_number"]:
-            page_numbers = [int(metadata["page_number"])]
-        elif "page_numbers" in metadata and metadata["page_numbers"]:
-            page_numbers = []
-            for raw_value in metadata["page_numbers"]:
-                try:
-                    page_numbers.append(int(raw_value))
-                except (TypeError, ValueError):
-                    continue
-        tokens = count_tokens(text)
-        fallback_page = metadata.get("page_number") or 1
-        try:
-            fallback_page = int(fallback_page)
-        except (TypeError, ValueError):
-            fallback_page = 1
-        elements.append(
-            ParsedElement(
-                element_id=str(uuid.uuid4()),
-                text=text,
-                element_type=element_type,
-                page_numbers=page_numbers or [fallback_page],
-                tokens=tokens,
-                metadata=metadata,
-                structured_text=structured_text,
-            )
-        )
+    sidecar = metadata_sidecar.open("w", encoding="utf-8") if metadata_sidecar else None
+    try:
+        for element in parsed:
+            metadata_obj = getattr(element, "metadata", None)
+            metadata = metadata_obj.to_dict() if metadata_obj else {}
+            parsed_element = _parse_element(element, metadata)
+            if parsed_element is None:
+                continue
+            elements.append(parsed_element)
+            if sidecar is not None:
+                sidecar.write(json.dumps({"element_id": parsed_element.element_id, "metadata": metadata}, default=str))
+                sidecar.write("\n")
+    finally:
+        if sidecar is not None:
+            sidecar.close()
     return elements
 
 
-def summarize_document(pdf_path: str) -> dict:
-    """Return document stats, layout-aware elements, and page snapshots."""
+def _parse_element(element, metadata: dict) -> ParsedElement | None:
+    text = (getattr(element, "text", "") or "").strip()
+    element_type = getattr(element, "category", element.__class__.__name__)
+    structured_text = metadata.get("text_as_markdown") or metadata.get("text_as_html")
+    if element_type == "Table" and structured_text:
+        text = structured_text
+    if not text:
+        return None
+    page_numbers = []
+    if "page_number" in metadata and metadata["page_number"]:
+        page_numbers = [int(metadata["page_number"])]
+    elif "page_numbers" in metadata and metadata["page_numbers"]:
+        page_numbers = []
+        for raw_value in metadata["page_numbers"]:
+            try:
+                page_numbers.append(int(raw_value))
+            except (TypeError, ValueError):
+                continue
+    tokens = count_tokens(text)
+    fallback_page = metadata.get("page_number") or 1
+    try:
+        fallback_page = int(fallback_page)
+    except (TypeError, ValueError):
+        fallback_page = 1
+    return ParsedElement(
+        element_id=str(uuid.uuid4()),
+        text=text,
+        element_type=element_type,
+        page_numbers=page_numbers or [fallback_page],
+        tokens=tokens,
+        metadata=_project_metadata(metadata),
+        structured_text=structured_text,
+    )
+
+
+def summarize_document(pdf_path: str, metadata_sidecar: Path | None = None) -> dict:
+    """Return document stats, layout-aware elements, and page snapshots.
+
+    ``metadata_sidecar`` receives the full unstructured metadata of each element (see ``_extract_elements``).
+    """
 
     pages = list(extract_pages(pdf_path))
     total_tokens = sum(page.tokens for page in pages)
-    elements = _extract_elements(pdf_path)
+    elements = _extract_elements(pdf_path, metadata_sidecar)
 
     if not elements:
         # Fallback: treat each page as an element for downstream chunking.
@@ -136,5 +187,6 @@ def summarize_document(pdf_path: str) -> dict:
         "page_count": len(pages),
         "token_count": total_tokens,
         "pages": [page.__dict__ for page in pages],
-        "elements": [element.__dict__ for element in elements],
+        "elements": elements,
+        "sections": assign_sections(elements),
     }
@@ -0,0 +1,283 @@
+"""Pipeline steps shared by the Celery task and the batch backfill."""
+from __future__ import annotations
+
+import hashlib
+import json
+import uuid
+from pathlib import Path
+
+import numpy as np
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import record_cache
+from app.db.models import Chunk, ChunkSignature, ChunkSignatureBand, Document, Section, Trait
+from app.services import dedup_service, extraction_service, llm_cache_service, retrieval_service, section_service
+from app.services.embeddings_service import embed_texts, set_chunk_embedding
+from app.services.chunking_service import chunk_elements, chunk_pages
+from app.services.timing_service import SpanRecorder
+from app.utils.file_paths import document_chunks_path, document_element_metadata_path
+
+logger = get_logger(__name__)
+
+EMBED_BATCH_SIZE = 64
+
+
+def element_metadata_sidecar(document: Document) -> Path | None:
+    """Where ``summarize_document`` should keep full element metadata, if ``PARSE_METADATA_SIDECAR`` is on."""
+
+    return document_element_metadata_path(document.id) if settings.parse_metadata_sidecar else None
+
+
+def record_parse_summary(session: Session, document: Document, summary: dict) -> None:
+    """Copy page/token counts and page snapshots from ``summarize_document`` onto the document."""
+
+    document.page_count = summary["page_count"]
+    document.token_count = summary["token_count"]
+    document.metadata_json = {
+        **(document.metadata_json or {}),
+        "pages": summary["pages"],
+        "elements_ingested": len(summary.get("elements", [])),
+    }
+    session.add(document)
+
+
+def chunk_summary(summary: dict) -> list:
+    elements = summary.get("elements") or []
+    if elements:
+        return chunk_elements(elements, max_tokens=900, min_tokens=120, overlap_tokens=120)
+    return chunk_pages(summary["pages"])
+
+
+def replace_chunks(
+    session: Session, document: Document, chunk_payloads: list, sections: list[dict] | None = None
+) -> list[Chunk]:
+    """Drop the document's previous chunks, sections and traits, then store the new ones.
+
+    ``sections`` is the tree from ``summarize_document``; chunks link to it by their ``section_key``.
+    """
+
+    previous_chunks = select(Chunk.id).where(Chunk.document_id == document.id)
+    session.exec(delete(ChunkSignatureBand).where(ChunkSignatureBand.chunk_id.in_(previous_chunks)))
+    session.exec(delete(ChunkSignature).where(ChunkSignature.document_id == document.id))
+    session.exec(delete(Chunk).where(Chunk.document_id == document.id))
+    session.exec(delete(Section).where(Section.document_id == document.id))
+    session.exec(delete(Trait).where(Trait.document_id == document.id))
+    session.flush()
+
+    chunk_records: list[Chunk] = []
+    for payload in chunk_payloads:
+        chunk = Chunk(
+            document_id=document.id,
+            page_start=payload.page_start,
+            page_end=payload.page_end,
+            token_count=payload.token_count,
+            content=payload.content,
+            summary=payload.summary,
+            metadata_json=payload.metadata,
+        )
+        session.add(chunk)
+        chunk_records.append(chunk)
+    session.flush()
+    if sections:
+        section_service.store_sections(session, document.id, sections, chunk_records)
+
+    # Persist chunk metadata for offline inspection.
+    document_chunks_path(document.id).write_text(
+        json.dumps(
+            [
+                {
+                    "id": str(chunk.id),
+                    "page_start": chunk.page_start,
+                    "page_end": chunk.page_end,
+                    "token_count": chunk.token_count,
+                    "metadata": chunk.metadata_json,
+                }
+                for chunk in chunk_records
+            ],
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    return chunk_records
+
+
+def find_embedding_donors(
+    session: Session, chunks: list[Chunk]
+) -> tuple[dict[uuid.UUID, np.ndarray], dict[uuid.UUID, Chunk]]:
+    """MinHash signatures for ``chunks`` and, for near-duplicates, the donor chunk to copy.
+
+    Donors from other documents are loaded here, so the session can be closed
+    before any embedding model runs.
+    """
+
+    signatures, donor_ids = dedup_service.find_donors(session, chunks)
+    by_id = {chunk.id: chunk for chunk in chunks}
+    external = [donor_id for donor_id in set(donor_ids.values()) if donor_id not in by_id]
+    if external:
+        by_id.update({chunk.id: chunk for chunk in session.exec(select(Chunk).where(Chunk.id.in_(external)))})
+    return signatures, {chunk_id: by_id[donor_id] for chunk_id, donor_id in donor_ids.items() if donor_id in by_id}
+
+
+def _embed_batches(chunks: list[Chunk]) -> None:
+    for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+        group = chunks[start : start + EMBED_BATCH_SIZE]
+        try:
+            vectors = embed_texts([chunk.content for chunk in group])
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.warning("Embedding generation failed for %d chunks: %s", len(group), exc)
+            continue
+        for chunk, vector in zip(group, vectors):
+            set_chunk_embedding(chunk, vector)
+
+
+def embed_chunks(
+    chunks: list[Chunk],
+    signatures: dict[uuid.UUID, np.ndarray],
+    donors: dict[uuid.UUID, Chunk],
+) -> dict:
+    """Embed chunks, reusing the embedding and summaries of their near-duplicate ``donors``.
+
+    Needs no session: chunks are only modified, for ``store_embeddings`` to write.
+    Returns the document's reuse report.
+    """
+
+    local = {chunk.id for chunk in chunks}
+    reused: dict[uuid.UUID, Chunk] = {}
+    for chunk in chunks:
+        donor = donors.get(chunk.id)
+        if donor is not None and donor.id not in local and dedup_service.inherit(chunk, donor):
+            reused[chunk.id] = donor
+    copies = [chunk for chunk in chunks if chunk.id in donors and donors[chunk.id].id in local]
+    copy_ids = {chunk.id for chunk in copies}
+    _embed_batches([chunk for chunk in chunks if chunk.id not in reused and chunk.id not in copy_ids])
+    # Donors within the document come earlier in the list, so they are embedded (or copied) by now.
+    uncopied = []
+    for chunk in copies:
+        donor = donors[chunk.id]
+        if dedup_service.inherit(chunk, donor):
+            reused[chunk.id] = donor
+        else:
+            uncopied.append(chunk)
+    _embed_batches(uncopied)
+    for chunk in chunks:
+        if chunk.id in reused or signatures.get(chunk.id) is not None:
+            record_cache("near_duplicate", chunk.id in reused)
+    return {
+        "chunks": len(chunks),
+        "embeddings_reused": len(reused),
+        "reuse_rate": round(len(reused) / len(chunks), 4) if chunks else 0.0,
+        "summaries_inherited": sum(1 for chunk in chunks if (chunk.metadata_json or {}).get("summaries")),
+        "donor_documents": len({str(donor.document_id) for donor in reused.values()}),
+    }
+
+
+def store_embeddings(
+    session: Session,
+    document_id: uuid.UUID,
+    chunks: list[Chunk],
+    signatures: dict[uuid.UUID, np.ndarray],
+) -> None:
+    """Write embedded chunks, their near-duplicate signatures and the section centroids."""
+
+    session.add_all(chunks)
+    dedup_service.record_signatures(session, chunks, signatures)
+    section_service.embed_sections(session, document_id, chunks)
+
+
+def build_trait(
+    document_id,
+    trait_type: str,
+    extraction: dict,
+    context: str,
+    supporting_chunks: list[Chunk],
+    fingerprint: dict | None = None,
+) -> Trait:
+    pages = extraction.get("pages") or sorted({chunk.page_start for chunk in supporting_chunks})
+    evidence = extraction.get("evidence") or [
+        f"Pages {chunk.page_start}-{chunk.page_end}: {chunk.content[:280]}"
+        for chunk in supporting_chunks
+    ]
+    return Trait(
+        document_id=document_id,
+        trait_type=trait_type,
+        value=extraction.get("value"),
+        confidence=extraction.get("confidence"),
+        pages=pages,
+        evidence=evidence,
+        details={
+            "source_chunk_ids": [str(chunk.id) for chunk in supporting_chunks],
+            "context_preview": context[:1000],
+            "fingerprint": fingerprint or trait_fingerprint(trait_type, context),
+        },
+    )
+
+
+def trait_fingerprint(trait_type: str, context: str, provider: str | None = None) -> dict[str, str]:
+    """Prompt, model and context hashes that decide whether a stored trait is still current."""
+
+    return {
+        **extraction_service.prompt_signature(trait_type, provider),
+        "context": hashlib.sha256(context.encode("utf-8")).hexdigest()[:16],
+    }
+
+
+def extract_traits(
+    session: Session,
+    document_id: uuid.UUID,
+    trait_types: list[str],
+    recorder: SpanRecorder,
+    *,
+    skip_unchanged: bool = True,
+    commit: bool = False,
+) -> dict[str, int]:
+    """Extract traits from the document's stored chunks and embeddings, replacing previous values.
+
+    With ``skip_unchanged`` a stored trait whose fingerprint matches the freshly
+    built context is kept without calling the model; without it the LLM response
+    cache is refreshed rather than read. With ``commit`` each trait
+    is committed as soon as it is written, so no lock outlives one model call.
+    """
+
+    existing = {
+        trait.trait_type: trait
+        for trait in session.exec(
+            select(Trait).where(Trait.document_id == document_id, Trait.trait_type.in_(trait_types))
+        ).all()
+    }
+    counts = {"extracted": 0, "unchanged": 0, "removed": 0}
+    for trait_type in trait_types:
+        previous = existing.get(trait_type)
+        context, supporting_chunks = retrieval_service.build_context_for_trait(
+            session,
+            document_id,
+            trait_type,
+            token_budget=1200,
+        )
+        if not context or not supporting_chunks:
+            if previous is not None:
+                session.exec(delete(Trait).where(Trait.document_id == document_id, Trait.trait_type == trait_type))
+                counts["removed"] += 1
+                if commit:
+                    session.commit()
+            continue
+        fingerprint = trait_fingerprint(trait_type, context)
+        if skip_unchanged and previous is not None and (previous.details or {}).get("fingerprint") == fingerprint:
+            counts["unchanged"] += 1
+            continue
+        if commit:
+            session.commit()  # summaries cached while building the context
+        with recorder.span("extraction", trait=trait_type) as record, llm_cache_service.refreshing(not skip_unchanged):
+            extraction = extraction_service.extract_trait(trait_type, context)
+            record["model"] = extraction.get("model")
+            record["tokens_in"] = extraction.get("tokens_in")
+            record["tokens_out"] = extraction.get("tokens_out")
+        if previous is not None:
+            session.exec(delete(Trait).where(Trait.document_id == document_id, Trait.trait_type == trait_type))
+        session.add(build_trait(document_id, trait_type, extraction, context, supporting_chunks, fingerprint))
+        counts["extracted"] += 1
+        if commit:
+            session.commit()
+    session.flush()
+    return counts
@@ -0,0 +1,125 @@
+"""Bounded cache of past key/values for shared prompt prefixes."""
+from __future__ import annotations
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import record_cache
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class PrefixEntry:
+    input_ids: Any
+    past_key_values: Any
+    size_bytes: int
+    prefill_seconds: float
+    hits: int = 0
+
+
+def prefix_key(model_name: str, prefix: str) -> str:
+    digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+def _tensor_bytes(value: Any) -> int:
+    if hasattr(value, "numel") and hasattr(value, "element_size"):
+        return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(_tensor_bytes(item) for item in value)
+    return 0
+
+
+def cache_nbytes(past_key_values: Any) -> int:
+    """Approximate memory held by a ``DynamicCache`` or legacy tuple cache."""
+
+    total = 0
+    for attr in ("key_cache", "value_cache"):
+        total += _tensor_bytes(getattr(past_key_values, attr, None))
+    if total:
+        return total
+    layers = getattr(past_key_values, "layers", None)
+    if layers is not None:
+        return sum(_tensor_bytes([getattr(layer, "keys", None), getattr(layer, "values", None)]) for layer in layers)
+    return _tensor_bytes(past_key_values)
+
+
+class PrefixKVCache:
+    """LRU of prefilled prefixes bounded by total tensor size.
+
+    Entries are never handed out directly: ``lookup`` returns a deep copy of
+    the cached key/values because generation appends to the cache in place.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, PrefixEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def lookup(self, key: str) -> tuple[Any, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            record_cache("prefix_kv", entry is not None)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.hits += 1
+            self.hits += 1
+            self.saved_seconds += entry.prefill_seconds
+            self._entries.move_to_end(key)
+            return entry.input_ids, copy.deepcopy(entry.past_key_values)
+
+    def store(self, key: str, input_ids: Any, past_key_values: Any, prefill_seconds: float) -> None:
+        size = cache_nbytes(past_key_values)
+        if size > self._max_bytes:
+            logger.debug("Prefix %s (%.1f MB) exceeds cache budget; not cached", key, size / MB)
+            return
+        with self._lock:
+            self._entries[key] = PrefixEntry(
+                input_ids=input_ids,
+                past_key_values=copy.deepcopy(past_key_values),
+                size_bytes=size,
+                prefill_seconds=prefill_seconds,
+            )
+            self._entries.move_to_end(key)
+            while self.resident_bytes > self._max_bytes:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "resident_mb": round(self.resident_bytes / MB, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "prefill_seconds_saved": round(self.saved_seconds, 2),
+            }
+
+
+prefix_cache = PrefixKVCache(max_bytes=settings.transformer_prefix_cache_mb * MB)
+
+
+def prefix_cache_stats() -> dict:
+    return prefix_cache.stats()
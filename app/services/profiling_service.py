@@ -0,0 +1,162 @@
+"""On-demand profiling of a single processing run.
+
+A background thread samples the stack of the thread running the task every
+``PROFILE_SAMPLE_INTERVAL_MS`` and aggregates them as folded stacks (one
+``frame;frame;frame count`` line per unique stack), which ``flamegraph.pl``,
+speedscope and inferno read directly. ``tracemalloc`` runs alongside and its
+largest allocation sites are written next to the stacks. Both add overhead
+(tracemalloc noticeably so), so only enable them for the run being diagnosed.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.utils.file_paths import document_processed_dir
+
+logger = get_logger(__name__)
+
+PROFILE_DIRNAME = "profiles"
+PROFILE_SUFFIXES = (".folded", ".allocations.txt")
+
+
+class StackSampler(threading.Thread):
+    """Periodically sample one thread's stack into folded-stack counts."""
+
+    def __init__(self, thread_id: int, interval_seconds: float) -> None:
+        super().__init__(name="stack-sampler", daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval_seconds
+        self._stop_event = threading.Event()
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            names: list[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _short_path(filename: str) -> str:
+    marker = "site-packages" + os.sep
+    index = filename.rfind(marker)
+    if index != -1:
+        return filename[index + len(marker) :]
+    cwd = os.getcwd() + os.sep
+    return filename[len(cwd) :] if filename.startswith(cwd) else os.path.basename(filename)
+
+
+def profiles_dir(document_id: UUID) -> Path:
+    path = document_processed_dir(document_id) / PROFILE_DIRNAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _write_allocations(path: Path, snapshot: tracemalloc.Snapshot, header: list[str]) -> None:
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+    lines = list(header)
+    for rank, stat in enumerate(snapshot.statistics("traceback")[: settings.profile_top_allocations], start=1):
+        lines.append("")
+        lines.append(f"#{rank}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format(most_recent_first=True))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@contextmanager
+def capture(document_id: UUID) -> Iterator[Path]:
+    """Profile the enclosed block and write the results under the document's ``profiles`` dir."""
+
+    stem = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    directory = profiles_dir(document_id)
+    owns_tracemalloc = not tracemalloc.is_tracing()
+    if owns_tracemalloc:
+        tracemalloc.start(settings.profile_tracemalloc_frames)
+    tracemalloc.reset_peak()
+    sampler = StackSampler(threading.get_ident(), settings.profile_sample_interval_ms / 1000.0)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield directory
+    finally:
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if owns_tracemalloc:
+            tracemalloc.stop()
+
+        folded = directory / f"{stem}.folded"
+        folded.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in sampler.stacks.most_common()),
+            encoding="utf-8",
+        )
+        _write_allocations(
+            directory / f"{stem}.allocations.txt",
+            snapshot,
+            [
+                f"document: {document_id}",
+                f"duration_seconds: {elapsed:.2f}",
+                f"stack_samples: {sampler.samples} every {settings.profile_sample_interval_ms} ms",
+                f"traced_current_kib: {current / 1024:.1f}",
+                f"traced_peak_kib: {peak / 1024:.1f}",
+            ],
+        )
+        logger.info("Wrote profile %s for document %s (%d samples)", stem, document_id, sampler.samples)
+
+
+def list_profiles(document_id: UUID) -> list[dict]:
+    """Profile artifacts for a document, newest first."""
+
+    directory = Path(settings.processed_files_dir) / str(document_id) / PROFILE_DIRNAME
+    if not directory.is_dir():
+        return []
+    items = [
+        {
+            "name": path.name,
+            "size_bytes": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+        }
+        for path in directory.iterdir()
+        if path.name.endswith(PROFILE_SUFFIXES)
+        for stat in (path.stat(),)
+    ]
+    return sorted(items, key=lambda item: item["name"], reverse=True)
+
+
+def profile_path(document_id: UUID, name: str) -> Path | None:
+    """Resolve an artifact name from ``list_profiles``; ``None`` for unknown or unsafe names."""
+
+    if Path(name).name != name or not name.endswith(PROFILE_SUFFIXES):
+        return None
+    path = Path(settings.processed_files_dir) / str(document_id) / PROFILE_DIRNAME / name
+    return path if path.is_file() else None
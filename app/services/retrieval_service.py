@@ -1,28 +1,47 @@
 """Chunk retrieval helpers."""
 from __future__ import annotations
 
+import hashlib
 import re
-from dataclasses import dataclass
+from collections import OrderedDict
 from typing import Iterable
 
-from sqlmodel import Session, select
+import numpy as np
+from sqlmodel import Session, func, select
 
 from app.db.models import Chunk
-from app.services.embeddings_service import embed_text
-from app.services.transformer_service import summarize_text
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS, LLM_CALLS, observe, record_cache
+from app.services import fake_model_service, section_service
+from app.services.embeddings_service import chunk_embedding, embed_text, embed_texts, embedding_model_name
+from app.services.timing_service import span
+from app.services.transformer_service import SUMMARIZE_PROMPT, SUMMARY_MAX_NEW_TOKENS, summarize_text
 from app.utils.prompts import TRAIT_PROMPT_REGISTRY, TRAIT_RETRIEVAL_QUERIES
-from app.utils.tokenization import (
-    count_tokens,
-    cosine_similarity,
-    join_with_budget,
-    trim_text,
-)
+from app.utils.tokenization import count_tokens, join_with_budget, trim_text
+from app.utils.vectors import cosine_similarities
 
 MAX_CONTEXT_CHUNKS = 5
 EARLY_PAGE_TRAITS = {"title", "due_date"}
 EARLY_PAGE_MAX = 4
+TOP_SECTIONS = 4
+TOP_SECTIONS_MIN_CHUNKS = 12
+VECTOR_WEIGHT = 0.7
+KEYWORD_WEIGHT = 0.3
+CONTENT_QUERY_BATCH = 500
+# Ranking reads only these; ``content`` is fetched for the few rows that can still reach the top.
+SCORING_COLUMNS = (Chunk.id, Chunk.page_start, Chunk.embedding_vector, Chunk.embedding)
 EVIDENCE_TOKEN_LIMIT = 400
 SUMMARY_TOKEN_LIMIT = 800
+# Part of each cached chunk summary's key, so editing the prompt or limits regenerates summaries.
+SUMMARY_VERSION = hashlib.sha1(
+    f"{SUMMARIZE_PROMPT}|{SUMMARY_TOKEN_LIMIT}|{SUMMARY_MAX_NEW_TOKENS}".encode("utf-8")
+).hexdigest()[:12]
+EVIDENCE_SEPARATOR = "\n\n---\n\n"
+EVIDENCE_PREFIX = "Supporting Evidence:\n"
+MIN_SENTENCE_CHARS = 20
+SENTENCE_CACHE_SIZE = 4096
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;:])\s+(?=[A-Z0-9(\"'])|\n+")
 
 TRAIT_KEYWORDS = {
     "title": ["request for proposal", "rfp", "rfq", "invitation"],
@@ -43,12 +62,6 @@ TRAIT_KEYWORDS = {
 }
 
 
-@dataclass
-class ChunkScore:
-    chunk: Chunk
-    score: float
-
-
 def _keyword_score(content: str, keywords: Iterable[str]) -> float:
     if not keywords:
         return 0.0
@@ -67,17 +80,6 @@ def _trait_query(trait_type: str) -> str:
     return base or f"Extract the trait {trait_type} from the RFP document."
 
 
-def _filter_early_pages(chunks: list[Chunk], trait_type: str) -> list[Chunk]:
-    if trait_type not in EARLY_PAGE_TRAITS:
-        return chunks
-    early_chunks = [
-        chunk
-        for chunk in chunks
-        if (chunk.page_start or 1) <= EARLY_PAGE_MAX
-    ]
-    return early_chunks or chunks
-
-
 def _trim_by_paragraphs(text: str, max_tokens: int) -> str:
     if not text or max_tokens <= 0:
         return ""
@@ -104,64 +106,205 @@ def _trim_by_paragraphs(text: str, max_tokens: int) -> str:
     return "\n\n".join(kept)
 
 
-def _rank_chunks(chunks: list[Chunk], trait_type: str) -> list[ChunkScore]:
-    if not chunks:
+def _vector_scores(chunks: list[Chunk], query_embedding: list[float]) -> np.ndarray:
+    query = np.asarray(query_embedding, dtype=np.float32)
+    scores = np.zeros(len(chunks), dtype=np.float32)
+    rows: list[int] = []
+    vectors: list[np.ndarray] = []
+    for index, chunk in enumerate(chunks):
+        vector = chunk_embedding(chunk)
+        if vector is not None and vector.shape == query.shape:
+            rows.append(index)
+            vectors.append(vector)
+    if vectors:
+        scores[rows] = cosine_similarities(np.vstack(vectors), query)
+    return scores
+
+
+_query_embeddings: dict[tuple[str, str], list[float]] = {}
+_sentence_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+
+
+def _query_embedding(trait_type: str) -> list[float]:
+    """Embed the (static) retrieval query for a trait once per process and model."""
+
+    key = (trait_type, embedding_model_name())
+    record_cache("query_embedding", key in _query_embeddings)
+    if key not in _query_embeddings:
+        _query_embeddings[key] = embed_text(_trait_query(trait_type))
+    return _query_embeddings[key]
+
+
+def _scoring_rows(session: Session, document_id, trait_type: str) -> tuple[list, int | None]:
+    """``SCORING_COLUMNS`` rows to rank for a trait, and how many sections were scored to pick them.
+
+    ``EARLY_PAGE_TRAITS`` read the first ``EARLY_PAGE_MAX`` pages when the document
+    has chunks there. Documents with ``SECTION_RETRIEVAL_MIN_CHUNKS`` or more chunks
+    and section embeddings only read the chunks of their best-matching sections.
+    """
+
+    statement = select(*SCORING_COLUMNS).where(Chunk.document_id == document_id)
+    if trait_type in EARLY_PAGE_TRAITS:
+        rows = session.exec(statement.where(Chunk.page_start <= EARLY_PAGE_MAX)).all()
+        if rows:
+            return rows, None
+    sections_scored = None
+    threshold = settings.section_retrieval_min_chunks
+    if threshold is not None:
+        total = session.exec(select(func.count()).select_from(Chunk).where(Chunk.document_id == document_id)).one()
+        if total >= threshold:
+            section_ids = section_service.top_sections(
+                session,
+                document_id,
+                np.asarray(_query_embedding(trait_type), dtype=np.float32),
+                limit=TOP_SECTIONS,
+                min_chunks=TOP_SECTIONS_MIN_CHUNKS,
+            )
+            if section_ids:
+                statement = statement.where(Chunk.section_id.in_(section_ids))
+                sections_scored = len(section_ids)
+    return session.exec(statement).all(), sections_scored
+
+
+def _top_chunks(session: Session, rows: list, trait_type: str, limit: int) -> list[Chunk]:
+    """Rank scoring rows by vector and keyword score and load the best ``limit`` chunks.
+
+    Keyword hits add at most ``KEYWORD_WEIGHT``, so ``content`` is only read for rows
+    whose vector score leaves them within reach of the ``limit``-th best.
+    """
+
+    if not rows or limit <= 0:
         return []
-
-    query_embedding = embed_text(_trait_query(trait_type))
+    vector_scores = VECTOR_WEIGHT * _vector_scores(rows, _query_embedding(trait_type))
     keywords = TRAIT_KEYWORDS.get(trait_type, [])
-    ranked: list[ChunkScore] = []
+    candidates = list(range(len(rows)))
+    if keywords and len(rows) > limit:
+        floor = np.partition(vector_scores, len(rows) - limit)[len(rows) - limit] - KEYWORD_WEIGHT
+        candidates = np.flatnonzero(vector_scores >= floor).tolist()
 
-    for chunk in chunks:
-        embedding = chunk.embedding
-        vec_score = cosine_similarity(embedding, query_embedding) if embedding else 0.0
-        key_score = _keyword_score(chunk.content, keywords)
-        combined = (0.7 * vec_score) + (0.3 * key_score)
-        ranked.append(ChunkScore(chunk=chunk, score=combined))
+    scores = {rows[index].id: float(vector_scores[index]) for index in candidates}
+    if keywords:
+        ids = list(scores)
+        for start in range(0, len(ids), CONTENT_QUERY_BATCH):
+            statement = select(Chunk.id, Chunk.content).where(Chunk.id.in_(ids[start : start + CONTENT_QUERY_BATCH]))
+            for chunk_id, content in session.exec(statement):
+                scores[chunk_id] += KEYWORD_WEIGHT * _keyword_score(content, keywords)
 
-    ranked.sort(key=lambda item: item.score, reverse=True)
-    return ranked
+    top_ids = sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+    chunks = {chunk.id: chunk for chunk in session.exec(select(Chunk).where(Chunk.id.in_(top_ids)))}
+    return [chunks[chunk_id] for chunk_id in top_ids if chunk_id in chunks]
 
 
 def retrieve_chunks(session: Session, document_id, trait_type: str, limit: int = 5) -> list[Chunk]:
     """Rank and return top chunks for a trait."""
 
-    statement = select(Chunk).where(Chunk.document_id == document_id)
-    chunks = session.exec(statement).all()
-    chunks = _filter_early_pages(chunks, trait_type)
-    ranked = _rank_chunks(chunks, trait_type)
-    if not ranked:
-        return []
-    return [item.chunk for item in ranked[:limit]]
-
+    rows, _ = _scoring_rows(session, document_id, trait_type)
+    return _top_chunks(session, rows, trait_type, limit)
+
+
+def _split_sentences(text: str) -> list[str]:
+    sentences: list[str] = []
+    for paragraph in text.split("\n\n"):
+        for sentence in SENTENCE_SPLIT_RE.split(paragraph):
+            sentence = " ".join(sentence.split())
+            if len(sentence) >= MIN_SENTENCE_CHARS:
+                sentences.append(sentence)
+    return sentences
+
+
+def _embed_sentences(sentences: list[str]) -> np.ndarray:
+    """Embed sentences, reusing vectors for sentences seen by earlier traits."""
+
+    model_name = embedding_model_name()
+    keys = [hashlib.sha1(f"{model_name}:{sentence}".encode("utf-8")).hexdigest() for sentence in sentences]
+    missing = [index for index, key in enumerate(keys) if key not in _sentence_embeddings]
+    CACHE_REQUESTS.labels(cache="sentence_embedding", result="hit").inc(len(keys) - len(missing))
+    CACHE_REQUESTS.labels(cache="sentence_embedding", result="miss").inc(len(missing))
+    if missing:
+        vectors = embed_texts([sentences[index] for index in missing])
+        for index, vector in zip(missing, vectors):
+            _sentence_embeddings[keys[index]] = vector
+    rows = []
+    for key in keys:
+        _sentence_embeddings.move_to_end(key)
+        rows.append(_sentence_embeddings[key])
+    while len(_sentence_embeddings) > SENTENCE_CACHE_SIZE:
+        _sentence_embeddings.popitem(last=False)
+    return np.vstack(rows)
+
+
+def _compress_by_sentences(chunks: list[Chunk], trait_type: str, token_budget: int) -> str:
+    """Pack the sentences closest to the trait query, in document order, into the budget.
+
+    Each chunk's page header and the separator before it are charged when its
+    first sentence is picked, so the joined evidence always fits.
+    """
+
+    sentences: list[tuple[int, int, str]] = []
+    for chunk_index, chunk in enumerate(chunks):
+        for sentence_index, sentence in enumerate(_split_sentences(chunk.content or "")):
+            sentences.append((chunk_index, sentence_index, sentence))
+    if not sentences:
+        return ""
 
-def build_context_for_trait(
-    session: Session,
-    document_id,
+    query = np.asarray(_query_embedding(trait_type), dtype=np.float32)
+    scores = cosine_similarities(_embed_sentences([item[2] for item in sentences]), query)
+
+    separator_tokens = count_tokens(EVIDENCE_SEPARATOR)
+    picked: list[tuple[int, int, str]] = []
+    opened: set[int] = set()
+    used_tokens = 0
+    for position in np.argsort(-scores, kind="stable"):
+        item = sentences[int(position)]
+        chunk_index = item[0]
+        if chunk_index in opened:
+            cost = count_tokens(item[2]) + 1  # joined to the block with a space
+        else:
+            chunk = chunks[chunk_index]
+            cost = count_tokens(f"Pages {chunk.page_start}-{chunk.page_end}:\n{item[2]}")
+            cost += separator_tokens if opened else 0
+        if used_tokens + cost > token_budget:
+            continue
+        picked.append(item)
+        opened.add(chunk_index)
+        used_tokens += cost
+    if not picked:
+        picked = [sentences[int(np.argmax(scores))]]
+
+    blocks: list[str] = []
+    picked.sort(key=lambda item: (chunks[item[0]].page_start or 1, item[0], item[1]))
+    for chunk_index in dict.fromkeys(item[0] for item in picked):
+        chunk = chunks[chunk_index]
+        text = " ".join(item[2] for item in picked if item[0] == chunk_index)
+        blocks.append(f"Pages {chunk.page_start}-{chunk.page_end}:\n{text}")
+    # Trimming only bites when the best sentence alone is over budget.
+    return trim_text(EVIDENCE_SEPARATOR.join(blocks), token_budget)
+
+
+def _build_embedding_context(
+    selected: list[Chunk],
     trait_type: str,
-    *,
-    token_budget: int = 800,
-) -> tuple[str, list[Chunk]]:
-    """Return concatenated context text and supporting chunks for a trait."""
+    token_budget: int,
+) -> str:
+    """Use raw evidence when it fits the budget, otherwise compress it by sentence."""
 
-    statement = select(Chunk).where(Chunk.document_id == document_id)
-    chunks = session.exec(statement).all()
-    chunks = _filter_early_pages(chunks, trait_type)
-    ranked = _rank_chunks(chunks, trait_type)
-    if not ranked:
-        return "", []
+    evidence_budget = max(token_budget - count_tokens(EVIDENCE_PREFIX), 0)
+    blocks = [f"Pages {chunk.page_start}-{chunk.page_end}:\n{chunk.content.strip()}" for chunk in selected]
+    raw_evidence = EVIDENCE_SEPARATOR.join(blocks)
+    if count_tokens(raw_evidence) <= evidence_budget:
+        return EVIDENCE_PREFIX + raw_evidence
+    return EVIDENCE_PREFIX + _compress_by_sentences(selected, trait_type, evidence_budget)
 
-    selected_scores = ranked[:MAX_CONTEXT_CHUNKS]
+
+def _build_summary_context(
+    selected: list[Chunk],
+    trait_type: str,
+    token_budget: int,
+) -> str:
     summaries: list[str] = []
     evidence_blocks: list[str] = []
-    kept_chunks: list[Chunk] = []
-
-    for scored in selected_scores:
-        chunk = scored.chunk
-        content = (chunk.content or "").strip()
-        if not content:
-            continue
-        kept_chunks.append(chunk)
+    for chunk in selected:
+        content = chunk.content.strip()
         snippet = _trim_by_paragraphs(content, EVIDENCE_TOKEN_LIMIT)
         evidence_blocks.append(f"Pages {chunk.page_start}-{chunk.page_end}:\n{snippet}")
         summary_input = (
@@ -169,18 +312,61 @@ def build_context_for_trait(
             f"Pages {chunk.page_start}-{chunk.page_end}:\n"
             f"{_trim_by_paragraphs(content, SUMMARY_TOKEN_LIMIT)}"
         )
-        summary = summarize_text(summary_input, trait_type)
+        fake = settings.llm_provider == "fake"
+        model_label = "fake" if fake else settings.transformer_llm_model
+        cached = (chunk.metadata_json or {}).get("summaries") or {}
+        cache_key = f"{model_label}:{SUMMARY_VERSION}:{trait_type}"
+        record_cache("chunk_summary", cache_key in cached)
+        summary = cached.get(cache_key)
+        if summary is None:
+            with observe(
+                LLM_CALLS,
+                provider="fake" if fake else "transformers",
+                model=model_label,
+                kind="summarize",
+            ):
+                if fake:
+                    summary = fake_model_service.summarize(summary_input, trait_type)
+                else:
+                    summary = summarize_text(summary_input, trait_type)
+            # Cached on the chunk so recomputes and near-duplicate chunks can reuse it; older versions are dropped.
+            current = {key: value for key, value in cached.items() if f":{SUMMARY_VERSION}:" in key}
+            chunk.metadata_json = {
+                **(chunk.metadata_json or {}),
+                "summaries": {**current, cache_key: summary or ""},
+            }
         if not summary:
             summary = snippet
         summaries.append(f"- Pages {chunk.page_start}-{chunk.page_end}: {summary.strip()}")
-        if len(kept_chunks) >= MAX_CONTEXT_CHUNKS:
-            break
-
-    if not kept_chunks:
-        return "", []
 
     summary_section = "Focused Summaries:\n" + "\n".join(summaries)
     evidence_section, _ = join_with_budget(evidence_blocks, max_tokens=token_budget)
-    context_text = f"{summary_section}\n\nSupporting Evidence:\n{evidence_section}"
+    return f"{summary_section}\n\nSupporting Evidence:\n{evidence_section}"
+
+
+def build_context_for_trait(
+    session: Session,
+    document_id,
+    trait_type: str,
+    *,
+    token_budget: int = 800,
+) -> tuple[str, list[Chunk]]:
+    """Return concatenated context text and supporting chunks for a trait."""
+
+    with span("retrieval", trait=trait_type) as record:
+        rows, sections_scored = _scoring_rows(session, document_id, trait_type)
+        top = _top_chunks(session, rows, trait_type, MAX_CONTEXT_CHUNKS)
+        record["items"] = len(rows)
+        if sections_scored is not None:
+            record["sections"] = sections_scored
+    kept_chunks = [chunk for chunk in top if (chunk.content or "").strip()]
+    if not kept_chunks:
+        return "", []
 
+    if settings.context_compression == "embedding":
+        with span("compression", trait=trait_type, items=len(kept_chunks)):
+            context_text = _build_embedding_context(kept_chunks, trait_type, token_budget)
+    else:
+        with span("summarization", trait=trait_type, items=len(kept_chunks), model=settings.transformer_llm_model):
+            context_text = _build_summary_context(kept_chunks, trait_type, token_budget)
     return context_text, kept_chunks
@@ -0,0 +1,101 @@
+"""Route documents to worker queues by estimated processing cost.
+
+Cost is measured in page-equivalents: a text PDF costs one unit per page and a
+scanned page costs ``ROUTING_SCANNED_COST_FACTOR`` units, since it goes through
+OCR. Small documents land on their own queue so a dedicated worker can keep
+their latency low while large backfills drain from the bulk queue.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import Document
+
+logger = get_logger(__name__)
+
+SMALL_QUEUE = "rfp_small"
+STANDARD_QUEUE = "rfp_analyzer"
+BULK_QUEUE = "rfp_bulk"
+QUEUES = (SMALL_QUEUE, STANDARD_QUEUE, BULK_QUEUE)
+
+# Redis transport priorities: 0 is served first, 9 last.
+DEFAULT_PRIORITY = {SMALL_QUEUE: 3, STANDARD_QUEUE: 5, BULK_QUEUE: 7}
+
+PROBE_SAMPLE_PAGES = 8
+SCANNED_PAGE_MAX_CHARS = 50
+
+
+@dataclass
+class DocumentProbe:
+    page_count: int
+    scanned: bool
+    sampled_pages: int
+    scanned_pages: int
+
+    @property
+    def cost(self) -> float:
+        factor = settings.routing_scanned_cost_factor if self.scanned else 1.0
+        return self.page_count * factor
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "cost": self.cost}
+
+
+def probe_document(pdf_path: str) -> DocumentProbe | None:
+    """Count pages and sample a few to tell text PDFs from scans (no OCR, no layout parsing)."""
+
+    import fitz  # type: ignore  # imported here so the API only loads PyMuPDF on upload
+
+    try:
+        with fitz.open(pdf_path) as document:
+            page_count = document.page_count
+            step = max(1, page_count // PROBE_SAMPLE_PAGES)
+            sample = range(0, page_count, step)[:PROBE_SAMPLE_PAGES]
+            scanned_pages = 0
+            for index in sample:
+                page = document[index]
+                if len(page.get_text("text").strip()) < SCANNED_PAGE_MAX_CHARS and page.get_images():
+                    scanned_pages += 1
+    except Exception as exc:
+        logger.warning("Could not probe %s: %s", pdf_path, exc)
+        return None
+    return DocumentProbe(
+        page_count=page_count,
+        scanned=bool(sample) and scanned_pages * 2 > len(sample),
+        sampled_pages=len(sample),
+        scanned_pages=scanned_pages,
+    )
+
+
+def choose_queue(cost: float | None) -> str:
+    if cost is None:
+        return STANDARD_QUEUE
+    if cost <= settings.routing_small_max_cost:
+        return SMALL_QUEUE
+    if cost >= settings.routing_bulk_min_cost:
+        return BULK_QUEUE
+    return STANDARD_QUEUE
+
+
+def route_document(document: Document, priority: int | None = None) -> tuple[str, int]:
+    """Queue and priority for a document, from the probe stored at upload.
+
+    Documents uploaded before probing fall back to their page count, if known.
+    """
+
+    probe = (document.metadata_json or {}).get("probe") or {}
+    queue = choose_queue(probe.get("cost", document.page_count or None))
+    return queue, DEFAULT_PRIORITY[queue] if priority is None else priority
+
+
+def route_trait_recompute(priority: int | None = None, *, corpus: bool = False) -> tuple[str, int]:
+    """Queue and priority for trait recomputation.
+
+    Nothing is parsed or embedded, so a single document is cheap and goes to the
+    small queue; corpus-wide recomputes drain from the bulk queue.
+    """
+
+    queue = BULK_QUEUE if corpus else SMALL_QUEUE
+    return queue, DEFAULT_PRIORITY[queue] if priority is None else priority
@@ -0,0 +1,415 @@
+"""Corpus-wide semantic search over chunk embeddings.
+
+The index is an IVF (inverted file) index built with numpy: chunk vectors are
+clustered with spherical k-means and stored grouped by cluster, so a query only
+scores the ``SEARCH_NPROBE`` clusters nearest to it. Each build writes a
+generation directory of ``.npy`` files under ``SEARCH_INDEX_DIR`` that readers
+memory-map, and ``CURRENT`` names the live one.
+
+Documents completed after a build are written to ``updates/<document_id>.npz``
+and scored exhaustively on top of the generation, replacing that document's
+older rows, until the next build folds them in.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import Chunk, Document, DocumentStatus
+from app.db.session import get_session
+from app.services.artifact_service import load_chunk_artifact
+from app.services.embeddings_service import chunk_embedding, embed_text, embedding_model_name
+from app.utils.vectors import unpack_vector
+
+logger = get_logger(__name__)
+
+CURRENT_FILENAME = "CURRENT"
+UPDATES_DIRNAME = "updates"
+MIN_ROWS_FOR_LISTS = 1024
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BLOCK_ROWS = 16384
+BUILD_FETCH_ROWS = 1000
+
+
+class SearchIndexError(RuntimeError):
+    """The index cannot answer the query, e.g. it was built with another embedding model."""
+
+
+@dataclass
+class SearchHit:
+    chunk_id: uuid.UUID
+    document_id: uuid.UUID
+    score: float
+
+
+def index_dir() -> Path:
+    return Path(settings.search_index_dir or Path(settings.data_root) / "search_index")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _uuid_rows(values: list[uuid.UUID]) -> np.ndarray:
+    return np.frombuffer(b"".join(value.bytes for value in values), dtype=np.uint8).reshape(-1, 16)
+
+
+def _row_uuid(row: np.ndarray) -> uuid.UUID:
+    return uuid.UUID(bytes=row.tobytes())
+
+
+def _save_npz(path: Path, **arrays: np.ndarray) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as handle:
+        np.savez(handle, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _mtime(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# --- building ---------------------------------------------------------------
+
+
+def _list_count(rows: int) -> int:
+    return 1 if rows < MIN_ROWS_FOR_LISTS else int(np.sqrt(rows))
+
+
+def _train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalized) vectors."""
+
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))].astype(np.float32)
+    centroids = sample[rng.choice(sample_size, lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=lists)
+        order = np.argsort(assignment, kind="stable")
+        present = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[present]
+        sums = sample[rng.choice(sample_size, lists)]  # empty lists are reseeded at random
+        sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    if len(centroids) == 1:
+        return np.zeros(len(vectors), dtype=np.int64)
+    blocks = [
+        np.argmax(vectors[start : start + ASSIGN_BLOCK_ROWS].astype(np.float32) @ centroids.T, axis=1)
+        for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS)
+    ]
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int64)
+
+
+def _load_corpus(session: Session) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Normalized float16 vectors plus chunk and document ids for every completed document.
+
+    Vectors come from the documents' memory-mapped chunk artifacts; documents
+    without one (processed before artifacts existed) are read from the database.
+    """
+
+    model = embedding_model_name()
+    matrices: list[np.ndarray] = []
+    chunk_ids: list[np.ndarray] = []
+    document_ids: list[np.ndarray] = []
+    from_database: list[uuid.UUID] = []
+    completed = session.exec(select(Document.id).where(Document.status == DocumentStatus.COMPLETED)).all()
+    for document_id in completed:
+        artifact = load_chunk_artifact(document_id)
+        if artifact is None or artifact.meta["embedding_model"] != model:
+            from_database.append(document_id)
+            continue
+        rows = np.flatnonzero(artifact.embedded)
+        matrices.append(np.asarray(artifact.embeddings[rows], dtype=np.float32))
+        chunk_ids.append(np.asarray(artifact.chunk_ids[rows]))
+        document_ids.append(np.repeat(_uuid_rows([document_id]), len(rows), axis=0))
+
+    vectors: list[np.ndarray] = []
+    database_chunk_ids: list[uuid.UUID] = []
+    database_document_ids: list[uuid.UUID] = []
+    for start in range(0, len(from_database), BUILD_FETCH_ROWS):
+        statement = select(Chunk.id, Chunk.document_id, Chunk.embedding_vector, Chunk.embedding).where(
+            Chunk.document_id.in_(from_database[start : start + BUILD_FETCH_ROWS])
+        )
+        for chunk_id, document_id, packed, legacy in session.exec(statement):
+            if packed:
+                vector = unpack_vector(packed)
+            elif legacy:
+                vector = np.asarray(legacy, dtype=np.float32)
+            else:
+                continue
+            if vectors and vector.shape[0] != vectors[0].shape[0]:
+                continue
+            vectors.append(vector)
+            database_chunk_ids.append(chunk_id)
+            database_document_ids.append(document_id)
+    if vectors:
+        matrices.append(np.vstack(vectors))
+        chunk_ids.append(_uuid_rows(database_chunk_ids))
+        document_ids.append(_uuid_rows(database_document_ids))
+
+    dim = next((matrix.shape[1] for matrix in matrices if matrix.size), 0)
+    keep = [index for index, matrix in enumerate(matrices) if matrix.size and matrix.shape[1] == dim]
+    if len(keep) < sum(1 for matrix in matrices if matrix.size):
+        logger.warning("Skipped chunk embeddings whose dimension differs from %d", dim)
+    if not keep:
+        return np.zeros((0, 0), dtype=np.float16), _uuid_rows([]), _uuid_rows([])
+    matrix = _normalize(np.vstack([matrices[index] for index in keep])).astype(np.float16)
+    return (
+        matrix,
+        np.vstack([chunk_ids[index] for index in keep]),
+        np.vstack([document_ids[index] for index in keep]),
+    )
+
+
+@contextmanager
+def _build_lock(root: Path) -> Iterator[bool]:
+    with (root / "build.lock").open("a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def _prune(root: Path, generation: str, chunk_ids: np.ndarray) -> None:
+    """Remove older generations and the updates that are now part of ``generation``."""
+
+    for path in root.iterdir():
+        if path.is_dir() and path.name.startswith("g") and path.name != generation:
+            shutil.rmtree(path, ignore_errors=True)
+    built = chunk_ids.view("S16").ravel()
+    for path in (root / UPDATES_DIRNAME).glob("*.npz"):
+        try:
+            with np.load(path) as update:
+                folded = bool(np.isin(update["chunk_ids"].view("S16").ravel(), built).all())
+        except (OSError, ValueError, KeyError):
+            continue
+        if folded:
+            path.unlink(missing_ok=True)
+
+
+def build_index() -> dict | None:
+    """Rebuild the index from the database and make it current.
+
+    Returns the new generation's metadata, or ``None`` when another process is
+    already building.
+    """
+
+    root = index_dir()
+    (root / UPDATES_DIRNAME).mkdir(parents=True, exist_ok=True)
+    with _build_lock(root) as acquired:
+        if not acquired:
+            logger.info("Search index build already running; skipping")
+            return None
+        started = time.perf_counter()
+        with get_session() as session:
+            vectors, chunk_ids, document_ids = _load_corpus(session)
+        rows = len(vectors)
+        lists = _list_count(rows)
+        centroids = _train_centroids(vectors, lists) if rows else np.zeros((0, 0), dtype=np.float32)
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))]).astype(np.int64)
+        documents, row_documents = np.unique(document_ids, axis=0, return_inverse=True)
+
+        generation = f"g{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        target = root / generation
+        target.mkdir()
+        np.save(target / "centroids.npy", centroids.astype(np.float32))
+        np.save(target / "vectors.npy", vectors[order])
+        np.save(target / "offsets.npy", offsets)
+        np.save(target / "chunk_ids.npy", chunk_ids[order])
+        np.save(target / "row_documents.npy", row_documents.reshape(-1)[order].astype(np.int32))
+        np.save(target / "documents.npy", documents)
+        meta = {
+            "generation": generation,
+            "model": embedding_model_name(),
+            "dim": int(vectors.shape[1]) if rows else 0,
+            "rows": rows,
+            "lists": lists,
+            "documents": len(documents),
+            "built_at": datetime.utcnow().isoformat(),
+            "build_seconds": round(time.perf_counter() - started, 3),
+        }
+        tmp_path = root / (CURRENT_FILENAME + ".tmp")
+        tmp_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp_path, root / CURRENT_FILENAME)
+        _prune(root, generation, chunk_ids)
+    logger.info("Built search index %s: %d chunks in %d lists", generation, rows, lists)
+    return meta
+
+
+def index_document(session: Session, document_id: uuid.UUID) -> int:
+    """Make a completed document searchable now by writing its vectors as a pending update."""
+
+    chunk_ids: list[uuid.UUID] = []
+    vectors: list[np.ndarray] = []
+    for chunk in session.exec(select(Chunk).where(Chunk.document_id == document_id)).all():
+        vector = chunk_embedding(chunk)
+        if vector is not None:
+            chunk_ids.append(chunk.id)
+            vectors.append(vector)
+    updates = index_dir() / UPDATES_DIRNAME
+    updates.mkdir(parents=True, exist_ok=True)
+    _save_npz(
+        updates / f"{document_id}.npz",
+        vectors=_normalize(np.vstack(vectors)).astype(np.float16) if vectors else np.zeros((0, 0), np.float16),
+        chunk_ids=_uuid_rows(chunk_ids),
+        model=np.array(embedding_model_name()),
+    )
+    return len(chunk_ids)
+
+
+def pending_updates() -> int:
+    return sum(1 for _ in (index_dir() / UPDATES_DIRNAME).glob("*.npz"))
+
+
+# --- searching --------------------------------------------------------------
+
+
+class SearchIndex:
+    """The current generation (memory-mapped) plus pending per-document updates."""
+
+    def __init__(self, root: Path) -> None:
+        self.meta: dict = {}
+        self.rows = 0
+        self.documents = np.zeros((0, 16), dtype=np.uint8)
+        self.document_rows: dict[uuid.UUID, int] = {}
+        current = root / CURRENT_FILENAME
+        if current.exists():
+            self.meta = json.loads(current.read_text(encoding="utf-8"))
+            generation = root / self.meta["generation"]
+            self.rows = self.meta["rows"]
+            self.centroids = np.load(generation / "centroids.npy")
+            self.vectors = np.load(generation / "vectors.npy", mmap_mode="r")
+            self.offsets = np.load(generation / "offsets.npy")
+            self.chunk_ids = np.load(generation / "chunk_ids.npy", mmap_mode="r")
+            self.row_documents = np.load(generation / "row_documents.npy", mmap_mode="r")
+            self.documents = np.load(generation / "documents.npy")
+            self.document_rows = {_row_uuid(row): index for index, row in enumerate(self.documents)}
+        self.model = self.meta.get("model") or embedding_model_name()
+        self.dim = self.meta.get("dim") or 0
+        self.superseded = np.zeros(len(self.documents), dtype=bool)
+        self._load_updates(root / UPDATES_DIRNAME)
+
+    def _load_updates(self, directory: Path) -> None:
+        vectors: list[np.ndarray] = []
+        self.update_chunk_ids: list[uuid.UUID] = []
+        self.update_document_ids: list[uuid.UUID] = []
+        for path in sorted(directory.glob("*.npz")):
+            try:
+                document_id = uuid.UUID(path.stem)
+                with np.load(path) as update:
+                    model, matrix, chunk_ids = str(update["model"]), update["vectors"], update["chunk_ids"]
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning("Ignoring unreadable search update %s: %s", path, exc)
+                continue
+            if model != self.model or (self.dim and len(matrix) and matrix.shape[1] != self.dim):
+                logger.warning("Ignoring search update %s built with %s", path.name, model)
+                continue
+            if document_id in self.document_rows:
+                self.superseded[self.document_rows[document_id]] = True
+            if len(matrix):
+                self.dim = self.dim or matrix.shape[1]
+                vectors.append(matrix)
+                self.update_chunk_ids.extend(_row_uuid(row) for row in chunk_ids)
+                self.update_document_ids.extend([document_id] * len(chunk_ids))
+        self.update_vectors = np.vstack(vectors).astype(np.float32) if vectors else np.zeros((0, self.dim))
+
+    def search(self, query: np.ndarray, k: int, nprobe: int) -> list[SearchHit]:
+        if self.model != embedding_model_name():
+            raise SearchIndexError(f"Search index was built with {self.model}; rebuild it for {embedding_model_name()}")
+        if self.dim and query.shape[0] != self.dim:
+            raise SearchIndexError(f"Query has {query.shape[0]} dimensions, index has {self.dim}")
+        norm = float(np.linalg.norm(query))
+        query = query / norm if norm else query
+
+        scores: list[np.ndarray] = []
+        if self.rows:
+            centroid_scores = self.centroids @ query
+            probe = min(nprobe, len(self.centroids))
+            lists = np.argpartition(-centroid_scores, probe - 1)[:probe]
+            ranges = [(int(self.offsets[item]), int(self.offsets[item + 1])) for item in lists]
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            base_scores = np.concatenate(
+                [self.vectors[start:end].astype(np.float32) @ query for start, end in ranges]
+            )
+            keep = ~self.superseded[self.row_documents[rows]]
+            rows, base_scores = rows[keep], base_scores[keep]
+            scores.append(base_scores)
+        else:
+            rows = np.zeros(0, dtype=np.int64)
+        scores.append(self.update_vectors @ query if len(self.update_vectors) else np.zeros(0))
+
+        combined = np.concatenate(scores)
+        if not combined.size:
+            return []
+        top = np.argpartition(-combined, min(k, combined.size) - 1)[:k]
+        top = top[np.argsort(-combined[top])]
+        hits: list[SearchHit] = []
+        for position in top.tolist():
+            if position < len(rows):
+                row = int(rows[position])
+                chunk_id = _row_uuid(self.chunk_ids[row])
+                document_id = _row_uuid(self.documents[self.row_documents[row]])
+            else:
+                chunk_id = self.update_chunk_ids[position - len(rows)]
+                document_id = self.update_document_ids[position - len(rows)]
+            hits.append(SearchHit(chunk_id=chunk_id, document_id=document_id, score=float(combined[position])))
+        return hits
+
+
+_index: SearchIndex | None = None
+_index_stamp: tuple | None = None
+_index_lock = threading.Lock()
+
+
+def current_index() -> SearchIndex:
+    """The loaded index, reloaded when a build or a document update lands."""
+
+    global _index, _index_stamp
+    root = index_dir()
+    stamp = (_mtime(root / CURRENT_FILENAME), _mtime(root / UPDATES_DIRNAME))
+    with _index_lock:
+        if _index is None or stamp != _index_stamp:
+            _index, _index_stamp = SearchIndex(root), stamp
+        return _index
+
+
+def search(
+    query: str,
+    k: int = 10,
+    nprobe: int | None = None,
+    *,
+    query_vector: list[float] | None = None,
+) -> list[SearchHit]:
+    """Top ``k`` chunks across the corpus for a free-text query (or its precomputed embedding)."""
+
+    vector = np.asarray(query_vector if query_vector is not None else embed_text(query), dtype=np.float32)
+    return current_index().search(vector, k, nprobe or settings.search_nprobe)
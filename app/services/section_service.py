@@ -0,0 +1,229 @@
+"""Section hierarchy built from parsed headings, and section-first retrieval support.
+
+``unstructured`` Title and Header elements open sections; their level comes
+from heading numbering ("3.2.1 Insurance" is level 3) or the element's
+``category_depth``. Text before the first heading belongs to a level-0
+preamble section, so every chunk links to exactly one (its deepest) section.
+
+Once chunks are embedded, each section stores the centroid of its own chunks'
+embeddings. Retrieval can then score the sections first and only score chunks
+inside the best ones (see ``retrieval_service``).
+"""
+from __future__ import annotations
+
+import re
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.models import Chunk, Section
+from app.services.embeddings_service import chunk_embedding
+from app.utils.vectors import cosine_similarities, pack_vector, unpack_vector
+
+logger = get_logger(__name__)
+
+HEADING_TYPES = {"Title", "Header"}
+MAX_HEADING_CHARS = 200
+RUNNING_HEADER_MIN_PAGES = 3
+TITLE_MAX_CHARS = 300
+NUMBERED_HEADING_RE = re.compile(r"^(?:(?:section|article|part)\s+)?(\d+(?:\.\d+)*)[.)]?\s+\S", re.IGNORECASE)
+LETTER_RE = re.compile(r"[A-Za-z]")
+
+
+@dataclass
+class SectionPayload:
+    key: str
+    parent_key: str | None
+    title: str | None
+    level: int
+    section_path: str
+    page_start: int | None = None
+    page_end: int | None = None
+    token_count: int = 0
+    element_count: int = 0
+    children: list[str] = field(default_factory=list)
+
+
+def _running_headers(elements: list[dict]) -> set[str]:
+    """Header texts repeated on several pages (page furniture, not structure)."""
+
+    pages_by_text: dict[str, set[int]] = {}
+    for element in elements:
+        if element.get("element_type") == "Header":
+            text = (element.get("text") or "").strip().lower()
+            pages_by_text.setdefault(text, set()).update(element.get("page_numbers") or [])
+    return {text for text, pages in pages_by_text.items() if len(pages) >= RUNNING_HEADER_MIN_PAGES}
+
+
+def _is_heading(element: dict, running: set[str]) -> bool:
+    text = (element.get("text") or "").strip()
+    return (
+        element.get("element_type") in HEADING_TYPES
+        and 0 < len(text) <= MAX_HEADING_CHARS
+        and LETTER_RE.search(text) is not None
+        and text.lower() not in running
+    )
+
+
+def heading_level(element: dict) -> int:
+    match = NUMBERED_HEADING_RE.match((element.get("text") or "").strip())
+    if match:
+        return match.group(1).count(".") + 1
+    depth = (element.get("metadata") or {}).get("category_depth")
+    if isinstance(depth, int) and depth >= 0:
+        return depth + 1
+    return 1
+
+
+def assign_sections(elements: list[dict]) -> list[dict]:
+    """Build the section tree from heading elements.
+
+    Tags every element (a dict or ``ParsedElement``) in place with its ``section_key``
+    (and ``section_heading`` for headings) and returns the sections as dicts in document order.
+    """
+
+    running = _running_headers(elements)
+    sections: dict[str, SectionPayload] = {}
+    stack: list[SectionPayload] = []
+    child_counts: Counter[str | None] = Counter()
+
+    def _open(title: str | None, level: int) -> SectionPayload:
+        while stack and (stack[-1].level >= level or stack[-1].title is None):
+            stack.pop()
+        parent = stack[-1] if stack else None
+        parent_key = parent.key if parent else None
+        child_counts[parent_key] += 1
+        ordinal = str(child_counts[parent_key])
+        section = SectionPayload(
+            key=f"s{len(sections)}",
+            parent_key=parent_key,
+            title=title,
+            level=level,
+            section_path=f"{parent.section_path}.{ordinal}" if parent else ordinal,
+        )
+        if parent:
+            parent.children.append(section.key)
+        sections[section.key] = section
+        stack.append(section)
+        return section
+
+    for element in elements:
+        heading = _is_heading(element, running)
+        if heading:
+            current = _open((element.get("text") or "").strip()[:TITLE_MAX_CHARS], heading_level(element))
+        elif not stack:
+            current = _open(None, 0)
+            current.section_path = "0"
+            child_counts[None] -= 1  # the preamble does not take a top-level ordinal
+        else:
+            current = stack[-1]
+        element["section_key"] = current.key
+        element["section_heading"] = heading
+        pages = element.get("page_numbers") or []
+        if pages:
+            current.page_start = min(pages) if current.page_start is None else min(current.page_start, *pages)
+            current.page_end = max(pages) if current.page_end is None else max(current.page_end, *pages)
+        current.token_count += int(element.get("tokens") or 0)
+        current.element_count += 1
+
+    # Roll page spans and token counts up to ancestors (children always follow their parent).
+    for section in reversed(list(sections.values())):
+        if section.parent_key is None:
+            continue
+        parent = sections[section.parent_key]
+        parent.token_count += section.token_count
+        if section.page_start is not None:
+            parent.page_start = section.page_start if parent.page_start is None else min(parent.page_start, section.page_start)
+            parent.page_end = section.page_end if parent.page_end is None else max(parent.page_end, section.page_end)
+    return [asdict(section) for section in sections.values()]
+
+
+def store_sections(session: Session, document_id: uuid.UUID, sections: list[dict], chunks: list[Chunk]) -> None:
+    """Create ``Section`` rows for the tree and link chunks to them through ``Chunk.section_id``."""
+
+    ids: dict[str, uuid.UUID] = {}
+    records: list[Section] = []
+    for payload in sections:
+        section = Section(
+            document_id=document_id,
+            parent_id=ids.get(payload["parent_key"]) if payload["parent_key"] else None,
+            title=payload["title"],
+            section_path=payload["section_path"],
+            level=payload["level"],
+            page_start=payload["page_start"],
+            page_end=payload["page_end"],
+            token_count=payload["token_count"],
+            metadata_json={"element_count": payload["element_count"]},
+        )
+        ids[payload["key"]] = section.id
+        records.append(section)
+    session.add_all(records)
+    session.flush()  # parents before the chunks that reference them
+    for chunk in chunks:
+        key = (chunk.metadata_json or {}).get("section_key")
+        if key in ids:
+            chunk.section_id = ids[key]
+            session.add(chunk)
+
+
+def embed_sections(session: Session, document_id: uuid.UUID, chunks: list[Chunk] | None = None) -> int:
+    """Store each section's centroid of its own chunks' embeddings (no model calls)."""
+
+    if chunks is None:
+        chunks = list(session.exec(select(Chunk).where(Chunk.document_id == document_id)).all())
+    vectors: dict[uuid.UUID, list[np.ndarray]] = {}
+    for chunk in chunks:
+        vector = chunk_embedding(chunk)
+        if chunk.section_id is not None and vector is not None:
+            norm = float(np.linalg.norm(vector))
+            vectors.setdefault(chunk.section_id, []).append(vector / norm if norm else vector)
+    sections = session.exec(select(Section).where(Section.document_id == document_id)).all()
+    for section in sections:
+        members = vectors.get(section.id)
+        section.embedding_vector = (
+            pack_vector(np.mean(members, axis=0), settings.embedding_storage_dtype) if members else None
+        )
+        section.metadata_json = {**(section.metadata_json or {}), "chunk_count": len(members or [])}
+        session.add(section)
+    session.flush()
+    return sum(1 for section in sections if section.embedding_vector)
+
+
+def top_sections(
+    session: Session,
+    document_id: uuid.UUID,
+    query: np.ndarray,
+    *,
+    limit: int,
+    min_chunks: int,
+) -> list[uuid.UUID] | None:
+    """Ids of the sections whose centroids best match ``query``.
+
+    Takes at least ``limit`` sections and keeps going until they hold
+    ``min_chunks`` chunks. Returns ``None`` when the document has no section embeddings.
+    """
+
+    rows = session.exec(
+        select(Section.id, Section.embedding_vector, Section.metadata_json).where(
+            Section.document_id == document_id, Section.embedding_vector.is_not(None)
+        )
+    ).all()
+    if not rows:
+        return None
+    matrix = np.vstack([unpack_vector(packed) for _, packed, _ in rows])
+    if matrix.shape[1] != query.shape[0]:
+        return None
+    selected: list[uuid.UUID] = []
+    chunk_total = 0
+    for index in np.argsort(-cosine_similarities(matrix, query), kind="stable"):
+        if len(selected) >= limit and chunk_total >= min_chunks:
+            break
+        section_id, _, metadata = rows[int(index)]
+        selected.append(section_id)
+        chunk_total += (metadata or {}).get("chunk_count", 0)
+    return selected
@@ -0,0 +1,95 @@
+"""Structured timing spans for pipeline stages."""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Iterator
+
+from app.core.metrics import STAGE_DURATION
+
+_current: ContextVar["SpanRecorder | None"] = ContextVar("span_recorder", default=None)
+
+
+class SpanRecorder:
+    """Collect spans for one processing run.
+
+    Spans are plain dicts so they can be stored as JSON on ``ProcessingJob``:
+    ``name``, ``started_at``, ``duration_ms`` and any attributes the caller sets
+    (``trait``, ``items``, ``model``, ``tokens_in``, ``tokens_out`` ...).
+    """
+
+    def __init__(self) -> None:
+        self.spans: list[dict] = []
+        self._open: list[dict] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[dict]:
+        record = {"name": name, "started_at": datetime.utcnow().isoformat(), **attributes}
+        started = time.perf_counter()
+        self._open.append(record)
+        try:
+            yield record
+        finally:
+            self._open.pop()
+            elapsed = time.perf_counter() - started
+            record["duration_ms"] = round(elapsed * 1000, 2)
+            self.spans.append(record)
+            STAGE_DURATION.labels(stage=name).observe(elapsed)
+
+    def count(self, key: str, amount: int = 1) -> None:
+        """Add to a counter attribute of the innermost open span."""
+
+        if self._open:
+            self._open[-1][key] = self._open[-1].get(key, 0) + amount
+
+    @contextmanager
+    def activate(self) -> Iterator["SpanRecorder"]:
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def as_list(self) -> list[dict]:
+        return [dict(record) for record in self.spans]
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[dict]:
+    """Record a span on the active recorder; a no-op dict sink when none is active."""
+
+    recorder = _current.get()
+    if recorder is None:
+        yield dict(attributes)
+        return
+    with recorder.span(name, **attributes) as record:
+        yield record
+
+
+def count(key: str, amount: int = 1) -> None:
+    """Count on the innermost open span of the active recorder; a no-op when none is active."""
+
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.count(key, amount)
+
+
+def summarize_llm_cache(spans: list[dict]) -> dict:
+    """LLM response cache hits, misses and hit rate over a run's spans."""
+
+    hits = sum(record.get("llm_cache_hits", 0) for record in spans)
+    misses = sum(record.get("llm_cache_misses", 0) for record in spans)
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None}
+
+
+def summarize_spans(spans: list[dict]) -> dict[str, dict]:
+    """Total duration and count per span name."""
+
+    totals: dict[str, dict] = {}
+    for record in spans:
+        entry = totals.setdefault(record["name"], {"count": 0, "duration_ms": 0.0})
+        entry["count"] += 1
+        entry["duration_ms"] = round(entry["duration_ms"] + record.get("duration_ms", 0.0), 2)
+    return totals
@@ -1,13 +1,18 @@
 """Transformer utilities for generation, summarization, and embeddings."""
 from __future__ import annotations
 
-from functools import lru_cache
-
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.services.llm_cache_service import cached_generation
+from app.services.model_service import estimate_checkpoint_bytes, model_manager
+from app.services.prefix_cache_service import prefix_cache, prefix_key
+
+if TYPE_CHECKING:  # torch/transformers are imported on first model load, not at import time
+    from sentence_transformers import SentenceTransformer
 
 logger = get_logger(__name__)
 
@@ -21,11 +26,15 @@ CAUSAL_KEYWORDS = (
     "mpt",
 )
 
-SUMMARIZE_PROMPT = (
+EMBED_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+# Static instructions come first so every summarization shares one cacheable prefix.
+SUMMARIZE_PREFIX = (
     "You will receive excerpts from a procurement document. Summarize the content in <=120 words focusing on details "
-    "relevant to the trait \"{trait}\". Use concise sentences and avoid adding assumptions.\n\n"
-    "CONTEXT:\n{context}\n\nSUMMARY:"
+    "relevant to the trait named below. Use concise sentences and avoid adding assumptions.\n\n"
 )
+SUMMARIZE_PROMPT = SUMMARIZE_PREFIX + "TRAIT: {trait}\n\nCONTEXT:\n{context}\n\nSUMMARY:"
+SUMMARY_MAX_NEW_TOKENS = 200
 
 
 def _normalize_device(device: str) -> str | int:
@@ -45,8 +54,9 @@ def _is_causal_model(model_name: str) -> bool:
     return any(keyword in lowered for keyword in CAUSAL_KEYWORDS)
 
 
-@lru_cache(maxsize=4)
-def _generation_pipeline(model_name: str):
+def _load_generation_pipeline(model_name: str):
+    from transformers import pipeline
+
     device = _normalize_device(settings.transformer_device)
     task = "text-generation" if _is_causal_model(model_name) else "text2text-generation"
     logger.info("Loading transformer generator %s (%s) on %s", model_name, task, device)
@@ -58,11 +68,202 @@ def _generation_pipeline(model_name: str):
     )
 
 
-@lru_cache
+def _generation_pipeline(model_name: str):
+    return model_manager.get(
+        "generator",
+        model_name,
+        lambda: _load_generation_pipeline(model_name),
+        expected_bytes=lambda: estimate_checkpoint_bytes(model_name),
+    )
+
+
+def embedding_artifact_dir(backend: str, model_name: str | None = None) -> Path:
+    """Directory holding the exported/quantized artifact for an embedding backend."""
+
+    slug = (model_name or settings.transformer_embed_model).replace("/", "__")
+    return Path(settings.model_cache_dir or Path(settings.data_root) / "model_cache") / f"{slug}-{backend}"
+
+
+def _load_int8_embedding_model(model_name: str, artifact_dir: Path) -> SentenceTransformer:
+    """Dynamically quantize the model's Linear layers, caching only the quantized weights.
+
+    The cache holds a state dict read with ``weights_only=True``, never a pickled
+    model, so a writable cache directory cannot inject code and upgrades of torch
+    or sentence-transformers do not invalidate it.
+    """
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    artifact = artifact_dir / "state_dict.pt"
+    model = SentenceTransformer(model_name, device="cpu")
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if artifact.exists():
+        logger.info("Loading cached int8 embedding weights from %s", artifact)
+        quantized.load_state_dict(torch.load(artifact, map_location="cpu", weights_only=True))
+        return quantized
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    torch.save(quantized.state_dict(), artifact)
+    logger.info("Cached int8 embedding weights at %s", artifact)
+    return quantized
+
+
+def _load_onnx_embedding_model(model_name: str, artifact_dir: Path, *, quantize: bool) -> SentenceTransformer:
+    from sentence_transformers import SentenceTransformer
+
+    config = settings.transformer_onnx_quantization
+    file_name = f"onnx/model_qint8_{config}.onnx" if quantize else "onnx/model.onnx"
+    if (artifact_dir / file_name).exists():
+        logger.info("Loading cached ONNX embedding model from %s", artifact_dir / file_name)
+        return SentenceTransformer(str(artifact_dir), backend="onnx", model_kwargs={"file_name": file_name})
+
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(str(artifact_dir))
+    if quantize:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        export_dynamic_quantized_onnx_model(model, config, str(artifact_dir))
+        model = SentenceTransformer(str(artifact_dir), backend="onnx", model_kwargs={"file_name": file_name})
+    logger.info("Cached ONNX embedding model at %s", artifact_dir / file_name)
+    return model
+
+
+def load_embedding_model(backend: str | None = None, model_name: str | None = None) -> SentenceTransformer:
+    """Build the embedding model for a backend, reusing on-disk artifacts."""
+
+    backend = backend or settings.transformer_embed_backend
+    name = model_name or settings.transformer_embed_model
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {EMBED_BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        device = settings.transformer_device
+        logger.info("Loading transformer embedding model %s on %s", name, device)
+        return SentenceTransformer(name, device=device)
+
+    artifact_dir = embedding_artifact_dir(backend, name)
+    logger.info("Loading transformer embedding model %s with %s backend on cpu", name, backend)
+    if backend == "int8":
+        return _load_int8_embedding_model(name, artifact_dir)
+    return _load_onnx_embedding_model(name, artifact_dir, quantize=backend == "onnx-int8")
+
+
 def _embedding_model() -> SentenceTransformer:
-    device = settings.transformer_device
-    logger.info("Loading transformer embedding model %s on %s", settings.transformer_embed_model, device)
-    return SentenceTransformer(settings.transformer_embed_model, device=device)
+    backend = settings.transformer_embed_backend
+    return model_manager.get(
+        "embedding",
+        f"{settings.transformer_embed_model}@{backend}",
+        lambda: load_embedding_model(backend),
+        expected_bytes=lambda: estimate_checkpoint_bytes(settings.transformer_embed_model),
+    )
+
+
+def _uses_prefix_cache(model_name: str, prompt: str, prefix: str | None) -> bool:
+    return bool(
+        prefix
+        and settings.transformer_prefix_cache_mb > 0
+        and _is_causal_model(model_name)
+        and prompt.startswith(prefix)
+    )
+
+
+def _prefixed_inputs(tokenizer, model, model_name: str, prompt: str, prefix: str):
+    """Return prompt input ids and past key/values covering the shared prefix."""
+
+    import torch
+
+    key = prefix_key(model_name, prefix)
+    cached = prefix_cache.lookup(key)
+    if cached is not None:
+        prefix_ids, past_key_values = cached
+    else:
+        prefix_ids = tokenizer(prefix, return_tensors="pt").input_ids.to(model.device)
+        started = time.perf_counter()
+        with torch.no_grad():
+            past_key_values = model(input_ids=prefix_ids, use_cache=True).past_key_values
+        prefix_cache.store(key, prefix_ids, past_key_values, time.perf_counter() - started)
+    suffix_ids = tokenizer(
+        prompt[len(prefix):],
+        add_special_tokens=False,
+        return_tensors="pt",
+    ).input_ids.to(model.device)
+    return torch.cat([prefix_ids, suffix_ids], dim=1), past_key_values
+
+
+def _model_generate(
+    model_name: str,
+    prompt: str,
+    *,
+    prefix: str | None,
+    max_new_tokens: int,
+    output_scores: bool = False,
+    stop_strings: tuple[str, ...] = (),
+):
+    """Run ``model.generate`` directly, reusing prefix key/values when possible."""
+
+    generator = _generation_pipeline(model_name)
+    tokenizer, model = generator.tokenizer, generator.model
+    gen_kwargs = {
+        "max_new_tokens": max_new_tokens,
+        "do_sample": False,
+        "output_scores": output_scores,
+        "return_dict_in_generate": True,
+    }
+    # Causal models echo the prompt in the ids the stopping criterion sees; seq2seq decoders do not.
+    causal = _is_causal_model(model_name)
+    if _uses_prefix_cache(model_name, prompt, prefix):
+        input_ids, past_key_values = _prefixed_inputs(tokenizer, model, model_name, prompt, prefix)
+        if stop_strings:
+            gen_kwargs["stopping_criteria"] = _stop_after_text(tokenizer, input_ids.shape[1] if causal else 0, stop_strings)
+        output = model.generate(
+            input_ids=input_ids,
+            attention_mask=input_ids.new_ones(input_ids.shape),
+            past_key_values=past_key_values,
+            **gen_kwargs,
+        )
+    else:
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        input_ids = inputs["input_ids"]
+        if stop_strings:
+            gen_kwargs["stopping_criteria"] = _stop_after_text(tokenizer, input_ids.shape[1] if causal else 0, stop_strings)
+        output = model.generate(**inputs, **gen_kwargs)
+    sequence = output.sequences[0]
+    if causal:
+        sequence = sequence[input_ids.shape[1]:]
+    text = _truncate_at_stop(tokenizer.decode(sequence, skip_special_tokens=True), stop_strings)
+    return text, output, model
+
+
+def _stop_after_text(tokenizer, prompt_length: int, stop_strings: tuple[str, ...]):
+    """Stop once a stop string follows generated text.
+
+    Unlike ``generate(stop_strings=...)``, leading whitespace does not count, so a
+    model that opens its answer with a newline is not cut off before answering.
+    """
+
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class _StopAfterText(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            done = [
+                any(stop in text for stop in stop_strings)
+                for text in (
+                    tokenizer.decode(row[prompt_length:], skip_special_tokens=True).lstrip() for row in input_ids
+                )
+            ]
+            return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([_StopAfterText()])
+
+
+def _truncate_at_stop(text: str, stop_strings: tuple[str, ...]) -> str:
+    text = text.lstrip()
+    for stop in stop_strings:
+        if stop in text:
+            text = text.split(stop, 1)[0]
+    return text.strip()
 
 
 def generate_text(
@@ -70,12 +271,46 @@ def generate_text(
     model_name: str | None = None,
     *,
     max_new_tokens: int | None = None,
+    prefix: str | None = None,
+    stop_strings: tuple[str, ...] = (),
 ) -> str:
+    """Generate text; ``prefix`` marks a shared prompt head whose key/values may be reused.
+
+    Greedy decoding is deterministic, so results are served from the LLM response cache when present.
+    """
+
     model_to_use = model_name or settings.transformer_llm_model
+    new_tokens = max_new_tokens or settings.transformer_max_new_tokens
+    return cached_generation(
+        "transformers",
+        model_to_use,
+        prompt,
+        {"kind": "generate", "max_new_tokens": new_tokens, "stop_strings": list(stop_strings)},
+        lambda: _generate_text(prompt, model_to_use, new_tokens, prefix, stop_strings),
+    )
+
+
+def _generate_text(
+    prompt: str,
+    model_to_use: str,
+    new_tokens: int,
+    prefix: str | None,
+    stop_strings: tuple[str, ...],
+) -> str:
+    if stop_strings or _uses_prefix_cache(model_to_use, prompt, prefix):
+        text, _, _ = _model_generate(
+            model_to_use,
+            prompt,
+            prefix=prefix,
+            max_new_tokens=new_tokens,
+            stop_strings=stop_strings,
+        )
+        return text
+
     generator = _generation_pipeline(model_to_use)
     is_causal = _is_causal_model(model_to_use)
     kwargs = {
-        "max_new_tokens": max_new_tokens or settings.transformer_max_new_tokens,
+        "max_new_tokens": new_tokens,
         "do_sample": False,
         "temperature": 0.1,
     }
@@ -91,13 +326,122 @@ def generate_text(
     return output.strip()
 
 
+def generate_text_with_confidence(
+    prompt: str,
+    model_name: str | None = None,
+    *,
+    max_new_tokens: int | None = None,
+    prefix: str | None = None,
+    stop_strings: tuple[str, ...] = (),
+) -> tuple[str, float | None]:
+    """Generate greedily and return the text with its mean token probability."""
+
+    model_to_use = model_name or settings.transformer_llm_model
+    new_tokens = max_new_tokens or settings.transformer_max_new_tokens
+    return cached_generation(
+        "transformers",
+        model_to_use,
+        prompt,
+        {"kind": "confidence", "max_new_tokens": new_tokens, "stop_strings": list(stop_strings)},
+        lambda: _generate_text_with_confidence(prompt, model_to_use, new_tokens, prefix, stop_strings),
+    )
+
+
+def _generate_text_with_confidence(
+    prompt: str,
+    model_to_use: str,
+    new_tokens: int,
+    prefix: str | None,
+    stop_strings: tuple[str, ...],
+) -> tuple[str, float | None]:
+    text, output, model = _model_generate(
+        model_to_use,
+        prompt,
+        prefix=prefix,
+        max_new_tokens=new_tokens,
+        output_scores=True,
+        stop_strings=stop_strings,
+    )
+    if not output.scores:
+        return text, None
+    transition = model.compute_transition_scores(output.sequences, output.scores, normalize_logits=True)[0]
+    finite = transition[transition.isfinite()]
+    if finite.numel() == 0:
+        return text, None
+    return text, float(finite.mean().exp())
+
+
+def _choice_token_ids(tokenizer, choice: str) -> list[int]:
+    """First token id of a choice, with and without a leading space."""
+
+    ids: set[int] = set()
+    for variant in (choice, f" {choice}"):
+        encoded = tokenizer.encode(variant, add_special_tokens=False)
+        if encoded:
+            ids.add(encoded[0])
+    return sorted(ids)
+
+
+def score_choices(
+    prompt: str,
+    choices: tuple[str, ...],
+    model_name: str | None = None,
+    *,
+    prefix: str | None = None,
+) -> tuple[str, float]:
+    """Pick a choice from a single forward pass over the prompt.
+
+    Compares the next-token logits of each choice's first token and returns the
+    winner together with its softmax probability among the choices.
+    """
+
+    model_to_use = model_name or settings.transformer_llm_model
+    return cached_generation(
+        "transformers",
+        model_to_use,
+        prompt,
+        {"kind": "choices", "choices": list(choices)},
+        lambda: _score_choices(prompt, choices, model_to_use, prefix),
+    )
+
+
+def _score_choices(prompt: str, choices: tuple[str, ...], model_to_use: str, prefix: str | None) -> tuple[str, float]:
+    import torch
+
+    generator = _generation_pipeline(model_to_use)
+    tokenizer, model = generator.tokenizer, generator.model
+    with torch.no_grad():
+        if not _is_causal_model(model_to_use):
+            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+            start = torch.full((1, 1), model.config.decoder_start_token_id, device=model.device)
+            logits = model(**inputs, decoder_input_ids=start).logits[0, -1]
+        elif _uses_prefix_cache(model_to_use, prompt, prefix):
+            input_ids, past_key_values = _prefixed_inputs(tokenizer, model, model_to_use, prompt, prefix)
+            cached = past_key_values.get_seq_length() if hasattr(past_key_values, "get_seq_length") else 0
+            logits = model(
+                input_ids=input_ids[:, cached:],
+                past_key_values=past_key_values,
+                use_cache=True,
+            ).logits[0, -1]
+        else:
+            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+            logits = model(**inputs).logits[0, -1]
+
+    choice_logits = torch.stack(
+        [logits[_choice_token_ids(tokenizer, choice)].max() for choice in choices]
+    )
+    probs = torch.softmax(choice_logits.float(), dim=0)
+    best = int(probs.argmax())
+    return choices[best], float(probs[best])
+
+
 def summarize_text(text: str, trait: str) -> str:
     snippet = text.strip()
     if not snippet:
         return ""
     prompt = SUMMARIZE_PROMPT.format(trait=trait, context=snippet[:4000])
     try:
-        return generate_text(prompt, max_new_tokens=200).strip()
+        return generate_text(prompt, max_new_tokens=SUMMARY_MAX_NEW_TOKENS, prefix=SUMMARIZE_PREFIX).strip()
     except Exception as exc:  # pragma: no cover
         logger.warning("Summarization failed: %s", exc)
         return ""
@@ -107,3 +451,10 @@ def embed_text_local(text: str) -> list[float]:
     model = _embedding_model()
     vector = model.encode(text, normalize_embeddings=True)
     return vector.tolist()
+
+
+def embed_texts_local(texts: list[str], batch_size: int = 32):
+    """Encode several texts in batches; returns a float32 matrix."""
+
+    model = _embedding_model()
+    return model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
@@ -15,3 +15,7 @@ def document_processed_dir(document_id: UUID) -> Path:
 
 def document_chunks_path(document_id: UUID) -> Path:
     return document_processed_dir(document_id) / "chunks.json"
+
+
+def document_element_metadata_path(document_id: UUID) -> Path:
+    return document_processed_dir(document_id) / "element_metadata.jsonl"
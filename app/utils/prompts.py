@@ -1,4 +1,27 @@
 """Prompt registry for traits and retrieval helper queries."""
+from dataclasses import dataclass
+from typing import Literal
+
+
+@dataclass(frozen=True)
+class TraitOutputSpec:
+    """How a trait answer is produced: answer type, decode budget and stop strings."""
+
+    answer_type: Literal["yes_no", "text"] = "text"
+    max_new_tokens: int = 64
+    stop_strings: tuple[str, ...] = ("\n",)
+    choices: tuple[str, ...] = ()
+    # Yes/no answers below this choice probability count as N/A.
+    min_choice_probability: float = 0.0
+
+
+YES_NO = TraitOutputSpec(
+    answer_type="yes_no",
+    max_new_tokens=1,
+    stop_strings=(),
+    choices=("Yes", "No"),
+    min_choice_probability=0.65,
+)
 
 TRAIT_PROMPT_REGISTRY = {
     "title": "FROM THE PROVIDED TEXT, EXTRACT ONLY the official, full title of the Request for Proposal (RFP) or Request for Quote (RFQ). DO NOT ADD ANY OTHER WORDS, PUNCTUATION, OR EXPLANATION.",
@@ -35,3 +58,24 @@ TRAIT_RETRIEVAL_QUERIES = {
     "insurance_needed": "Sections that list insurance, bonding, or security compliance requirements.",
     "technical_requirements": "Specific technical qualifications, licenses, certifications, or experience levels required of the vendor or team.",
 }
+
+TRAIT_OUTPUT_SPECS = {
+    "title": TraitOutputSpec(max_new_tokens=64),
+    "due_date": TraitOutputSpec(max_new_tokens=16),
+    "point_of_contact": TraitOutputSpec(max_new_tokens=48),
+    "submitted_to": TraitOutputSpec(max_new_tokens=40),
+    "submission_method": TraitOutputSpec(max_new_tokens=32),
+    "submission_checklist": YES_NO,
+    "questions_poc": TraitOutputSpec(max_new_tokens=48),
+    "receipt_of_amendments": YES_NO,
+    "notary_needed": YES_NO,
+    "resumes_needed": YES_NO,
+    "references_needed": YES_NO,
+    "scope_of_work": TraitOutputSpec(max_new_tokens=100),
+    "categorization": TraitOutputSpec(max_new_tokens=16),
+    # Free text because a "Yes" answer lists the required policy types.
+    "insurance_needed": TraitOutputSpec(max_new_tokens=64),
+    "technical_requirements": TraitOutputSpec(max_new_tokens=100),
+}
+
+DEFAULT_OUTPUT_SPEC = TraitOutputSpec()
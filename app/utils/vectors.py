@@ -0,0 +1,63 @@
+"""Packed binary encoding for embedding vectors."""
+from __future__ import annotations
+
+import struct
+from typing import Literal, Sequence
+
+import numpy as np
+
+VectorDType = Literal["float32", "float16", "int8"]
+
+# Layout: magic (1s) | dtype code (B) | dimension (I) | scale (f) | little-endian payload.
+_HEADER = struct.Struct("<1sBIf")
+_MAGIC = b"V"
+_DTYPE_CODES: dict[str, int] = {"float32": 1, "float16": 2, "int8": 3}
+_CODE_DTYPES = {code: name for name, code in _DTYPE_CODES.items()}
+_NUMPY_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2"), "int8": np.dtype("i1")}
+
+
+def pack_vector(vector: Sequence[float] | np.ndarray, dtype: VectorDType = "float32") -> bytes:
+    """Encode a vector as a compact binary blob.
+
+    ``int8`` uses symmetric scalar quantization with one float32 scale per vector.
+    """
+
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported vector dtype {dtype!r}")
+    array = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.abs(array).max()) if array.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        payload = np.clip(np.rint(array / scale), -127, 127).astype(_NUMPY_DTYPES["int8"])
+    else:
+        payload = array.astype(_NUMPY_DTYPES[dtype])
+    return _HEADER.pack(_MAGIC, _DTYPE_CODES[dtype], array.size, scale) + payload.tobytes()
+
+
+def unpack_vector(blob: bytes | memoryview) -> np.ndarray:
+    """Decode a blob produced by :func:`pack_vector` into a float32 array."""
+
+    magic, code, dim, scale = _HEADER.unpack_from(blob)
+    if magic != _MAGIC or code not in _CODE_DTYPES:
+        raise ValueError("Not a packed vector blob")
+    dtype = _CODE_DTYPES[code]
+    payload = np.frombuffer(blob, dtype=_NUMPY_DTYPES[dtype], count=dim, offset=_HEADER.size)
+    if dtype == "int8":
+        return payload.astype(np.float32) * np.float32(scale)
+    return payload.astype(np.float32, copy=dtype != "float32")
+
+
+def packed_dtype(blob: bytes | memoryview) -> str:
+    _, code, _, _ = _HEADER.unpack_from(blob)
+    return _CODE_DTYPES[code]
+
+
+def cosine_similarities(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of ``matrix`` against ``query``."""
+
+    if matrix.size == 0:
+        return np.zeros(matrix.shape[0], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    dots = matrix @ query
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
@@ -1,7 +1,15 @@
 """Celery application configuration."""
+import os
+
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from kombu import Queue
 
 from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.routing_service import QUEUES, STANDARD_QUEUE
+
+logger = get_logger(__name__)
 
 celery_app = Celery(
     "rfp_analyzer",
@@ -11,9 +19,81 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_default_queue="rfp_analyzer",
+    task_queues=[Queue(name) for name in QUEUES],
+    task_default_queue=STANDARD_QUEUE,
+    # Take one message at a time and ack after the run, so a worker busy with a
+    # 600-page scan does not sit on prefetched small documents.
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    broker_transport_options={
+        "visibility_timeout": settings.broker_visibility_timeout,
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
     task_track_started=True,
     task_serializer="json",
     result_serializer="json",
     accept_content=["json"],
 )
+
+
+def queue_names() -> list[str]:
+    """Queues consumed by the workers (used for queue depth metrics)."""
+
+    return list(QUEUES)
+
+
+@worker_init.connect
+def share_model_budget(sender=None, **_kwargs) -> None:
+    """Give each prefork child an equal share of the default model memory budget."""
+
+    pool = str(getattr(sender, "pool_cls", "prefork")).lower()
+    if "prefork" not in pool and "processes" not in pool:
+        return  # threads/solo share one process and one model manager
+    from app.services.model_service import configure_worker_budget
+
+    configure_worker_budget(getattr(sender, "concurrency", None) or 1)
+
+
+@worker_init.connect
+def start_metrics_exporter(**_kwargs) -> None:
+    """Serve worker metrics from the main worker process."""
+
+    if not settings.worker_metrics_port:
+        return
+    from prometheus_client import start_http_server
+
+    from app.core import metrics
+
+    if not metrics.multiprocess_enabled():
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR is not set; prefork child metrics will not be aggregated"
+        )
+    registry = metrics.build_registry([metrics.QueueDepthCollector(settings.redis_url, queue_names())])
+    start_http_server(settings.worker_metrics_port, registry=registry)
+    logger.info("Worker metrics exporter listening on :%s", settings.worker_metrics_port)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **_kwargs) -> None:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+@worker_process_init.connect
+def warmup_worker_models(**_kwargs) -> None:
+    """Load configured models in each worker process before it takes tasks."""
+
+    if not settings.transformer_warmup:
+        return
+    from app.services.model_service import warmup_models
+
+    snapshot = warmup_models()
+    logger.info(
+        "Worker warmup complete: %s resident (%.1f MB)",
+        [model["name"] for model in snapshot["models"]],
+        snapshot["resident_mb"],
+    )
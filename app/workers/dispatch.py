@@ -0,0 +1,64 @@
+"""Enqueue worker tasks by name.
+
+The API only needs to put messages on the broker, so it goes through this module
+instead of importing ``app.workers.tasks`` (which pulls in PDF parsing and the
+model stack).
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from app.workers.celery_app import celery_app
+
+if TYPE_CHECKING:
+    from celery.result import AsyncResult
+
+PROCESS_DOCUMENT_TASK = "process_document"
+RECOMPUTE_TRAITS_TASK = "recompute_traits"
+REBUILD_SEARCH_INDEX_TASK = "rebuild_search_index"
+EMBED_QUERY_TASK = "embed_query"
+
+
+def enqueue_process_document(
+    document_id: UUID,
+    *,
+    queue: str,
+    priority: int,
+    profile: bool = False,
+) -> AsyncResult:
+    return celery_app.send_task(
+        PROCESS_DOCUMENT_TASK,
+        args=[str(document_id)],
+        kwargs={"profile": profile},
+        queue=queue,
+        priority=priority,
+    )
+
+
+def enqueue_recompute_traits(
+    document_id: UUID,
+    *,
+    queue: str,
+    priority: int,
+    trait_types: list[str] | None = None,
+    force: bool = False,
+) -> AsyncResult:
+    return celery_app.send_task(
+        RECOMPUTE_TRAITS_TASK,
+        args=[str(document_id)],
+        kwargs={"trait_types": trait_types, "force": force},
+        queue=queue,
+        priority=priority,
+    )
+
+
+def enqueue_rebuild_search_index(*, queue: str) -> AsyncResult:
+    return celery_app.send_task(REBUILD_SEARCH_INDEX_TASK, queue=queue)
+
+
+def embed_query(text: str, *, queue: str, timeout: float) -> list[float]:
+    """Embed a search query on a worker and wait for the vector."""
+
+    result = celery_app.send_task(EMBED_QUERY_TASK, args=[text], queue=queue, priority=0)
+    return result.get(timeout=timeout)
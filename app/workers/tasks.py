@@ -1,15 +1,16 @@
 """Celery task implementations."""
 from __future__ import annotations
 
-import json
 import uuid
+from contextlib import nullcontext
 
 from celery import states
-from sqlmodel import delete, select
+from sqlmodel import func, select
 
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.metrics import DOCUMENTS_PROCESSED
 from app.db.models import (
-    Chunk,
     Document,
     ProcessingJob,
     ProcessingStatus,
@@ -17,162 +18,253 @@ from app.db.models import (
     TRAIT_TYPES,
 )
 from app.db.session import get_session
-from app.services import document_service, extraction_service, job_service, retrieval_service
-from app.services.chunking_service import chunk_elements, chunk_pages
+from app.services import (
+    artifact_service,
+    cascade_service,
+    document_service,
+    job_service,
+    pipeline_service,
+    profiling_service,
+    search_service,
+)
 from app.services.embeddings_service import embed_text
+from app.services.model_service import resident_models
+from app.services.prefix_cache_service import prefix_cache_stats
+from app.services.timing_service import SpanRecorder
 from app.services.parsing_service import summarize_document
-from app.utils.file_paths import document_chunks_path
 from app.workers.celery_app import celery_app
+from app.services.routing_service import BULK_QUEUE
+from app.workers.dispatch import (
+    EMBED_QUERY_TASK,
+    PROCESS_DOCUMENT_TASK,
+    REBUILD_SEARCH_INDEX_TASK,
+    RECOMPUTE_TRAITS_TASK,
+    enqueue_rebuild_search_index,
+)
 
 logger = get_logger(__name__)
 
 
-@celery_app.task(bind=True, name="process_document")
-def process_document_task(self, document_id: str) -> str:
-    """Full pipeline for document processing and trait extraction."""
+def _embedding_model_label() -> str:
+    if settings.embed_provider == "transformers":
+        return settings.transformer_embed_model
+    if settings.embed_provider == "fake":
+        return "fake"
+    return settings.openai_embed_model
 
-    logger.info("Starting processing for document %s", document_id)
-    with get_session() as session:
-        document = session.get(Document, uuid.UUID(document_id))
-        if not document:
-            logger.error("Document %s not found", document_id)
-            self.update_state(state=states.FAILURE, meta={"error": "Document not found"})
-            return "missing"
 
-        job = session.exec(
-            select(ProcessingJob)
-            .where(ProcessingJob.document_id == document.id, ProcessingJob.task_id == self.request.id)
-            .order_by(ProcessingJob.created_at.desc())
-        ).first()
+def _index_for_search(session, document_id: uuid.UUID) -> None:
+    """Add a completed document to the corpus search index; indexing never fails the run."""
 
-        try:
-            document_service.mark_processing(session, document)
-            if job:
-                job_service.update_job(session, job, status=ProcessingStatus.RUNNING, step="parsing")
-            session.commit()
-
-            summary = summarize_document(document.source_path)
-            document.page_count = summary["page_count"]
-            document.token_count = summary["token_count"]
-            document.metadata_json = {
-                **(document.metadata_json or {}),
-                "pages": summary["pages"],
-                "elements_ingested": len(summary.get("elements", [])),
-            }
-            session.add(document)
-
-            # Remove previous processing artifacts if they exist.
-            session.exec(delete(Chunk).where(Chunk.document_id == document.id))
-            session.exec(delete(Trait).where(Trait.document_id == document.id))
-            session.flush()
-
-            elements = summary.get("elements") or []
-            if elements:
-                chunk_payloads = chunk_elements(elements, max_tokens=900, min_tokens=120, overlap_tokens=120)
-            else:
-                chunk_payloads = chunk_pages(summary["pages"])
-
-            if job:
-                job_service.update_job(session, job, step="chunking")
-
-            chunk_records: list[Chunk] = []
-            for payload in chunk_payloads:
-                chunk = Chunk(
-                    document_id=document.id,
-                    page_start=payload.page_start,
-                    page_end=payload.page_end,
-                    token_count=payload.token_count,
-                    content=payload.content,
-                    summary=payload.summary,
-                    metadata_json=payload.metadata,
-                )
-                session.add(chunk)
-                chunk_records.append(chunk)
-            session.flush()
-
-            # Persist chunk metadata for offline inspection.
-            chunk_path = document_chunks_path(document.id)
-            chunk_path.write_text(
-                json.dumps(
-                    [
-                        {
-                            "id": str(chunk.id),
-                            "page_start": chunk.page_start,
-                            "page_end": chunk.page_end,
-                            "token_count": chunk.token_count,
-                            "metadata": chunk.metadata_json,
-                        }
-                        for chunk in chunk_records
-                    ],
-                    indent=2,
-                ),
-                encoding="utf-8",
-            )
+    try:
+        search_service.index_document(session, document_id)
+        if search_service.pending_updates() >= settings.search_index_rebuild_after:
+            enqueue_rebuild_search_index(queue=BULK_QUEUE)
+    except Exception as exc:  # pragma: no cover - defensive logging
+        logger.warning("Search indexing failed for document %s: %s", document_id, exc)
 
-            if job:
-                job_service.update_job(session, job, step="embedding")
 
-            # Generate embeddings for retrieval.
-            for chunk in chunk_records:
-                try:
-                    chunk.embedding = embed_text(chunk.content)
-                    session.add(chunk)
-                except Exception as exc:  # pragma: no cover - defensive logging
-                    logger.warning("Embedding generation failed for chunk %s: %s", chunk.id, exc)
-            session.flush()
+def _find_job(session, document_id: uuid.UUID, task_id: str | None) -> ProcessingJob | None:
+    return session.exec(
+        select(ProcessingJob)
+        .where(ProcessingJob.document_id == document_id, ProcessingJob.task_id == task_id)
+        .order_by(ProcessingJob.created_at.desc())
+    ).first()
 
-            if job:
-                job_service.update_job(session, job, step="trait_extraction")
 
-            traits_created = 0
-            for trait_type in TRAIT_TYPES:
-                context, supporting_chunks = retrieval_service.build_context_for_trait(
-                    session,
-                    document.id,
-                    trait_type,
-                    token_budget=1200,
-                )
-                if not context or not supporting_chunks:
-                    continue
-                extraction = extraction_service.extract_trait(trait_type, context)
-                pages = extraction.get("pages") or sorted({chunk.page_start for chunk in supporting_chunks})
-                evidence = extraction.get("evidence") or [
-                    f"Pages {chunk.page_start}-{chunk.page_end}: {chunk.content[:280]}"
-                    for chunk in supporting_chunks
-                ]
-                trait = Trait(
-                    document_id=document.id,
-                    trait_type=trait_type,
-                    value=extraction.get("value"),
-                    confidence=extraction.get("confidence"),
-                    pages=pages,
-                    evidence=evidence,
-                    details={
-                        "source_chunk_ids": [str(chunk.id) for chunk in supporting_chunks],
-                        "context_preview": context[:1000],
-                    },
+def _start_run(session, document_id: uuid.UUID, task_id: str | None) -> tuple[Document | None, uuid.UUID | None]:
+    document = session.get(Document, document_id)
+    if document is None:
+        return None, None
+    job = _find_job(session, document_id, task_id)
+    return document, job.id if job else None
+
+
+def _record_failure(
+    document_id: uuid.UUID,
+    job_id: uuid.UUID | None,
+    error: str,
+    spans: list[dict],
+    *,
+    mark_document: bool,
+) -> None:
+    """Persist failure marks in their own transactions, after the failed stage has rolled back."""
+
+    job_service.record_progress(job_id, status=ProcessingStatus.FAILED, error=error, spans=spans)
+    if not mark_document:
+        return
+    try:
+        with get_session() as session:
+            document = session.get(Document, document_id)
+            if document is not None:
+                document_service.mark_failed(session, document, error=error)
+    except Exception:  # pragma: no cover - defensive logging
+        logger.exception("Could not mark document %s as failed", document_id)
+
+
+@celery_app.task(bind=True, name=PROCESS_DOCUMENT_TASK)
+def process_document_task(self, document_id: str, profile: bool = False) -> str:
+    """Full pipeline for document processing and trait extraction.
+
+    Each stage commits its own results in a short transaction; nothing is held
+    open while parsing or while models run, and job progress is written on a
+    separate autocommit connection (``job_service.record_progress``).
+
+    With ``profile`` the run is wrapped in a stack sampler and tracemalloc; see
+    ``profiling_service.capture``.
+    """
+
+    logger.info("Starting processing for document %s", document_id)
+    doc_id = uuid.UUID(document_id)
+    recorder = SpanRecorder()
+    profiler = profiling_service.capture(doc_id) if profile else nullcontext()
+    with profiler, recorder.activate():
+        with get_session() as session:
+            document, job_id = _start_run(session, doc_id, self.request.id)
+            if document is None:
+                logger.error("Document %s not found", document_id)
+                self.update_state(state=states.FAILURE, meta={"error": "Document not found"})
+                return "missing"
+            document_service.mark_processing(session, document)
+            source_path = document.source_path
+            sidecar = pipeline_service.element_metadata_sidecar(document)
+
+        try:
+            job_service.record_progress(job_id, status=ProcessingStatus.RUNNING, step="parsing")
+            with recorder.span("parsing") as record:
+                summary = summarize_document(source_path, sidecar)
+                record["items"] = summary["page_count"]
+
+            job_service.record_progress(job_id, step="chunking", spans=recorder.as_list())
+            with recorder.span("chunking") as record:
+                chunk_payloads = pipeline_service.chunk_summary(summary)
+                record["items"] = len(chunk_payloads)
+
+            # Replaces previous chunks, sections and traits if the document was processed before.
+            with get_session() as session:
+                document = session.get(Document, doc_id)
+                pipeline_service.record_parse_summary(session, document, summary)
+                chunk_records = pipeline_service.replace_chunks(
+                    session, document, chunk_payloads, summary.get("sections")
                 )
-                session.add(trait)
-                traits_created += 1
 
-            session.flush()
+            job_service.record_progress(job_id, step="embedding", spans=recorder.as_list())
+            # Generate embeddings for retrieval, reusing those of near-duplicate chunks.
+            # No transaction stays open while the model runs: donors are read, then results written, in short ones.
+            with recorder.span("embedding", items=len(chunk_records), model=_embedding_model_label()):
+                with get_session() as session:
+                    signatures, donors = pipeline_service.find_embedding_donors(session, chunk_records)
+                reuse = pipeline_service.embed_chunks(chunk_records, signatures, donors)
+                with get_session() as session:
+                    pipeline_service.store_embeddings(session, doc_id, chunk_records, signatures)
+            artifact_service.write_chunk_artifact(doc_id, chunk_records)
 
-            document.metadata_json = {
-                **(document.metadata_json or {}),
-                "chunk_count": len(chunk_records),
-                "trait_count": traits_created,
-            }
-            session.add(document)
+            job_service.record_progress(job_id, step="trait_extraction", spans=recorder.as_list())
+            with get_session() as session:
+                counts = pipeline_service.extract_traits(session, doc_id, TRAIT_TYPES, recorder, commit=True)
+            cascade_service.flush_stats()
 
-            document_service.mark_completed(session, document)
-            if job:
-                job_service.update_job(session, job, status=ProcessingStatus.SUCCESS, step="completed")
+            with get_session() as session:
+                document = session.get(Document, doc_id)
+                document.metadata_json = {
+                    **(document.metadata_json or {}),
+                    "chunk_count": len(chunk_records),
+                    "trait_count": counts["extracted"],
+                    "near_duplicates": reuse,
+                }
+                session.add(document)
+                document_service.mark_completed(session, document)
+            with get_session() as session:
+                _index_for_search(session, doc_id)
+            job_service.record_progress(
+                job_id,
+                status=ProcessingStatus.SUCCESS,
+                step="completed",
+                spans=recorder.as_list(),
+            )
+            DOCUMENTS_PROCESSED.labels(status="success").inc()
             logger.info("Completed processing for document %s", document_id)
             return "ok"
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.exception("Processing failed for document %s", document_id)
-            document_service.mark_failed(session, document, error=str(exc))
-            if job:
-                job_service.update_job(session, job, status=ProcessingStatus.FAILED, error=str(exc))
+            DOCUMENTS_PROCESSED.labels(status="failed").inc()
+            _record_failure(doc_id, job_id, str(exc), recorder.as_list(), mark_document=True)
             self.update_state(state=states.FAILURE, meta={"error": str(exc)})
             raise
+
+
+@celery_app.task(bind=True, name=RECOMPUTE_TRAITS_TASK)
+def recompute_traits_task(self, document_id: str, trait_types: list[str] | None = None, force: bool = False) -> dict:
+    """Re-extract traits from stored chunks and embeddings, without parsing or embedding again.
+
+    Traits whose prompt, model and context fingerprint is unchanged are kept
+    unless ``force`` is set. Each trait is committed as it is written. The
+    document's status is left alone.
+    """
+
+    doc_id = uuid.UUID(document_id)
+    recorder = SpanRecorder()
+    with recorder.activate():
+        with get_session() as session:
+            document, job_id = _start_run(session, doc_id, self.request.id)
+        if document is None:
+            logger.error("Document %s not found", document_id)
+            self.update_state(state=states.FAILURE, meta={"error": "Document not found"})
+            return {"status": "missing"}
+
+        try:
+            job_service.record_progress(job_id, status=ProcessingStatus.RUNNING, step="trait_recompute")
+            with get_session() as session:
+                counts = pipeline_service.extract_traits(
+                    session,
+                    doc_id,
+                    trait_types or TRAIT_TYPES,
+                    recorder,
+                    skip_unchanged=not force,
+                    commit=True,
+                )
+            cascade_service.flush_stats()
+
+            with get_session() as session:
+                trait_count = session.exec(
+                    select(func.count()).select_from(Trait).where(Trait.document_id == doc_id)
+                ).one()
+                document = session.get(Document, doc_id)
+                document.metadata_json = {**(document.metadata_json or {}), "trait_count": trait_count}
+                session.add(document)
+            job_service.record_progress(
+                job_id,
+                status=ProcessingStatus.SUCCESS,
+                step="completed",
+                spans=recorder.as_list(),
+            )
+            logger.info("Recomputed traits for document %s: %s", document_id, counts)
+            return counts
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.exception("Trait recomputation failed for document %s", document_id)
+            _record_failure(doc_id, job_id, str(exc), recorder.as_list(), mark_document=False)
+            self.update_state(state=states.FAILURE, meta={"error": str(exc)})
+            raise
+
+
+@celery_app.task(name=REBUILD_SEARCH_INDEX_TASK)
+def rebuild_search_index_task(force: bool = False) -> dict | None:
+    """Rebuild the corpus search index from the database, folding in pending updates."""
+
+    if not force and search_service.pending_updates() < settings.search_index_rebuild_after:
+        return None  # an earlier rebuild already folded the updates in
+    return search_service.build_index()
+
+
+@celery_app.task(name=EMBED_QUERY_TASK)
+def embed_query_task(text: str) -> list[float]:
+    """Embed a search query for the API, which does not load local embedding models."""
+
+    return [float(value) for value in embed_text(text)]
+
+
+@celery_app.task(name="model_residency")
+def model_residency_task() -> dict:
+    """Report which models are resident in the worker that runs this task."""
+
+    return {**resident_models(), "prefix_cache": prefix_cache_stats()}
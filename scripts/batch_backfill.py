@@ -0,0 +1,59 @@
+"""Backfill documents through the OpenAI Batch API.
+
+Usage::
+
+    python -m scripts.batch_backfill run --all            # every document not yet completed
+    python -m scripts.batch_backfill run <document-id> ...
+    python -m scripts.batch_backfill resume <run-id>      # after a crash or restart
+    python -m scripts.batch_backfill status <run-id>
+
+See ``app/services/batch_service.py`` for the phases; run state and the JSONL
+request/response files are kept under ``BATCH_DIR`` (default ``data/batches``).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import uuid
+from dataclasses import asdict
+
+from sqlmodel import select
+
+from app.db.models import Document, DocumentStatus
+from app.db.session import get_session
+from app.services import batch_service
+
+
+def _pending_document_ids() -> list[uuid.UUID]:
+    with get_session() as session:
+        statement = select(Document.id).where(Document.status != DocumentStatus.COMPLETED)
+        return list(session.exec(statement).all())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Start a new backfill run")
+    run_parser.add_argument("document_ids", nargs="*", type=uuid.UUID)
+    run_parser.add_argument("--all", action="store_true", help="Include every document that is not completed")
+    commands.add_parser("resume", help="Continue a run from its manifest").add_argument("run_id")
+    commands.add_parser("status", help="Print a run's manifest").add_argument("run_id")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps(asdict(batch_service.BatchRun.load(args.run_id)), indent=2))
+        return
+    if args.command == "resume":
+        run = batch_service.BatchRun.load(args.run_id)
+    else:
+        document_ids = list(args.document_ids) or (_pending_document_ids() if args.all else [])
+        if not document_ids:
+            raise SystemExit("No documents to backfill; pass document ids or --all")
+        run = batch_service.start_run(document_ids)
+        print(f"Started run {run.run_id} for {len(document_ids)} documents")
+    run = batch_service.advance(run)
+    print(f"Run {run.run_id}: {run.phase}, {run.applied_results} results applied, {run.failed_results} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Compare the async document routes with the previous sync-session implementation.
+
+Usage::
+
+    python -m scripts.benchmark_api_concurrency --requests 2000 --concurrency 200
+
+Both variants run in-process behind ``httpx.ASGITransport`` against the
+configured database: ``sync`` is the old ``def`` route with a ``Session`` from
+``get_db`` (dispatched to Starlette's threadpool), ``async`` is the current
+route from ``app.api.routers.documents``. Each request lists documents and then
+fetches one document's detail, which is what the dashboard does on refresh.
+Use ``--seed N`` to insert documents first on an empty database.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from sqlmodel import Session, select
+
+from app.api.dependencies import get_db
+from app.api.routers import documents
+from app.db.base import SQLModel
+from app.db.models import Trait
+from app.db.session import engine, get_session
+from app.schemas.document import DocumentDetail, DocumentList
+from app.services import document_service
+
+sync_router = APIRouter()
+
+
+@sync_router.get("/", response_model=DocumentList)
+def list_documents_sync(skip: int = 0, limit: int = 50, session: Session = Depends(get_db)) -> DocumentList:
+    items, total = document_service.list_documents(session, offset=skip, limit=limit)
+    return DocumentList(items=[documents._document_to_base(doc) for doc in items], total=total)
+
+
+@sync_router.get("/{document_id}", response_model=DocumentDetail)
+def get_document_detail_sync(document_id: uuid.UUID, session: Session = Depends(get_db)) -> DocumentDetail:
+    document = document_service.get_document(session, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    traits = session.exec(select(Trait).where(Trait.document_id == document.id)).all()
+    return documents._document_to_detail(document, traits)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(sync_router, prefix="/sync/documents")
+    app.include_router(documents.router, prefix="/async/documents")
+    return app
+
+
+def seed(count: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    with get_session() as session:
+        for index in range(count):
+            document_service.create_document(
+                session,
+                original_filename=f"bench-{index}.pdf",
+                stored_filename=f"bench-{index}.pdf",
+                source_path=f"/tmp/bench-{index}.pdf",
+            )
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+
+async def run_variant(app: FastAPI, variant: str, total: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+        listing = (await client.get(f"/{variant}/documents/", params={"limit": 20})).json()
+        ids = [item["id"] for item in listing["items"]] or [str(uuid.uuid4())]
+
+        async def _one(index: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    listed = await client.get(f"/{variant}/documents/", params={"limit": 20})
+                    detail = await client.get(f"/{variant}/documents/{ids[index % len(ids)]}")
+                except Exception:  # pool timeouts surface as exceptions through ASGITransport
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+                if listed.status_code != 200 or detail.status_code not in (200, 404):
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_one(index) for index in range(total)))
+        wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "wall_seconds": round(wall, 2),
+        "requests_per_second": round(total / wall, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": _percentile(latencies, 0.50) if latencies else None,
+        "p99_ms": _percentile(latencies, 0.99) if latencies else None,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    app = build_app()
+    return {
+        "concurrency": args.concurrency,
+        "sync": await run_variant(app, "sync", args.requests, args.concurrency),
+        "async": await run_variant(app, "async", args.requests, args.concurrency),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="Insert this many documents before running")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.seed)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare JSON and packed binary embedding storage.
+
+Usage::
+
+    python -m scripts.benchmark_embedding_storage --dims 1024 3072 --count 2000
+
+Reports bytes per vector, encode/decode time for a retrieval-sized batch and
+the cosine error introduced by float16/int8 quantization.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.utils.vectors import pack_vector, unpack_vector
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _random_unit_vectors(count: int, dim: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _timed(func) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def benchmark(count: int, dim: int) -> list[dict]:
+    vectors = _random_unit_vectors(count, dim)
+    as_lists = vectors.tolist()
+    results: list[dict] = []
+
+    encode_s, payloads = _timed(lambda: [json.dumps(vec) for vec in as_lists])
+    decode_s, _ = _timed(lambda: np.asarray([json.loads(p) for p in payloads], dtype=np.float32))
+    json_bytes = sum(len(p.encode()) for p in payloads) / count
+    results.append(
+        {
+            "dim": dim,
+            "format": "json",
+            "bytes_per_vector": round(json_bytes),
+            "encode_ms": round(encode_s * 1000, 1),
+            "load_ms": round(decode_s * 1000, 1),
+        }
+    )
+
+    for dtype in DTYPES:
+        encode_s, blobs = _timed(lambda: [pack_vector(vec, dtype) for vec in vectors])
+        decode_s, decoded = _timed(lambda: np.vstack([unpack_vector(blob) for blob in blobs]))
+        cosine = np.sum(vectors * decoded, axis=1) / np.linalg.norm(decoded, axis=1)
+        size = sum(len(blob) for blob in blobs) / count
+        results.append(
+            {
+                "dim": dim,
+                "format": dtype,
+                "bytes_per_vector": round(size),
+                "size_ratio_vs_json": round(size / json_bytes, 3),
+                "encode_ms": round(encode_s * 1000, 1),
+                "load_ms": round(decode_s * 1000, 1),
+                "min_cosine": round(float(cosine.min()), 6),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dims", nargs="+", type=int, default=[1024, 3072])
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+
+    for dim in args.dims:
+        for row in benchmark(args.count, dim):
+            print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
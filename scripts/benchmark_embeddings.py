@@ -0,0 +1,113 @@
+"""Benchmark embedding backends and check parity against the fp32 model.
+
+Usage::
+
+    python -m scripts.benchmark_embeddings --backends torch int8 onnx onnx-int8 --limit 256
+
+Texts are chunked from the PDFs in ``data/raw_files`` the same way the worker
+falls back to page chunking. Each backend is timed on the same texts and its
+vectors are compared with the fp32 ``torch`` backend by cosine similarity.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.chunking_service import chunk_pages
+from app.services.parsing_service import extract_pages
+from app.services.transformer_service import EMBED_BACKENDS, load_embedding_model
+
+
+def load_corpus(raw_dir: Path, limit: int) -> list[str]:
+    texts: list[str] = []
+    for pdf_path in sorted(raw_dir.iterdir()):
+        if pdf_path.suffix.lower() != ".pdf":
+            continue
+        pages = [page.__dict__ for page in extract_pages(str(pdf_path))]
+        texts.extend(chunk.content for chunk in chunk_pages(pages))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def encode(backend: str, texts: list[str], batch_size: int) -> tuple[np.ndarray, dict]:
+    started = time.perf_counter()
+    model = load_embedding_model(backend)
+    load_seconds = time.perf_counter() - started
+
+    model.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True)  # warm up
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+    encode_seconds = time.perf_counter() - started
+    return np.asarray(vectors, dtype=np.float32), {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "encode_seconds": round(encode_seconds, 2),
+        "texts_per_second": round(len(texts) / encode_seconds, 2) if encode_seconds else None,
+    }
+
+
+def cosine_drift(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    sims = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    drift = 1.0 - sims
+    return {
+        "mean_cosine": round(float(sims.mean()), 6),
+        "min_cosine": round(float(sims.min()), 6),
+        "p50_drift": round(float(np.percentile(drift, 50)), 6),
+        "p99_drift": round(float(np.percentile(drift, 99)), 6),
+    }
+
+
+def top1_agreement(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Share of texts whose nearest neighbour (excluding itself) is unchanged."""
+
+    def _nearest(matrix: np.ndarray) -> np.ndarray:
+        sims = matrix @ matrix.T
+        np.fill_diagonal(sims, -np.inf)
+        return sims.argmax(axis=1)
+
+    return round(float(np.mean(_nearest(reference) == _nearest(candidate))), 4)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(EMBED_BACKENDS), choices=EMBED_BACKENDS)
+    parser.add_argument("--raw-dir", type=Path, default=Path(settings.raw_files_dir))
+    parser.add_argument("--limit", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", type=Path, default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.raw_dir, args.limit)
+    print(f"Corpus: {len(texts)} chunks, median {statistics.median(len(t) for t in texts):.0f} chars")
+
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    reference: np.ndarray | None = None
+    report: list[dict] = []
+    for backend in backends:
+        vectors, result = encode(backend, texts, args.batch_size)
+        if reference is None:
+            reference = vectors
+        else:
+            result.update(cosine_drift(reference, vectors))
+            result["top1_agreement"] = top1_agreement(reference, vectors)
+            baseline = report[0]["texts_per_second"]
+            if baseline and result["texts_per_second"]:
+                result["speedup"] = round(result["texts_per_second"] / baseline, 2)
+        report.append(result)
+        print(json.dumps(result))
+
+    if args.output:
+        args.output.write_text(json.dumps({"model": settings.transformer_embed_model, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
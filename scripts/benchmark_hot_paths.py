@@ -0,0 +1,227 @@
+"""Micro-benchmarks for tokenization, chunking and chunk ranking.
+
+Usage::
+
+    python -m scripts.benchmark_hot_paths --output bench_results.json
+    python -m scripts.benchmark_hot_paths --baseline scripts/benchmark_baseline.json
+
+Inputs are the PDFs in ``data/raw_files`` (text extracted once with PyMuPDF,
+outside the timed region) and the ``chunks.json`` artifacts in
+``data/processed_files``, whose chunk counts and page spans shape the ranking
+corpora. Ranking corpora are loaded into an in-memory SQLite database and
+ranked with ``retrieval_service._top_chunks`` as retrieval does, from scoring
+rows read once outside the timed region. Embedding calls are replaced by the fake provider's deterministic
+hashed bag-of-words vector (without its simulated latency) so runs are
+reproducible and need no model.
+
+Each case reports calls per second and, from a separate ``tracemalloc`` pass,
+the number and total size of allocations per call. Results are written as JSON
+and can be compared against a saved baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+from unittest import mock
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.core.config import settings
+from app.db.models import Chunk
+from app.services import retrieval_service
+from app.services.chunking_service import chunk_elements, chunk_pages
+from app.services.embeddings_service import set_chunk_embedding
+from app.services.fake_model_service import fake_embedding
+from app.services.parsing_service import extract_pages
+from app.utils import tokenization
+from app.utils.prompts import TRAIT_RETRIEVAL_QUERIES
+
+REGRESSION_THRESHOLD = 0.10
+
+
+@dataclass
+class Corpus:
+    documents: list[list[dict]]  # page dicts per PDF
+    elements: list[list[dict]]  # page-fallback elements per PDF
+    ranking_sets: list[list[Chunk]]  # chunk lists shaped like chunks.json artifacts
+
+
+def load_corpus(raw_dir: Path, processed_dir: Path, max_documents: int | None) -> Corpus:
+    pdfs = sorted(path for path in raw_dir.iterdir() if path.suffix.lower() == ".pdf")[:max_documents]
+    documents = [[page.__dict__ for page in extract_pages(str(path))] for path in pdfs]
+    elements = [
+        [
+            {"element_id": f"{doc_index}-{page['page_number']}", "text": page["text"],
+             "element_type": "Page", "page_numbers": [page["page_number"]]}
+            for page in pages
+        ]
+        for doc_index, pages in enumerate(documents)
+    ]
+
+    page_pool = [page["text"] for pages in documents for page in pages if page["text"].strip()]
+    ranking_sets: list[list[Chunk]] = []
+    cursor = 0
+    for artifact in sorted(processed_dir.glob("*/chunks.json")):
+        entries = json.loads(artifact.read_text(encoding="utf-8"))
+        chunks: list[Chunk] = []
+        document_id = uuid.uuid4()
+        for entry in entries:
+            span = max(1, entry["page_end"] - entry["page_start"] + 1)
+            content = "\n\n".join(page_pool[(cursor + offset) % len(page_pool)] for offset in range(span))
+            cursor += span
+            chunk = Chunk(
+                document_id=document_id,
+                page_start=entry["page_start"],
+                page_end=entry["page_end"],
+                token_count=entry["token_count"],
+                content=content,
+            )
+            set_chunk_embedding(chunk, fake_embedding(content))
+            chunks.append(chunk)
+        ranking_sets.append(chunks)
+    return Corpus(documents=documents, elements=elements, ranking_sets=ranking_sets)
+
+
+def _measure(func: Callable[[], object], repeat: int, items: int) -> dict:
+    func()  # warm caches (tokenizer, regexes)
+    timings: list[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocations = sum(max(stat.count_diff, 0) for stat in stats)
+    allocated_bytes = sum(max(stat.size_diff, 0) for stat in stats)
+
+    median = statistics.median(timings)
+    return {
+        "median_seconds": round(median, 6),
+        "min_seconds": round(min(timings), 6),
+        "items": items,
+        "items_per_second": round(items / median, 2) if median else None,
+        "retained_allocations": allocations,
+        "retained_kb": round(allocated_bytes / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def build_cases(corpus: Corpus) -> dict[str, tuple[Callable[[], object], int]]:
+    texts = [page["text"] for pages in corpus.documents for page in pages]
+    blocks = [text for text in texts if text.strip()][:200]
+    ranking_chunks = sum(len(chunks) for chunks in corpus.ranking_sets)
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for chunks in corpus.ranking_sets:
+            session.add_all(chunks)
+        session.commit()
+        scoring_rows = [
+            (trait_type, retrieval_service._scoring_rows(session, chunks[0].document_id, trait_type)[0])
+            for chunks in corpus.ranking_sets
+            if chunks
+            for trait_type in TRAIT_RETRIEVAL_QUERIES
+        ]
+
+    def _rank_all() -> None:
+        with Session(engine) as session:
+            for trait_type, rows in scoring_rows:
+                retrieval_service._top_chunks(session, rows, trait_type, retrieval_service.MAX_CONTEXT_CHUNKS)
+
+    return {
+        "tokenization.count_tokens": (lambda: [tokenization.count_tokens(text) for text in texts], len(texts)),
+        "tokenization.trim_text": (lambda: [tokenization.trim_text(text, 400) for text in texts], len(texts)),
+        "tokenization.split_text_by_tokens": (
+            lambda: [tokenization.split_text_by_tokens(text, 200, 40) for text in texts],
+            len(texts),
+        ),
+        "tokenization.join_with_budget": (
+            lambda: [tokenization.join_with_budget(blocks[i : i + 10], 1200) for i in range(0, len(blocks), 10)],
+            len(blocks),
+        ),
+        "chunking.chunk_elements": (
+            lambda: [
+                chunk_elements(elements, max_tokens=900, min_tokens=120, overlap_tokens=120)
+                for elements in corpus.elements
+            ],
+            sum(len(elements) for elements in corpus.elements),
+        ),
+        "chunking.chunk_pages": (
+            lambda: [chunk_pages(pages) for pages in corpus.documents],
+            sum(len(pages) for pages in corpus.documents),
+        ),
+        "retrieval._top_chunks": (_rank_all, ranking_chunks * len(TRAIT_RETRIEVAL_QUERIES)),
+    }
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    lines: list[str] = []
+    for name, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous or not previous.get("items_per_second"):
+            lines.append(f"{name:40s} (no baseline)")
+            continue
+        ratio = current["items_per_second"] / previous["items_per_second"]
+        flag = ""
+        if ratio < 1 - REGRESSION_THRESHOLD:
+            flag = "  REGRESSION"
+        elif ratio > 1 + REGRESSION_THRESHOLD:
+            flag = "  faster"
+        alloc_delta = current["retained_allocations"] - previous.get("retained_allocations", 0)
+        lines.append(f"{name:40s} {ratio:6.2f}x throughput, {alloc_delta:+d} allocations{flag}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--raw-dir", type=Path, default=Path(settings.raw_files_dir))
+    parser.add_argument("--processed-dir", type=Path, default=Path(settings.processed_files_dir))
+    parser.add_argument("--max-documents", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", default=None, help="Run only cases whose name starts with these")
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON results here")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare against a previous JSON result")
+    args = parser.parse_args()
+
+    with mock.patch.object(retrieval_service, "embed_text", fake_embedding):
+        corpus = load_corpus(args.raw_dir, args.processed_dir, args.max_documents)
+        cases = build_cases(corpus)
+        results = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "documents": len(corpus.documents),
+            "ranking_sets": len(corpus.ranking_sets),
+            "cases": {},
+        }
+        for name, (func, items) in cases.items():
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            results["cases"][name] = _measure(func, args.repeat, items)
+            print(f"{name:40s} {results['cases'][name]['items_per_second']:>12} items/s")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, sort_keys=True), encoding="utf-8")
+    if args.baseline:
+        print("\nAgainst baseline", args.baseline)
+        for line in compare(results, json.loads(args.baseline.read_text(encoding="utf-8"))):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Build the corpus search index from the database.
+
+Usage::
+
+    python -m scripts.build_search_index                # rebuild and make it current
+    python -m scripts.build_search_index --check 200    # also measure latency and recall@k
+
+``--check`` uses stored chunk vectors as queries and compares the IVF results
+with an exhaustive scan of the same index.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import search_service
+
+
+def _check(queries: int, k: int, nprobe: int) -> dict:
+    index = search_service.current_index()
+    if not index.rows:
+        return {"queries": 0}
+    rng = np.random.default_rng(0)
+    vectors = np.asarray(index.vectors, dtype=np.float32)
+    picks = rng.choice(index.rows, min(queries, index.rows), replace=False)
+    latencies, recalls = [], []
+    for row in picks:
+        query = vectors[row]
+        started = time.perf_counter()
+        hits = index.search(query, k, nprobe)
+        latencies.append((time.perf_counter() - started) * 1000)
+        exact = {search_service._row_uuid(index.chunk_ids[i]) for i in np.argsort(-(vectors @ query))[:k]}
+        recalls.append(len(exact & {hit.chunk_id for hit in hits}) / len(exact))
+    return {
+        "queries": len(picks),
+        "k": k,
+        "nprobe": nprobe,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", type=int, default=0, metavar="QUERIES")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=settings.search_nprobe)
+    args = parser.parse_args()
+
+    meta = search_service.build_index()
+    if meta is None:
+        raise SystemExit("Another build holds the lock; try again later")
+    print(json.dumps(meta, indent=2))
+    if args.check:
+        print(json.dumps(_check(args.check, args.k, args.nprobe), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Local stand-in for the OpenAI Files and Batch endpoints.
+
+Run it and point the batch backfill at it::
+
+    python -m scripts.fake_openai_batch_server --port 8765
+    OPENAI_BASE_URL=http://localhost:8765/v1 OPENAI_API_KEY=test EMBED_PROVIDER=openai \\
+        python -m scripts.batch_backfill run --all
+
+Uploaded files and batch outputs live in memory. A batch moves from
+``validating`` to ``in_progress`` to ``completed`` after ``--delay`` seconds;
+``/v1/embeddings`` lines are answered with the fake provider's hashed
+embeddings and ``/v1/responses`` lines with its deterministic generator
+(without simulated latency). Set ``--fail-rate`` to return per-line errors.
+A synchronous ``POST /v1/embeddings`` is served too, for the query and
+sentence embeddings that context building still requests directly.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.services import fake_model_service
+
+app = FastAPI(title="Fake OpenAI Batch API")
+_files: dict[str, dict] = {}
+_batches: dict[str, dict] = {}
+_ids = itertools.count(1)
+_lock = threading.Lock()
+options = argparse.Namespace(delay=2.0, fail_rate=0.0)
+
+
+class BatchCreate(BaseModel):
+    input_file_id: str
+    endpoint: str
+    completion_window: str = "24h"
+    metadata: dict | None = None
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}-{next(_ids):06d}"
+
+
+def _store_file(content: bytes, filename: str, purpose: str) -> dict:
+    file_id = _new_id("file")
+    record = {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+    with _lock:
+        _files[file_id] = {**record, "content": content}
+    return record
+
+
+def _answer(url: str, body: dict) -> dict:
+    if url == "/v1/embeddings":
+        vector = fake_model_service.fake_embedding(body["input"])
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": 0, "embedding": vector}],
+        }
+    if url == "/v1/responses":
+        prompt = body["input"][0]["content"] if isinstance(body["input"], list) else body["input"]
+        text = fake_model_service.generate(prompt, max_new_tokens=body.get("max_output_tokens", 64))
+        return {
+            "id": _new_id("resp"),
+            "object": "response",
+            "status": "completed",
+            "model": body.get("model"),
+            "output": [
+                {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": text}]}
+            ],
+        }
+    raise ValueError(f"unsupported url {url}")
+
+
+def _process(batch_id: str) -> None:
+    batch = _batches[batch_id]
+    time.sleep(options.delay / 2)
+    batch.update(status="in_progress", in_progress_at=int(time.time()))
+    lines = _files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+    outputs: list[str] = []
+    errors: list[str] = []
+    rng = random.Random(batch_id)
+    for line in filter(None, lines):
+        request = json.loads(line)
+        entry = {"id": _new_id("batch_req"), "custom_id": request["custom_id"]}
+        if request.get("url") != batch["endpoint"] or rng.random() < options.fail_rate:
+            errors.append(json.dumps({**entry, "response": None, "error": {"code": "fake_error", "message": "x"}}))
+            continue
+        body = _answer(request["url"], request["body"])
+        outputs.append(json.dumps({**entry, "response": {"status_code": 200, "body": body}, "error": None}))
+    time.sleep(options.delay / 2)
+    output = _store_file(("\n".join(outputs) + "\n").encode("utf-8"), f"{batch_id}_output.jsonl", "batch_output")
+    batch.update(
+        status="completed",
+        completed_at=int(time.time()),
+        output_file_id=output["id"],
+        request_counts={"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)},
+    )
+    if errors:
+        error = _store_file(("\n".join(errors) + "\n").encode("utf-8"), f"{batch_id}_errors.jsonl", "batch_output")
+        batch["error_file_id"] = error["id"]
+
+
+@app.post("/v1/embeddings")
+def create_embeddings(body: dict) -> dict:
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    return {
+        "object": "list",
+        "model": body.get("model"),
+        "data": [
+            {"object": "embedding", "index": index, "embedding": fake_model_service.fake_embedding(text)}
+            for index, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)) -> dict:
+    return _store_file(await file.read(), file.filename or "upload.jsonl", purpose)
+
+
+@app.get("/v1/files/{file_id}/content")
+def file_content(file_id: str) -> Response:
+    record = _files.get(file_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="No such file")
+    return Response(content=record["content"], media_type="application/octet-stream")
+
+
+@app.post("/v1/batches")
+def create_batch(payload: BatchCreate) -> dict:
+    if payload.input_file_id not in _files:
+        raise HTTPException(status_code=404, detail="No such file")
+    batch_id = _new_id("batch")
+    batch = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": payload.endpoint,
+        "input_file_id": payload.input_file_id,
+        "completion_window": payload.completion_window,
+        "status": "validating",
+        "created_at": int(time.time()),
+        "metadata": payload.metadata,
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    _batches[batch_id] = batch
+    threading.Thread(target=_process, args=(batch_id,), daemon=True).start()
+    return batch
+
+
+@app.get("/v1/batches/{batch_id}")
+def retrieve_batch(batch_id: str) -> dict:
+    batch = _batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+    return batch
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=2.0, help="Seconds before a batch completes")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of lines returned as errors")
+    args = parser.parse_args()
+    options.delay, options.fail_rate = args.delay, args.fail_rate
+    settings.fake_llm_latency_ms = 0.0  # batch turnaround is simulated by --delay instead
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
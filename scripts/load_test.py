@@ -0,0 +1,173 @@
+"""Drive the API + worker pipeline with concurrent documents and report throughput.
+
+Start the API and workers with the fake provider so no real model is involved::
+
+    LLM_PROVIDER=fake EMBED_PROVIDER=fake uvicorn app.main:app --port 8000
+    LLM_PROVIDER=fake EMBED_PROVIDER=fake celery -A app.workers.celery_app worker -c 4
+
+then run::
+
+    python -m scripts.load_test --documents 40 --concurrency 8 --output load_report.json
+
+Each document is uploaded from ``data/raw_files``, queued with
+``POST /documents/{id}/process`` and polled through ``GET /documents/{id}/job``
+until it completes. Stage latencies come from the job ``step`` transitions seen
+while polling, so they are accurate to roughly the poll interval.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+from app.core.config import settings
+
+TERMINAL_STATUSES = {"success", "failed"}
+
+
+@dataclass
+class RunResult:
+    filename: str
+    document_id: str | None = None
+    status: str = "pending"
+    upload_seconds: float = 0.0
+    queue_seconds: float = 0.0  # process request -> job running
+    total_seconds: float = 0.0  # process request -> terminal status
+    stages: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+
+def percentiles(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def _pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": _pick(0.50),
+        "p90": _pick(0.90),
+        "p99": _pick(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+async def run_document(
+    client: httpx.AsyncClient,
+    path: Path,
+    *,
+    poll_interval: float,
+    timeout: float,
+) -> RunResult:
+    result = RunResult(filename=path.name)
+    try:
+        started = time.perf_counter()
+        with path.open("rb") as handle:
+            response = await client.post("/documents/", files={"file": (path.name, handle, "application/pdf")})
+        response.raise_for_status()
+        result.upload_seconds = time.perf_counter() - started
+        result.document_id = response.json()["id"]
+
+        queued = time.perf_counter()
+        response = await client.post(f"/documents/{result.document_id}/process")
+        response.raise_for_status()
+
+        current_step: str | None = None
+        step_started = queued
+        while True:
+            await asyncio.sleep(poll_interval)
+            now = time.perf_counter()
+            if now - queued > timeout:
+                result.status = "timeout"
+                break
+            response = await client.get(f"/documents/{result.document_id}/job")
+            if response.status_code == 404:
+                continue
+            response.raise_for_status()
+            job = response.json()
+            if job["status"] != "pending" and not result.queue_seconds:
+                result.queue_seconds = now - queued
+            if job["step"] != current_step:
+                if current_step is not None:
+                    result.stages[current_step] = result.stages.get(current_step, 0.0) + (now - step_started)
+                current_step, step_started = job["step"], now
+            if job["status"] in TERMINAL_STATUSES:
+                result.status = job["status"]
+                result.error = job.get("error_message")
+                break
+        result.total_seconds = time.perf_counter() - queued
+    except httpx.HTTPError as exc:
+        result.status = "error"
+        result.error = str(exc)
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    pdfs = sorted(path for path in args.raw_dir.iterdir() if path.suffix.lower() == ".pdf")
+    if not pdfs:
+        raise SystemExit(f"No PDFs found in {args.raw_dir}")
+    files = list(itertools.islice(itertools.cycle(pdfs), args.documents))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0) as client:
+
+        async def _bounded(path: Path) -> RunResult:
+            async with semaphore:
+                return await run_document(client, path, poll_interval=args.poll_interval, timeout=args.timeout)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_bounded(path) for path in files))
+        wall_seconds = time.perf_counter() - started
+
+    succeeded = [result for result in results if result.status == "success"]
+    stage_names = sorted({name for result in succeeded for name in result.stages})
+    return {
+        "documents": len(results),
+        "concurrency": args.concurrency,
+        "succeeded": len(succeeded),
+        "failed": [
+            {"file": result.filename, "status": result.status, "error": result.error}
+            for result in results
+            if result.status != "success"
+        ],
+        "wall_seconds": round(wall_seconds, 2),
+        "documents_per_minute": round(len(succeeded) / wall_seconds * 60, 2) if wall_seconds else None,
+        "upload_seconds": percentiles([result.upload_seconds for result in results if result.document_id]),
+        "queue_seconds": percentiles([result.queue_seconds for result in succeeded]),
+        "total_seconds": percentiles([result.total_seconds for result in succeeded]),
+        "stage_seconds": {
+            name: percentiles([result.stages[name] for result in succeeded if name in result.stages])
+            for name in stage_names
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=f"http://localhost:{settings.api_port}")
+    parser.add_argument("--raw-dir", type=Path, default=Path(settings.raw_files_dir))
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=1800.0, help="Per-document timeout in seconds")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Measure how long the API takes to import and how much memory it holds.
+
+Usage::
+
+    python -m scripts.measure_api_startup --runs 5
+
+Each run imports ``app.main`` in a fresh interpreter and reports the wall time,
+peak RSS and whether any of the worker-only heavy modules got loaded.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "unstructured", "fitz")
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main  # noqa: F401
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_seconds": elapsed,
+    "max_rss_mb": rss_kb / 1024 if sys.platform != "darwin" else rss_kb / 1024 / 1024,
+    "heavy_modules": sorted(name for name in %r if name in sys.modules),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once() -> dict:
+    output = subprocess.run([sys.executable, "-c", PROBE], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "import_seconds_median": round(statistics.median(run["import_seconds"] for run in runs), 3),
+                "max_rss_mb_median": round(statistics.median(run["max_rss_mb"] for run in runs), 1),
+                "heavy_modules": runs[-1]["heavy_modules"],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Measure how much memory parsed elements hold.
+
+Usage::
+
+    python -m scripts.measure_element_memory --elements 20000
+    python -m scripts.measure_element_memory --pdf data/raw_files/<id>.pdf
+
+Compares, under ``tracemalloc``, the elements ``parsing_service`` keeps (slotted
+``ParsedElement`` objects with only ``ELEMENT_METADATA_FIELDS``) against element
+dicts carrying the full ``unstructured`` metadata. Partitioning runs once outside
+the traced region. Without ``--pdf`` (or without ``unstructured`` installed) the
+input is synthetic, table-heavy elements shaped like ``partition_pdf`` output:
+coordinates, links, HTML tables and table cells.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Callable
+from unittest import mock
+
+from app.services import parsing_service
+from app.utils.tokenization import count_tokens
+
+TABLE_ROWS = 30
+
+
+class SyntheticMetadata:
+    def __init__(self, data: dict) -> None:
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return json.loads(json.dumps(self._data))  # a fresh copy per call, like unstructured
+
+
+class SyntheticElement:
+    def __init__(self, index: int, rng: random.Random) -> None:
+        table = index % 3 == 0
+        self.category = "Table" if table else rng.choice(["NarrativeText", "Title", "ListItem"])
+        self.text = " ".join(f"w{rng.randint(0, 999)}" for _ in range(60))
+        data = {
+            "filename": "solicitation.pdf",
+            "filetype": "application/pdf",
+            "last_modified": "2024-01-01T00:00:00",
+            "languages": ["eng"],
+            "page_number": index // 20 + 1,
+            "parent_id": f"{rng.getrandbits(64):x}",
+            "coordinates": {
+                "points": [[rng.random() * 600, rng.random() * 800] for _ in range(4)],
+                "system": "PixelSpace",
+                "layout_width": 1700,
+                "layout_height": 2200,
+            },
+            "detection_class_prob": rng.random(),
+            "file_directory": "/data/raw_files",
+            "links": [{"text": "x", "url": "https://example.gov/a", "start_index": 3}] if index % 5 == 0 else None,
+        }
+        if table:
+            data["text_as_html"] = "<table>" + "".join(
+                f"<tr><td>{rng.randint(0, 99999)}</td><td>cell text {row}</td></tr>" for row in range(TABLE_ROWS)
+            ) + "</table>"
+            data["table_as_cells"] = [
+                {"row_index": row, "col_index": col, "content": "cell"} for row in range(TABLE_ROWS) for col in range(2)
+            ]
+        self.metadata = SyntheticMetadata(data)
+
+
+def synthetic_elements(count: int, seed: int = 0) -> list[SyntheticElement]:
+    rng = random.Random(seed)
+    return [SyntheticElement(index, rng) for index in range(count)]
+
+
+def pdf_elements(paths: list[Path]) -> list:
+    if parsing_service.partition_pdf is None:
+        raise SystemExit("unstructured is not installed; run without --pdf for synthetic elements")
+    raw: list = []
+    for path in paths:
+        raw.extend(parsing_service.partition_pdf(filename=str(path), include_metadata=True, infer_table_structure=True))
+    return raw
+
+
+def full_metadata_elements(raw: list) -> list[dict]:
+    """Element dicts that keep every metadata field (the shape before projection)."""
+
+    elements: list[dict] = []
+    for element in raw:
+        metadata = element.metadata.to_dict()
+        text = (element.text or "").strip()
+        structured_text = metadata.get("text_as_markdown") or metadata.get("text_as_html")
+        if element.category == "Table" and structured_text:
+            text = structured_text
+        if text:
+            elements.append(
+                {
+                    "element_id": str(uuid.uuid4()),
+                    "text": text,
+                    "element_type": element.category,
+                    "page_numbers": [int(metadata.get("page_number") or 1)],
+                    "tokens": count_tokens(text),
+                    "metadata": metadata,
+                    "structured_text": structured_text,
+                }
+            )
+    return elements
+
+
+def projected_elements(raw: list) -> list:
+    with mock.patch.object(parsing_service, "partition_pdf", lambda **_kwargs: raw):
+        return parsing_service._extract_elements("measure.pdf")
+
+
+def measure(build: Callable[[list], list], raw: list) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    elements = build(raw)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "elements": len(elements),
+        "retained_bytes_per_element": round(retained / max(len(elements), 1)),
+        "peak_mb": round(peak / 2**20, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=20000, help="Synthetic elements to generate")
+    parser.add_argument("--pdf", type=Path, nargs="*", default=None, help="Partition these PDFs instead")
+    args = parser.parse_args()
+
+    raw = pdf_elements(args.pdf) if args.pdf else synthetic_elements(args.elements)
+    count_tokens("warm up")  # load the tokenizer outside the traced region
+    print(
+        json.dumps(
+            {
+                "input": "pdf" if args.pdf else "synthetic",
+                "full_metadata": measure(full_metadata_elements, raw),
+                "projected": measure(projected_elements, raw),
+                "metadata_fields": list(parsing_service.ELEMENT_METADATA_FIELDS),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Convert legacy JSON chunk embeddings into packed binary vectors.
+
+Usage::
+
+    python -m scripts.pack_embeddings --batch-size 500
+"""
+from __future__ import annotations
+
+import argparse
+
+from sqlmodel import select
+
+from app.db.models import Chunk
+from app.db.session import get_session
+from app.services.embeddings_service import set_chunk_embedding
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    converted = 0
+    last_id = None
+    while True:
+        with get_session() as session:
+            statement = select(Chunk).where(Chunk.embedding_vector.is_(None))
+            if last_id is not None:
+                statement = statement.where(Chunk.id > last_id)
+            chunks = session.exec(statement.order_by(Chunk.id).limit(args.batch_size)).all()
+            if not chunks:
+                break
+            last_id = chunks[-1].id
+            for chunk in chunks:
+                # JSON columns may hold a JSON null rather than SQL NULL.
+                if not chunk.embedding:
+                    continue
+                set_chunk_embedding(chunk, chunk.embedding)
+                session.add(chunk)
+                converted += 1
+        print(f"Packed {converted} embeddings")
+
+
+if __name__ == "__main__":
+    main()